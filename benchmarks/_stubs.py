@@ -0,0 +1,132 @@
+"""
+Minimal in-memory stand-ins for the Open WebUI modules the pipe imports.
+
+The benchmarks exercise ``responses_api_manifold_pipe`` outside of an Open WebUI
+deployment.  Importing this module installs ``open_webui.models.chats`` and
+``open_webui.models.models`` stubs into ``sys.modules`` (only when the real
+package is not importable) and puts ``src/`` on ``sys.path``.
+
+Third-party requirements: ``aiohttp``, ``fastapi`` and ``pydantic``.
+"""
+
+from __future__ import annotations
+
+import copy
+import sys
+import types
+from pathlib import Path
+from typing import Any, Optional
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+
+class ChatModel:
+    """Mirror of the attributes the pipe reads from Open WebUI's ``ChatModel``."""
+
+    def __init__(self, chat_id: str, chat: dict[str, Any]):
+        self.id = chat_id
+        self.chat = chat
+
+
+class Chats:
+    """Dict-backed replacement for ``open_webui.models.chats.Chats``.
+
+    Reads return deep copies, like the real table which deserializes JSON on every
+    ``get_chat_by_id`` call, so benchmarks see realistic copy costs.
+    """
+
+    store: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.store = {}
+
+    @classmethod
+    def get_chat_by_id(cls, chat_id: str) -> Optional[ChatModel]:
+        chat = cls.store.get(chat_id)
+        if chat is None:
+            return None
+        return ChatModel(chat_id, copy.deepcopy(chat))
+
+    @classmethod
+    def update_chat_by_id(cls, chat_id: str, chat: dict[str, Any]) -> ChatModel:
+        cls.store[chat_id] = copy.deepcopy(chat)
+        return ChatModel(chat_id, chat)
+
+    @classmethod
+    def upsert_message_to_chat_by_id_and_message_id(
+        cls, chat_id: str, message_id: str, message: dict[str, Any]
+    ) -> Optional[ChatModel]:
+        chat = cls.store.setdefault(chat_id, {})
+        messages = chat.setdefault("history", {}).setdefault("messages", {})
+        messages.setdefault(message_id, {}).update(copy.deepcopy(message))
+        return ChatModel(chat_id, chat)
+
+
+class ModelForm:
+    def __init__(self, **data: Any):
+        self.__dict__.update(data)
+
+
+class ModelModel:
+    def __init__(self, model_id: str, params: Optional[dict[str, Any]] = None):
+        self.id = model_id
+        self.params = params or {}
+
+    def model_dump(self) -> dict[str, Any]:
+        return {"id": self.id, "params": dict(self.params)}
+
+
+class Models:
+    """Replacement for ``open_webui.models.models.Models`` (native FC enabled)."""
+
+    store: dict[str, ModelModel] = {}
+
+    @classmethod
+    def get_model_by_id(cls, model_id: str) -> Optional[ModelModel]:
+        return cls.store.setdefault(
+            model_id, ModelModel(model_id, {"function_calling": "native"})
+        )
+
+    @classmethod
+    def update_model_by_id(cls, model_id: str, form: ModelForm) -> ModelModel:
+        model = ModelModel(model_id, getattr(form, "params", {}))
+        cls.store[model_id] = model
+        return model
+
+
+def install() -> None:
+    """Register the stubs unless a real Open WebUI installation is importable."""
+    try:
+        import open_webui.models.chats  # noqa: F401
+        import open_webui.models.models  # noqa: F401
+
+        return
+    except ImportError:
+        pass
+
+    root = types.ModuleType("open_webui")
+    models_pkg = types.ModuleType("open_webui.models")
+    chats_mod = types.ModuleType("open_webui.models.chats")
+    models_mod = types.ModuleType("open_webui.models.models")
+
+    chats_mod.Chats = Chats
+    models_mod.Models = Models
+    models_mod.ModelForm = ModelForm
+
+    root.models = models_pkg
+    models_pkg.chats = chats_mod
+    models_pkg.models = models_mod
+    sys.modules.update(
+        {
+            "open_webui": root,
+            "open_webui.models": models_pkg,
+            "open_webui.models.chats": chats_mod,
+            "open_webui.models.models": models_mod,
+        }
+    )
+
+
+install()
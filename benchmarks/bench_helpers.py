@@ -0,0 +1,289 @@
+"""
+Micro-benchmarks for the hot helpers in ``responses_api_manifold_pipe.py``.
+
+Each case is timed with ``timeit`` (auto-ranged, best of ``--rounds``) and
+reported as µs per call.  Results can be saved as a baseline and later runs
+compared against it; any case slower than ``--threshold`` × baseline makes the
+script exit with status 1.
+
+Usage::
+
+    python benchmarks/bench_helpers.py                       # run + compare to baselines/helpers.json
+    python benchmarks/bench_helpers.py -k transform_messages  # subset (substring match)
+    python benchmarks/bench_helpers.py --save                 # refresh the stored baseline
+
+Baselines are machine-specific; regenerate them on the machine that compares.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+import _stubs
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import (
+    DETAILS_RE,
+    ExpandableStatusIndicator,
+    ResponsesBody,
+    create_marker,
+    extract_markers,
+    generate_item_id,
+    merge_usage_stats,
+    contains_marker,
+    parse_marker,
+    remove_details_tags_by_type,
+    scan_assistant_content,
+    split_text_by_markers,
+    wrap_marker,
+)
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "helpers.json"
+MODEL_ID = "openai_responses.gpt-4.1"
+LOOP = asyncio.new_event_loop()  # drives the async ExpandableStatusIndicator cases
+
+STATUS_BLOCK = (
+    '<details type="status" done="true">\n<summary>Finished in 4.2 s</summary>\n\n'
+    "- **Searching the web**\n  - query: latency budgets\n- **Finished in 4.2 s**\n\n---</details>"
+)
+REASONING_BLOCK = (
+    '<details type="reasoning" done="true" duration="3">\n<summary>Thought for 3 seconds</summary>\n'
+    + "> thinking about the problem step by step\n" * 20
+    + "</details>\n"
+)
+
+
+# ─── Fixtures ───────────────────────────────────────────────────────────────
+def make_history(
+    n_messages: int, chat_id: str, *, tool_calls_per_turn: int = 2
+) -> list[dict[str, Any]]:
+    """Alternate user/assistant turns; assistant turns reference persisted tool items.
+
+    The referenced items are written to the in-memory ``Chats`` stub under ``chat_id``.
+    """
+    items: dict[str, dict] = {}
+    messages: list[dict[str, Any]] = [{"role": "system", "content": "Be helpful."}]
+    for turn in range(n_messages // 2):
+        messages.append(
+            {"role": "user", "content": f"Question {turn}: " + "why? " * 30}
+        )
+        parts = [STATUS_BLOCK, REASONING_BLOCK]
+        for call in range(tool_calls_per_turn):
+            for kind in ("function_call", "function_call_output"):
+                ulid = generate_item_id()
+                payload = (
+                    {
+                        "type": kind,
+                        "call_id": f"call_{turn}_{call}",
+                        "name": "lookup",
+                        "arguments": "{}",
+                    }
+                    if kind == "function_call"
+                    else {
+                        "type": kind,
+                        "call_id": f"call_{turn}_{call}",
+                        "output": "x" * 400,
+                    }
+                )
+                items[ulid] = {"model": MODEL_ID, "payload": payload}
+                parts.append(
+                    wrap_marker(create_marker(kind, ulid=ulid, model_id=MODEL_ID))
+                )
+        parts.append("Here is the answer. " * 40)
+        parts.append("![chart](https://example.org/chart.png)")
+        messages.append({"role": "assistant", "content": "".join(parts)})
+    _stubs.Chats.store[chat_id] = {
+        "history": {"messages": {}},
+        "openai_responses_pipe": {"__v": 2, "items": items},
+    }
+    return messages
+
+
+def make_tools(n: int) -> dict[str, dict]:
+    return {
+        f"tool_{i}": {
+            "spec": {
+                "name": f"tool_{i}",
+                "description": "Does a thing. " * 5,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string"},
+                        "limit": {"type": "integer"},
+                        "tags": {"type": ["array", "null"]},
+                    },
+                },
+            }
+        }
+        for i in range(n)
+    }
+
+
+def long_marker_text(n_markers: int) -> str:
+    parts = []
+    for i in range(n_markers):
+        parts.append("Some prose between the tool calls. " * 10)
+        parts.append(wrap_marker(create_marker("function_call", model_id=MODEL_ID)))
+    return "".join(parts)
+
+
+def usage_block() -> dict:
+    return {
+        "input_tokens": 1234,
+        "input_tokens_details": {"cached_tokens": 1000},
+        "output_tokens": 456,
+        "output_tokens_details": {"reasoning_tokens": 128},
+        "total_tokens": 1690,
+        "loops": 1,
+    }
+
+
+def multi_pass_scan(messages: list[dict]) -> tuple[set[str], list[list[dict]]]:
+    """The pre-``scan_assistant_content`` approach: marker regex, details sub, split."""
+    ulids = {
+        mk["ulid"]
+        for m in messages
+        if m["role"] == "assistant" and contains_marker(m["content"])
+        for mk in extract_markers(m["content"], parsed=True)
+    }
+    out = []
+    for m in messages:
+        if m["role"] != "assistant":
+            continue
+        content = DETAILS_RE.sub("", m["content"]).strip()
+        segments = []
+        for seg in split_text_by_markers(content):
+            if seg["type"] == "marker":
+                segments.append(parse_marker(seg["marker"])["ulid"])
+            elif seg["text"].strip():
+                segments.append(seg["text"].strip())
+        out.append(segments)
+    return ulids, out
+
+
+def single_pass_scan(messages: list[dict]) -> tuple[set[str], list[list[dict]]]:
+    ulids: set[str] = set()
+    out = []
+    for m in messages:
+        if m["role"] != "assistant":
+            continue
+        segments = []
+        for seg in scan_assistant_content(m["content"]):
+            if seg["type"] == "marker":
+                ulids.add(seg["ulid"])
+                segments.append(seg["ulid"])
+            elif seg["text"].strip():
+                segments.append(seg["text"].strip())
+        out.append(segments)
+    return ulids, out
+
+
+# ─── Cases ──────────────────────────────────────────────────────────────────
+def build_cases() -> dict[str, Callable[[], Any]]:
+    cases: dict[str, Callable[[], Any]] = {}
+
+    for n in (10, 100, 1000):
+        chat_id = f"bench-{n}"
+        history = make_history(n, chat_id)
+        cases[f"transform_messages_to_input[{n}]"] = (
+            lambda h=history, c=chat_id: ResponsesBody.transform_messages_to_input(
+                h, chat_id=c, openwebui_model_id=MODEL_ID
+            )
+        )
+
+    tool_heavy = make_history(200, "bench-scan", tool_calls_per_turn=8)
+    assert multi_pass_scan(tool_heavy) == single_pass_scan(tool_heavy)
+    cases["history_scan[multi_pass]"] = lambda: multi_pass_scan(tool_heavy)
+    cases["history_scan[single_pass]"] = lambda: single_pass_scan(tool_heavy)
+
+    for n in (1, 20, 100):
+        tools = make_tools(n)
+        cases[f"transform_tools[{n}]"] = lambda t=tools: ResponsesBody.transform_tools(
+            t, strict=True
+        )
+
+    text = long_marker_text(200)
+    cases["extract_markers[200]"] = lambda: extract_markers(text, parsed=True)
+    cases["split_text_by_markers[200]"] = lambda: split_text_by_markers(text)
+
+    async def status_add(n: int) -> None:
+        status = ExpandableStatusIndicator()
+        message = "Answer body. " * 200
+        for i in range(n):
+            message = await status.add(message, f"Step {i}", "detail line")
+
+    for n in (10, 50):
+        cases[f"ExpandableStatusIndicator.add[{n}]"] = (
+            lambda n=n: LOOP.run_until_complete(status_add(n))
+        )
+
+    cases["generate_item_id"] = generate_item_id
+
+    usage = usage_block()
+    cases["merge_usage_stats"] = lambda: merge_usage_stats({}, usage)
+
+    details_text = (STATUS_BLOCK + REASONING_BLOCK + "Answer. " * 50) * 20
+    cases["remove_details_tags_by_type"] = lambda: remove_details_tags_by_type(
+        details_text, ["status", "reasoning"]
+    )
+    return cases
+
+
+def time_case(fn: Callable[[], Any], rounds: int) -> float:
+    """Return the best µs/call across ``rounds`` auto-ranged timeit runs."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=rounds, number=number)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark pipe helpers.")
+    parser.add_argument("-k", default="", help="Only run cases containing this text.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument(
+        "--save", action="store_true", help="Write results as baseline."
+    )
+    parser.add_argument("--threshold", type=float, default=1.3)
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    baseline: dict[str, float] = (
+        json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    )
+    results: dict[str, float] = {}
+    regressions = []
+    print(f"{'case':<40} {'µs/call':>12} {'baseline':>12} {'ratio':>7}")
+    for name, fn in build_cases().items():
+        if args.k not in name:
+            continue
+        us = results[name] = time_case(fn, args.rounds)
+        base = baseline.get(name)
+        ratio = us / base if base else None
+        print(
+            f"{name:<40} {us:>12.2f} {base if base else float('nan'):>12.2f} "
+            f"{ratio if ratio else float('nan'):>7.2f}"
+        )
+        if ratio and ratio > args.threshold:
+            regressions.append(f"{name}: {ratio:.2f}x baseline")
+    LOOP.close()
+
+    if args.save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        merged = {**baseline, **{k: round(v, 3) for k, v in results.items()}}
+        baseline_path.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
+        print(f"\nsaved baseline to {baseline_path}")
+    elif regressions:
+        print(f"\nREGRESSION (threshold {args.threshold:.2f}x):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
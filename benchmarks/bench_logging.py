@@ -0,0 +1,121 @@
+"""
+Logging overhead per streamed SSE event.
+
+Replays the logging calls ``Pipe._run_streaming_loop`` makes for every upstream
+event and reports the cost per event for ``SessionLogger`` at INFO and DEBUG,
+next to the previous implementation (synchronous stdout handler + eagerly
+formatted per-session deque) for reference.
+
+Usage::
+
+    python benchmarks/bench_logging.py [--events 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import logging
+import sys
+import time
+from collections import defaultdict, deque
+
+import _stubs  # noqa: F401  (installs Open WebUI stubs)
+
+# Keep console output out of the measurement; handlers bind sys.stdout on creation.
+_real_stdout = sys.stdout
+sys.stdout = io.StringIO()
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import SessionLogger  # noqa: E402
+
+
+def legacy_logger(session_id, log_level):
+    """The pre-QueueHandler ``SessionLogger.get_logger`` wiring, for comparison."""
+    logs = defaultdict(lambda: deque(maxlen=2000))
+    logger = logging.getLogger("bench.legacy")
+    logger.handlers.clear()
+    logger.filters.clear()
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    def filter(record):
+        record.session_id = session_id.get()
+        return record.levelno >= log_level.get()
+
+    logger.addFilter(filter)
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(
+        logging.Formatter("[%(levelname)s] [%(session_id)s] %(message)s")
+    )
+    logger.addHandler(console)
+    mem = logging.Handler()
+    mem.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    mem.emit = lambda r: (
+        logs[r.session_id].append(mem.format(r)) if r.session_id else None
+    )
+    logger.addHandler(mem)
+    return logger
+
+
+def make_events(n: int) -> list[dict]:
+    events = []
+    for i in range(n):
+        if i % 50 == 49:
+            events.append(
+                {
+                    "type": "response.output_item.done",
+                    "item": {
+                        "type": "function_call",
+                        "name": "lookup",
+                        "arguments": "{}",
+                    },
+                }
+            )
+        else:
+            events.append({"type": "response.output_text.delta", "delta": "token "})
+    return events
+
+
+def run(logger: logging.Logger, events: list[dict]) -> float:
+    """Mirror the per-event logging done by the streaming loop; return ns/event."""
+    start = time.perf_counter_ns()
+    for event in events:
+        etype = event.get("type")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received event: %s", etype)
+            if not etype.endswith(".delta"):
+                logger.debug(
+                    "Event data: %s", json.dumps(event, indent=2, ensure_ascii=False)
+                )
+        if etype == "response.output_item.done":
+            logger.info("Persisted item: %s", "marker")
+    return (time.perf_counter_ns() - start) / len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    SessionLogger.session_id.set("bench-session")
+    logger = SessionLogger.get_logger("bench.session")
+    legacy = legacy_logger(SessionLogger.session_id, SessionLogger.log_level)
+
+    results = []
+    for level in ("INFO", "DEBUG"):
+        SessionLogger.log_level.set(getattr(logging, level))
+        for label, lg in (("SessionLogger", logger), ("legacy", legacy)):
+            run(lg, events[:1000])  # warm-up
+            results.append((label, level, run(lg, events)))
+            SessionLogger.clear("bench-session")
+
+    sys.stdout = _real_stdout
+    print(f"{'logger':<14} {'level':<6} {'ns/event':>10}")
+    for label, level, ns in results:
+        print(f"{label:<14} {level:<6} {ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
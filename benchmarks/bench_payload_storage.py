@@ -0,0 +1,197 @@
+"""
+Chat JSON size and load time for persisted Responses items, per storage codec.
+
+Re-persists the same items with ``persist_openai_response_items`` using each
+``PAYLOAD_COMPRESSION`` setting and reports the serialized chat size and the time
+to load it back (``json.loads`` of the chat + ``fetch_openai_response_items`` for
+every item), which is what every later turn pays.
+
+By default a synthetic chat is used: encrypted reasoning per turn, large tool
+outputs (half of them repeated, as with re-run searches) and a generated image
+every 10 turns.  Each codec is also measured with images offloaded to files
+(``IMAGE_OFFLOAD_DIR``, a temporary directory here).  Pass ``--chat-json`` with an Open WebUI chat export to measure
+a real chat instead (its ``openai_responses_pipe.items`` are replayed).
+
+Usage::
+
+    python benchmarks/bench_payload_storage.py --turns 50
+    python benchmarks/bench_payload_storage.py --chat-json exported_chat.json --min-kb 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import _stubs
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import (
+    fetch_openai_response_items,
+    persist_openai_response_items,
+)
+
+MODEL_ID = "openai_responses.o3"
+WORDS = (
+    "the campus library extends hours during finals week while students review "
+    "lecture notes on distributed systems latency budgets and measurement"
+).split()
+
+
+def synthetic_turns(turns: int) -> list[list[dict]]:
+    rng = random.Random(0)
+    shared_output = json.dumps(
+        {"results": [f"Result {i}: " + "lorem ipsum dolor " * 40 for i in range(20)]}
+    )
+    out = []
+    for turn in range(turns):
+        items = [
+            {
+                "type": "reasoning",
+                "id": f"rs_{turn}",
+                "summary": [],
+                "encrypted_content": base64.b64encode(os.urandom(6000)).decode(),
+            },
+            {
+                "type": "function_call_output",
+                "call_id": f"call_{turn}",
+                "output": (
+                    shared_output
+                    if turn % 2
+                    else json.dumps(
+                        {
+                            "pages": [
+                                " ".join(rng.choice(WORDS) for _ in range(300))
+                                for _ in range(8)
+                            ]
+                        }
+                    )
+                ),
+            },
+        ]
+        if turn % 10 == 0:
+            items.append(
+                {
+                    "type": "image_generation_call",
+                    "id": f"ig_{turn}",
+                    "status": "completed",
+                    "result": base64.b64encode(os.urandom(300_000)).decode(),
+                }
+            )
+        out.append(items)
+    return out
+
+
+def exported_turns(path: Path) -> list[list[dict]]:
+    data = json.loads(path.read_text())
+    if isinstance(data, list):
+        data = data[0]
+    chat = data.get("chat", data)
+    root = chat.get("openai_responses_pipe", {})
+    by_message: dict[str, list[dict]] = {}
+    for item in root.get("items", {}).values():
+        if "payload" in item:
+            by_message.setdefault(item.get("message_id", ""), []).append(
+                item["payload"]
+            )
+    return list(by_message.values())
+
+
+def measure(
+    turns: list[list[dict]], codec: str, min_kb: int, loads: int, image_dir: str = ""
+) -> dict:
+    chat_id = f"bench-{codec}-{bool(image_dir)}"
+    history = {f"m{i}": {"id": f"m{i}"} for i in range(len(turns))}
+    _stubs.Chats.store[chat_id] = {"history": {"messages": history}}
+
+    started = time.perf_counter()
+    markers = []
+    for i, items in enumerate(turns):
+        markers.append(
+            persist_openai_response_items(
+                chat_id,
+                f"m{i}",
+                items,
+                MODEL_ID,
+                compression=codec,
+                compression_min_bytes=min_kb * 1024,
+                image_dir=image_dir,
+            )
+        )
+    persist_s = time.perf_counter() - started
+
+    serialized = json.dumps(_stubs.Chats.store[chat_id], ensure_ascii=False)
+    root = _stubs.Chats.store[chat_id]["openai_responses_pipe"]
+    ids = list(root.get("batches", {})) + [
+        i
+        for i, item in root["items"].items()
+        if not any(i in b["item_ids"] for b in root.get("batches", {}).values())
+    ]
+
+    load_s = []
+    for _ in range(loads):
+        t0 = time.perf_counter()
+        json.loads(serialized)  # what the DB layer pays to hydrate the chat
+        fetched = fetch_openai_response_items(
+            chat_id, ids, openwebui_model_id=MODEL_ID, image_dir=image_dir
+        )
+        load_s.append(time.perf_counter() - t0)
+    assert sum(len(v) if isinstance(v, list) else 1 for v in fetched.values()) == sum(
+        map(len, turns)
+    )
+    return {
+        "codec": f"{codec}+files" if image_dir else codec,
+        "chat_kb": len(serialized.encode()) / 1024,
+        "blobs": len(root.get("blobs", {})),
+        "persist_ms": persist_s * 1000,
+        "load_ms": min(load_s) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare payload storage codecs.")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--chat-json", help="Open WebUI chat export to replay.")
+    parser.add_argument("--min-kb", type=int, default=8)
+    parser.add_argument("--loads", type=int, default=5)
+    args = parser.parse_args()
+
+    turns = (
+        exported_turns(Path(args.chat_json))
+        if args.chat_json
+        else synthetic_turns(args.turns)
+    )
+    codecs = ["disabled", "zlib"]
+    try:
+        import zstandard  # noqa: F401
+
+        codecs.append("zstd")
+    except ImportError:
+        print("(zstandard not installed; skipping zstd)")
+
+    rows = [measure(turns, codec, args.min_kb, args.loads) for codec in codecs]
+    with tempfile.TemporaryDirectory() as image_dir:  # IMAGE_OFFLOAD_DIR
+        rows += [
+            measure(turns, codec, args.min_kb, args.loads, image_dir)
+            for codec in codecs
+        ]
+    base = rows[0]
+    print(
+        f"{'codec':<16} {'chat KB':>10} {'vs raw':>7} {'blobs':>6} "
+        f"{'persist ms':>11} {'load ms':>9} {'vs raw':>7}"
+    )
+    for r in rows:
+        print(
+            f"{r['codec']:<16} {r['chat_kb']:>10.0f} {r['chat_kb'] / base['chat_kb']:>7.0%} "
+            f"{r['blobs']:>6} {r['persist_ms']:>11.1f} {r['load_ms']:>9.2f} "
+            f"{r['load_ms'] / base['load_ms']:>7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Per-request setup overhead of ``Pipe.pipe``: everything before the first byte is sent.
+
+The streaming/non-streaming loops are replaced with a coroutine that returns
+immediately, so each timed ``pipe()`` call covers valve merging, request
+validation, history conversion (``from_completions``), capability lookups, tool
+transforms and the model-record checks.  Open WebUI's ``Chats``/``Models`` are
+the in-memory stubs from ``_stubs.py``; ``--db-latency-ms`` adds a blocking delay
+to each of their reads to approximate a real database.
+
+Usage::
+
+    python benchmarks/bench_request_setup.py
+    python benchmarks/bench_request_setup.py --requests 2000 --history 40
+    python benchmarks/bench_request_setup.py --db-latency-ms 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import Any
+
+import _stubs
+from bench_helpers import make_history, make_tools
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import Pipe, SessionLogger
+
+MODEL_ID = "openai_responses.gpt-4.1"
+
+
+def add_db_latency(seconds: float) -> None:
+    """Make the stub ``Chats``/``Models`` reads block like a database round trip."""
+    for table, name in (
+        (_stubs.Chats, "get_chat_by_id"),
+        (_stubs.Models, "get_model_by_id"),
+    ):
+        read = getattr(table, name)
+
+        def slow(*args: Any, _read=read) -> Any:
+            time.sleep(seconds)
+            return _read(*args)
+
+        setattr(table, name, staticmethod(slow))
+
+
+async def skip_loop(*args: Any, **kwargs: Any) -> str:
+    return ""
+
+
+def scenarios(history: int) -> dict[str, dict[str, Any]]:
+    messages = make_history(history, "setup-history")
+    messages.append({"role": "user", "content": "And now?"})
+    short = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": "Hello"},
+    ]
+    return {
+        "plain": {"messages": short, "tools": None, "user_valves": {}},
+        "user_valves": {
+            "messages": short,
+            "tools": None,
+            "user_valves": {"LOG_LEVEL": "WARNING", "PERSIST_TOOL_RESULTS": False},
+        },
+        f"history[{history}]": {
+            "messages": messages,
+            "tools": None,
+            "user_valves": {},
+            "chat_id": "setup-history",
+        },
+        "tools[20]": {"messages": short, "tools": make_tools(20), "user_valves": {}},
+        "history+tools": {
+            "messages": messages,
+            "tools": make_tools(20),
+            "user_valves": {},
+            "chat_id": "setup-history",
+        },
+    }
+
+
+async def time_scenario(pipe: Pipe, case: dict[str, Any], requests: int) -> list[float]:
+    samples = []
+    for i in range(requests):
+        started = time.perf_counter()
+        await pipe.pipe(
+            body={"model": MODEL_ID, "stream": True, "messages": case["messages"]},
+            __user__={
+                "id": "user-1",
+                "email": "u@example.org",
+                "valves": case["user_valves"],
+            },
+            __request__=None,
+            __event_emitter__=None,
+            __metadata__={
+                "chat_id": case.get("chat_id", "setup-chat"),
+                "message_id": f"msg-{i}",
+                "session_id": "setup",
+                "model": {"id": MODEL_ID},
+                "features": {},
+            },
+            __tools__=case["tools"],
+        )
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def run(args: argparse.Namespace) -> None:
+    pipe = Pipe()
+    pipe.valves.LOG_LEVEL = "WARNING"
+    pipe._run_streaming_loop = skip_loop
+    pipe._run_nonstreaming_loop = skip_loop
+    _stubs.Chats.store["setup-chat"] = {"history": {"messages": {}}}
+
+    print(f"{'scenario':<16} {'p50 µs':>10} {'p90 µs':>10} {'mean µs':>10}")
+    for name, case in scenarios(args.history).items():
+        await time_scenario(pipe, case, 20)  # warm caches
+        samples = sorted(await time_scenario(pipe, case, args.requests))
+        print(
+            f"{name:<16} {samples[len(samples) // 2] * 1e6:>10.1f} "
+            f"{samples[int(len(samples) * 0.9)] * 1e6:>10.1f} "
+            f"{statistics.fmean(samples) * 1e6:>10.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure Pipe.pipe setup overhead.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.db_latency_ms:
+        add_db_latency(args.db_latency_ms / 1000)
+    SessionLogger.log_level.set(logging.WARNING)
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,624 @@
+"""
+Local fake of the OpenAI Responses API (``POST /responses``) for load tests.
+
+Emits realistic SSE event sequences (text deltas, reasoning summaries with
+encrypted reasoning items, function calls, URL-citation annotations and usage)
+at a configurable token rate, with optional failure injection.  Non-streaming
+requests receive the equivalent final response object.
+
+Requests with ``"background": true`` return a ``queued`` response at once; the
+job "runs" for as long as its stream would have taken, and
+``GET /responses/{id}`` reports ``in_progress`` until then and the completed
+response afterwards.  ``POST /responses/{id}/cancel`` cancels it.  Streamed
+background requests can be re-attached to with
+``GET /responses/{id}?stream=true&starting_after=N`` after a (possibly injected)
+disconnect; resumed streams are never disconnected.
+
+Scenarios (``--scenario`` or the ``X-Fake-Scenario`` request header):
+
+- ``text``: plain assistant answer.
+- ``reasoning``: reasoning summary + encrypted reasoning item, then the answer.
+- ``tools``: a function call for the first function tool in the request; the
+  answer follows once the request contains a ``function_call_output``.
+- ``citations``: answer with inline markdown links and ``url_citation`` annotations.
+- ``mixed``: picks one of the above per request (seeded).
+
+Usage::
+
+    python benchmarks/fake_responses_server.py --port 8765 --token-rate 400
+
+Then point the pipe's ``BASE_URL`` valve at ``http://127.0.0.1:8765/v1``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from aiohttp import web
+
+SCENARIOS = ("text", "reasoning", "tools", "citations")
+
+_WORDS = (
+    "the quick brown fox jumps over lazy dogs while students review lecture notes "
+    "about distributed systems latency budgets and careful measurement of throughput"
+).split()
+
+
+@dataclass
+class FakeServerConfig:
+    scenario: str = "mixed"
+    output_tokens: int = 200  # visible answer tokens per response
+    token_rate: float = 0.0  # tokens/second per stream; 0 = as fast as possible
+    ttft: float = 0.0  # seconds before the first output event
+    error_rate: float = 0.0  # probability of an HTTP 500 before streaming starts
+    disconnect_rate: float = 0.0  # probability of dropping the stream halfway
+    seed: int = 0
+    stats: dict[str, int] = field(
+        default_factory=lambda: {
+            "requests": 0,
+            "errors": 0,
+            "disconnects": 0,
+            "background": 0,
+            "polls": 0,
+            "resumes": 0,
+        }
+    )
+
+
+def _text(rng: random.Random, tokens: int) -> list[str]:
+    return [rng.choice(_WORDS) + " " for _ in range(tokens)]
+
+
+def _usage(input_chars: int, output_tokens: int, reasoning_tokens: int = 0) -> dict:
+    input_tokens = max(1, input_chars // 4)
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": input_tokens // 2},
+        "output_tokens": output_tokens + reasoning_tokens,
+        "output_tokens_details": {"reasoning_tokens": reasoning_tokens},
+        "total_tokens": input_tokens + output_tokens + reasoning_tokens,
+    }
+
+
+def _has_pending_tool_result(request: dict) -> bool:
+    """True if the input ends with tool output the model has not answered yet."""
+    for item in reversed(request.get("input") or []):
+        if item.get("type") == "function_call_output":
+            return True
+        if item.get("role") == "user":
+            return False
+    return False
+
+
+def _first_function_tool(request: dict) -> str | None:
+    for tool in request.get("tools") or []:
+        if tool.get("type") == "function" and tool.get("name"):
+            return tool["name"]
+    return None
+
+
+class ResponseScript:
+    """Build the ordered SSE events (without sequence numbers) for one response."""
+
+    def __init__(self, request: dict, scenario: str, config: FakeServerConfig):
+        self.request = request
+        self.scenario = scenario
+        self.config = config
+        self.rng = random.Random(f"{config.seed}:{json.dumps(request)[:512]}")
+        self.response_id = f"resp_{self.rng.getrandbits(64):016x}"
+        self.output: list[dict] = []
+        self.reasoning_tokens = 0
+        self._events: list[tuple[dict, bool]] | None = None
+
+    def _response(self, status: str, usage: dict | None = None) -> dict:
+        return {
+            "id": self.response_id,
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": status,
+            "model": self.request.get("model", ""),
+            "output": list(self.output) if status == "completed" else [],
+            "usage": usage,
+        }
+
+    def events(self) -> list[tuple[dict, bool]]:
+        """Return ``(event, paced)`` pairs; paced events consume one token of budget."""
+        if self._events is None:
+            self._events = self._build()
+        return self._events
+
+    def _build(self) -> list[tuple[dict, bool]]:
+        out: list[tuple[dict, bool]] = [
+            (
+                {"type": "response.created", "response": self._response("in_progress")},
+                False,
+            ),
+            (
+                {
+                    "type": "response.in_progress",
+                    "response": self._response("in_progress"),
+                },
+                False,
+            ),
+        ]
+        if self.scenario == "reasoning":
+            out += self._reasoning()
+        if self.scenario == "tools" and not _has_pending_tool_result(self.request):
+            name = _first_function_tool(self.request)
+            if name:
+                out += self._function_call(name)
+                return out + self._completed(0)
+        out += self._message()
+        return out + self._completed(self.config.output_tokens)
+
+    def _reasoning(self) -> list[tuple[dict, bool]]:
+        item_id = f"rs_{self.rng.getrandbits(48):012x}"
+        idx = len(self.output)
+        summary_tokens = _text(self.rng, 30)
+        summary = "**Planning the answer**\n\n" + "".join(summary_tokens).strip()
+        item = {
+            "type": "reasoning",
+            "id": item_id,
+            "summary": [{"type": "summary_text", "text": summary}],
+            "encrypted_content": base64.b64encode(self.rng.randbytes(1536)).decode(),
+        }
+        self.output.append(item)
+        self.reasoning_tokens = 120
+        events: list[tuple[dict, bool]] = [
+            (
+                {
+                    "type": "response.output_item.added",
+                    "output_index": idx,
+                    "item": {"type": "reasoning", "id": item_id, "summary": []},
+                },
+                False,
+            )
+        ]
+        for tok in ["**Planning the answer**\n\n"] + summary_tokens:
+            events.append(
+                (
+                    {
+                        "type": "response.reasoning_summary_text.delta",
+                        "item_id": item_id,
+                        "output_index": idx,
+                        "summary_index": 0,
+                        "delta": tok,
+                    },
+                    True,
+                )
+            )
+        events.append(
+            (
+                {
+                    "type": "response.reasoning_summary_text.done",
+                    "item_id": item_id,
+                    "output_index": idx,
+                    "summary_index": 0,
+                    "text": summary,
+                },
+                False,
+            )
+        )
+        events.append(
+            (
+                {
+                    "type": "response.output_item.done",
+                    "output_index": idx,
+                    "item": item,
+                },
+                False,
+            )
+        )
+        return events
+
+    def _function_call(self, name: str) -> list[tuple[dict, bool]]:
+        idx = len(self.output)
+        args = json.dumps({"query": " ".join(_text(self.rng, 4)).strip()})
+        item = {
+            "type": "function_call",
+            "id": f"fc_{self.rng.getrandbits(48):012x}",
+            "call_id": f"call_{self.rng.getrandbits(48):012x}",
+            "name": name,
+            "arguments": args,
+            "status": "completed",
+        }
+        self.output.append(item)
+        added = {**item, "arguments": "", "status": "in_progress"}
+        events: list[tuple[dict, bool]] = [
+            (
+                {
+                    "type": "response.output_item.added",
+                    "output_index": idx,
+                    "item": added,
+                },
+                False,
+            )
+        ]
+        for i in range(0, len(args), 8):
+            events.append(
+                (
+                    {
+                        "type": "response.function_call_arguments.delta",
+                        "item_id": item["id"],
+                        "output_index": idx,
+                        "delta": args[i : i + 8],
+                    },
+                    True,
+                )
+            )
+        events.append(
+            (
+                {
+                    "type": "response.function_call_arguments.done",
+                    "item_id": item["id"],
+                    "output_index": idx,
+                    "arguments": args,
+                },
+                False,
+            )
+        )
+        events.append(
+            (
+                {
+                    "type": "response.output_item.done",
+                    "output_index": idx,
+                    "item": item,
+                },
+                False,
+            )
+        )
+        return events
+
+    def _message(self) -> list[tuple[dict, bool]]:
+        idx = len(self.output)
+        item_id = f"msg_{self.rng.getrandbits(48):012x}"
+        tokens = _text(self.rng, self.config.output_tokens)
+        annotations: list[tuple[int, dict]] = []  # (after token index, annotation)
+
+        if self.scenario == "citations":
+            # Insert "([domain](url))" links every ~40 tokens, as the model prints them
+            text_len, with_links = 0, []
+            for i, tok in enumerate(tokens):
+                with_links.append(tok)
+                text_len += len(tok)
+                if i % 40 == 39:
+                    n = len(annotations) + 1
+                    domain = f"source{n % 5}.example.org"
+                    url = f"https://{domain}/article/{n}?utm_source=openai"
+                    link = f"([{domain}]({url})) "
+                    start = text_len
+                    with_links.append(link)
+                    text_len += len(link)
+                    annotations.append(
+                        (
+                            len(with_links) - 1,
+                            {
+                                "type": "url_citation",
+                                "url": url,
+                                "title": f"Article {n} on {domain}",
+                                "start_index": start,
+                                "end_index": text_len - 1,
+                            },
+                        )
+                    )
+            tokens = with_links
+
+        text = "".join(tokens)
+        item = {
+            "type": "message",
+            "id": item_id,
+            "role": "assistant",
+            "status": "completed",
+            "content": [
+                {
+                    "type": "output_text",
+                    "text": text,
+                    "annotations": [a for _, a in annotations],
+                }
+            ],
+        }
+        self.output.append(item)
+
+        events: list[tuple[dict, bool]] = [
+            (
+                {
+                    "type": "response.output_item.added",
+                    "output_index": idx,
+                    "item": {**item, "status": "in_progress", "content": []},
+                },
+                False,
+            ),
+            (
+                {
+                    "type": "response.content_part.added",
+                    "item_id": item_id,
+                    "output_index": idx,
+                    "content_index": 0,
+                    "part": {"type": "output_text", "text": "", "annotations": []},
+                },
+                False,
+            ),
+        ]
+        ann_by_pos = dict(annotations)
+        ann_index = 0
+        for i, tok in enumerate(tokens):
+            events.append(
+                (
+                    {
+                        "type": "response.output_text.delta",
+                        "item_id": item_id,
+                        "output_index": idx,
+                        "content_index": 0,
+                        "delta": tok,
+                    },
+                    True,
+                )
+            )
+            if i in ann_by_pos:
+                events.append(
+                    (
+                        {
+                            "type": "response.output_text.annotation.added",
+                            "item_id": item_id,
+                            "output_index": idx,
+                            "content_index": 0,
+                            "annotation_index": ann_index,
+                            "annotation": ann_by_pos[i],
+                        },
+                        False,
+                    )
+                )
+                ann_index += 1
+        events.append(
+            (
+                {
+                    "type": "response.output_text.done",
+                    "item_id": item_id,
+                    "output_index": idx,
+                    "content_index": 0,
+                    "text": text,
+                },
+                False,
+            )
+        )
+        events.append(
+            (
+                {
+                    "type": "response.output_item.done",
+                    "output_index": idx,
+                    "item": item,
+                },
+                False,
+            )
+        )
+        return events
+
+    def _completed(self, output_tokens: int) -> list[tuple[dict, bool]]:
+        usage = _usage(
+            len(json.dumps(self.request.get("input", ""))),
+            output_tokens,
+            self.reasoning_tokens,
+        )
+        return [
+            (
+                {
+                    "type": "response.completed",
+                    "response": self._response("completed", usage),
+                },
+                False,
+            )
+        ]
+
+    def final_response(self) -> dict:
+        """The non-streaming equivalent of ``events()``."""
+        return self.events()[-1][0]["response"]
+
+
+class FakeResponsesServer:
+    """aiohttp application serving ``POST {prefix}/responses``."""
+
+    def __init__(self, config: FakeServerConfig, prefix: str = "/v1"):
+        self.config = config
+        self.prefix = prefix
+        self.rng = random.Random(config.seed)
+        self.app = web.Application()
+        self.app.router.add_post(f"{prefix}/responses", self.handle_create)
+        self.app.router.add_get(
+            f"{prefix}/responses/{{response_id}}", self.handle_retrieve
+        )
+        self.app.router.add_post(
+            f"{prefix}/responses/{{response_id}}/cancel", self.handle_cancel
+        )
+        self.app.router.add_get("/health", self.handle_health)
+        self.app.router.add_get("/stats", self.handle_stats)
+        self._runner: web.AppRunner | None = None
+        # Background jobs: response id → (script, monotonic time it completes)
+        self.jobs: dict[str, tuple[ResponseScript, float]] = {}
+        self.cancelled: set[str] = set()
+
+    def pick_scenario(self, request: web.Request) -> str:
+        scenario = request.headers.get("X-Fake-Scenario") or self.config.scenario
+        if scenario == "mixed":
+            scenario = self.rng.choice(SCENARIOS)
+        return scenario
+
+    async def _paced(
+        self, script: ResponseScript, starting_after: int = -1
+    ) -> AsyncIterator[dict]:
+        delay = 1 / self.config.token_rate if self.config.token_rate > 0 else 0.0
+        if self.config.ttft and starting_after < 0:
+            await asyncio.sleep(self.config.ttft)
+        for seq, (event, paced) in enumerate(script.events()):
+            if seq <= starting_after:
+                continue
+            if paced and delay:
+                await asyncio.sleep(delay)
+            yield {**event, "sequence_number": seq}
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.config.stats)
+
+    async def handle_create(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.config.stats["requests"] += 1
+
+        if self.rng.random() < self.config.error_rate:
+            self.config.stats["errors"] += 1
+            return web.json_response(
+                {"error": {"message": "Injected failure", "type": "server_error"}},
+                status=500,
+            )
+
+        script = ResponseScript(body, self.pick_scenario(request), self.config)
+        if body.get("background"):
+            queued = self._submit_background(script)
+            if not body.get("stream"):
+                return web.json_response(queued)
+        if not body.get("stream"):
+            if self.config.ttft:
+                await asyncio.sleep(self.config.ttft)
+            return web.json_response(script.final_response())
+
+        resp = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await resp.prepare(request)
+
+        disconnect_at = (
+            len(script.events()) // 2
+            if self.rng.random() < self.config.disconnect_rate
+            else None
+        )
+        return await self._stream(request, resp, script, disconnect_at=disconnect_at)
+
+    async def _stream(
+        self,
+        request: web.Request,
+        resp: web.StreamResponse,
+        script: ResponseScript,
+        *,
+        starting_after: int = -1,
+        disconnect_at: int | None = None,
+    ) -> web.StreamResponse:
+        async for event in self._paced(script, starting_after):
+            if disconnect_at is not None and event["sequence_number"] >= disconnect_at:
+                self.config.stats["disconnects"] += 1
+                request.transport.close()
+                return resp
+            await resp.write(
+                f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+            )
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    def _submit_background(self, script: ResponseScript) -> dict:
+        script.response_id = f"resp_bg_{uuid.uuid4().hex}"
+        paced = sum(1 for _, is_paced in script.events() if is_paced)
+        duration = self.config.ttft + (
+            paced / self.config.token_rate if self.config.token_rate > 0 else 0.0
+        )
+        self.jobs[script.response_id] = (script, time.monotonic() + duration)
+        self.config.stats["background"] += 1
+        return script._response("queued")
+
+    async def handle_retrieve(self, request: web.Request) -> web.StreamResponse:
+        response_id = request.match_info["response_id"]
+        job = self.jobs.get(response_id)
+        if job is None:
+            return web.json_response(
+                {"error": {"message": f"No response with id '{response_id}'"}},
+                status=404,
+            )
+        script, done_at = job
+        if request.query.get("stream") == "true":
+            self.config.stats["resumes"] += 1
+            resp = web.StreamResponse(
+                headers={
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                }
+            )
+            await resp.prepare(request)
+            starting_after = int(request.query.get("starting_after", -1))
+            return await self._stream(
+                request, resp, script, starting_after=starting_after
+            )
+        self.config.stats["polls"] += 1
+        if response_id in self.cancelled:
+            return web.json_response(script._response("cancelled"))
+        if time.monotonic() < done_at:
+            return web.json_response(script._response("in_progress"))
+        return web.json_response(script.final_response())
+
+    async def handle_cancel(self, request: web.Request) -> web.Response:
+        response_id = request.match_info["response_id"]
+        job = self.jobs.get(response_id)
+        if job is None:
+            return web.json_response(
+                {"error": {"message": f"No response with id '{response_id}'"}},
+                status=404,
+            )
+        self.cancelled.add(response_id)
+        return web.json_response(job[0]._response("cancelled"))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving in the current event loop; return the ``BASE_URL``."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        return f"http://{host}:{bound}{self.prefix}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake OpenAI Responses API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", default="mixed", choices=(*SCENARIOS, "mixed"))
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeServerConfig:
+    return FakeServerConfig(
+        scenario=args.scenario,
+        output_tokens=args.output_tokens,
+        token_rate=args.token_rate,
+        ttft=args.ttft,
+        error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    server = FakeResponsesServer(config_from_args(args))
+    print(f"Fake Responses API on http://{args.host}:{args.port}/v1", flush=True)
+    web.run_app(server.app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Fault-injection scenario: upstream streams dropped halfway through the answer.
+
+Runs the same streamed request through ``Pipe.pipe`` against an in-process
+``fake_responses_server`` three times:
+
+1. ``clean``: no faults, ``RESUMABLE_STREAMING`` on (the fake server derives the
+   answer from the request, so the reference must send the same body).
+2. ``dropped``: every stream is cut halfway, ``RESUMABLE_STREAMING`` off.  The
+   turn is expected to fail.
+3. ``resumed``: every stream is cut halfway, ``RESUMABLE_STREAMING`` on.  The
+   pipe should re-attach from the last ``sequence_number`` and produce exactly
+   the reference answer (no lost or duplicated deltas).
+
+Exits with status 1 if the resumed answer differs from the reference or the
+dropped run unexpectedly succeeds.
+
+Usage::
+
+    python benchmarks/fault_injection.py --scenario reasoning --output-tokens 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Any
+
+import _stubs
+from fake_responses_server import FakeResponsesServer, FakeServerConfig
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import Pipe, SessionLogger
+
+MODEL_ID = "openai_responses.o3"
+
+
+class Recorder:
+    """Event emitter keeping the last message content and any error."""
+
+    def __init__(self) -> None:
+        self.content = ""
+        self.error: str | None = None
+
+    async def __call__(self, event: dict[str, Any]) -> None:
+        data = event.get("data", {})
+        if event.get("type") == "chat:message":
+            self.content = data.get("content", "")
+        elif event.get("type") == "chat:completion" and data.get("error"):
+            self.error = data["error"].get("message")
+
+
+async def run_case(
+    args: argparse.Namespace, *, disconnect_rate: float, resumable: bool
+) -> tuple[Recorder, dict[str, int]]:
+    server = FakeResponsesServer(
+        FakeServerConfig(
+            scenario=args.scenario,
+            output_tokens=args.output_tokens,
+            token_rate=args.token_rate,
+            disconnect_rate=disconnect_rate,
+        )
+    )
+    base_url = await server.start()
+    pipe = Pipe()
+    pipe.valves.BASE_URL = base_url
+    pipe.valves.API_KEY = "sk-fake"
+    pipe.valves.RESUMABLE_STREAMING = resumable
+    _stubs.Chats.store["fault-chat"] = {"history": {"messages": {}}}
+    recorder = Recorder()
+    try:
+        await pipe.pipe(
+            body={
+                "model": MODEL_ID,
+                "stream": True,
+                "messages": [{"role": "user", "content": "Explain tail latency."}],
+            },
+            __user__={"id": "user-1", "valves": {}},
+            __request__=None,
+            __event_emitter__=recorder,
+            __metadata__={
+                "chat_id": "fault-chat",
+                "message_id": "fault-msg",
+                "session_id": "fault",
+                "model": {"id": MODEL_ID},
+                "features": {},
+            },
+            __tools__=None,
+        )
+    finally:
+        if pipe.session is not None:
+            await pipe.session.close()
+        await server.stop()
+    return recorder, dict(server.config.stats)
+
+
+def answer(content: str) -> str:
+    """Visible answer text (the status/reasoning blocks carry timings)."""
+    return content.rsplit("</details>", 1)[-1].strip()
+
+
+async def run(args: argparse.Namespace) -> int:
+    clean, _ = await run_case(args, disconnect_rate=0.0, resumable=True)
+    dropped, dropped_stats = await run_case(args, disconnect_rate=1.0, resumable=False)
+    resumed, resumed_stats = await run_case(args, disconnect_rate=1.0, resumable=True)
+
+    reference = answer(clean.content)
+    rows = [
+        ("clean", clean, {}),
+        ("dropped", dropped, dropped_stats),
+        ("resumed", resumed, resumed_stats),
+    ]
+    print(f"{'case':<9} {'answer chars':>12} {'matches':>8} {'resumes':>8}  error")
+    for name, rec, stats in rows:
+        text = answer(rec.content)
+        print(
+            f"{name:<9} {len(text):>12} {str(text == reference):>8} "
+            f"{stats.get('resumes', 0):>8}  {rec.error or ''}"
+        )
+
+    failures = []
+    if not reference:
+        failures.append("clean run produced no answer")
+    if answer(resumed.content) != reference or resumed.error:
+        failures.append("resumed answer differs from the clean run")
+    if dropped.error is None and answer(dropped.content) == reference:
+        failures.append("dropped run succeeded; the fault was not injected")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inject mid-stream disconnects.")
+    parser.add_argument(
+        "--scenario", default="text", choices=("text", "reasoning", "citations")
+    )
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    SessionLogger.log_level.set(logging.ERROR)
+    logging.disable(logging.WARNING)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
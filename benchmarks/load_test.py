@@ -0,0 +1,249 @@
+"""
+Concurrent load test for ``responses_api_manifold_pipe.Pipe`` against the fake server.
+
+Starts ``fake_responses_server.py`` in a subprocess (so its CPU time is not
+attributed to the pipe), then runs ``--requests`` ``Pipe.pipe`` calls with at most
+``--concurrency`` in flight.  Open WebUI's ``Chats``/``Models`` are the in-memory
+stubs from ``_stubs.py``; a small async ``lookup`` tool serves the ``tools``
+scenario.
+
+Reports throughput (requests/s, output tokens/s), TTFT percentiles (first
+visible answer text in a ``chat:message`` frame), CPU time per output token for
+the pipe process, and peak RSS.
+
+Usage::
+
+    python benchmarks/load_test.py --requests 200 --concurrency 20 --token-rate 500
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8765/v1  # external server
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+
+import _stubs
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import Pipe, SessionLogger
+
+HERE = Path(__file__).resolve().parent
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def lookup(query: str) -> str:
+    """Stub tool used by the ``tools`` scenario."""
+    await asyncio.sleep(0.01)
+    return json.dumps({"query": query, "results": ["alpha", "beta", "gamma"]})
+
+
+TOOLS = {
+    "lookup": {
+        "callable": lookup,
+        "spec": {
+            "name": "lookup",
+            "description": "Look something up.",
+            "parameters": {
+                "type": "object",
+                "properties": {"query": {"type": "string"}},
+            },
+        },
+    }
+}
+
+
+class RequestProbe:
+    """Event emitter that timestamps the first visible answer text and keeps usage."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.ttft: float | None = None
+        self.usage: dict[str, Any] = {}
+        self.error: str | None = None
+
+    async def __call__(self, event: dict[str, Any]) -> None:
+        etype = event.get("type")
+        data = event.get("data", {})
+        if etype == "chat:message" and self.ttft is None:
+            # Ignore frames that only carry the status block
+            if data.get("content", "").rsplit("</details>", 1)[-1].strip():
+                self.ttft = time.perf_counter() - self.started
+        elif etype == "chat:completion":
+            if data.get("usage"):
+                self.usage = data["usage"]
+            if data.get("error"):
+                self.error = data["error"].get("message")
+
+
+async def run_one(pipe: Pipe, args: argparse.Namespace, idx: int) -> RequestProbe:
+    chat_id = f"chat-{uuid.uuid4().hex[:12]}"
+    _stubs.Chats.store[chat_id] = {"history": {"messages": {}}}
+    model_id = f"openai_responses.{args.model}"
+    probe = RequestProbe(time.perf_counter())
+    result = await pipe.pipe(
+        body={
+            "model": model_id,
+            "stream": not args.no_stream,
+            "messages": [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": f"Question {idx}: explain latency."},
+            ],
+        },
+        __user__={"id": f"user-{idx % 50}", "email": "u@example.org", "valves": {}},
+        __request__=None,
+        __event_emitter__=probe,
+        __metadata__={
+            "chat_id": chat_id,
+            "message_id": f"msg-{idx}",
+            "session_id": f"session-{idx}",
+            "model": {"id": model_id},
+            "features": {},
+        },
+        __tools__=TOOLS,
+    )
+    if probe.ttft is None and isinstance(result, str) and result:
+        probe.ttft = time.perf_counter() - probe.started  # non-streaming
+    return probe
+
+
+async def wait_healthy(base_url: str, timeout: float = 15.0) -> None:
+    health = base_url.split("/v1")[0] + "/health"
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(health) as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Fake server at {health} did not come up")
+            await asyncio.sleep(0.1)
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    pipe = Pipe()
+    pipe.valves.BASE_URL = args.base_url
+    pipe.valves.API_KEY = "sk-fake"
+    pipe.valves.LOG_LEVEL = "WARNING"
+    pipe.valves.MAX_FUNCTION_CALL_LOOPS = 4
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(i: int) -> RequestProbe:
+        async with semaphore:
+            return await run_one(pipe, args, i)
+
+    await run_one(pipe, args, -1)  # warm up the HTTP session
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    probes = await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    if pipe.session is not None:
+        await pipe.session.close()
+
+    ttfts = [p.ttft for p in probes if p.ttft is not None]
+    output_tokens = sum(int(p.usage.get("output_tokens", 0) or 0) for p in probes)
+    errors = sum(1 for p in probes if p.error)
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(args.requests / wall, 2),
+        "output_tokens_per_s": round(output_tokens / wall, 1),
+        "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1),
+        "ttft_p90_ms": round(percentile(ttfts, 90) * 1000, 1),
+        "ttft_p99_ms": round(percentile(ttfts, 99) * 1000, 1),
+        "ttft_mean_ms": round(statistics.fmean(ttfts) * 1000, 1) if ttfts else None,
+        "cpu_s": round(cpu, 3),
+        "cpu_us_per_output_token": (
+            round(cpu / output_tokens * 1e6, 2) if output_tokens else None
+        ),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the Responses pipe.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument(
+        "--base-url", help="Use an already running server instead of spawning one."
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="Print JSON only.")
+    # Passed through to the spawned fake server
+    parser.add_argument("--scenario", default="mixed")
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    SessionLogger.log_level.set(logging.WARNING)
+
+    server = None
+    if not args.base_url:
+        args.base_url = f"http://127.0.0.1:{args.port}/v1"
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                str(HERE / "fake_responses_server.py"),
+                f"--port={args.port}",
+                f"--scenario={args.scenario}",
+                f"--output-tokens={args.output_tokens}",
+                f"--token-rate={args.token_rate}",
+                f"--ttft={args.ttft}",
+                f"--error-rate={args.error_rate}",
+                f"--disconnect-rate={args.disconnect_rate}",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+    try:
+        asyncio.run(wait_healthy(args.base_url))
+        report = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:<26} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Record SSE streams to disk and replay them through ``Pipe._run_streaming_loop``.
+
+Traces are gzip-compressed JSON lines: a header object, then one line per
+upstream event (``{"l": loop, "e": event}``) and per tool result
+(``{"t": {"call_id", "name", "output"}}``).  Replay feeds the recorded events to
+the streaming loop as fast as it can consume them, with a null event emitter
+and in-memory Open WebUI stubs, so the measurement is the pipe's own per-event
+CPU cost.
+
+The time between handing an event to the loop and the loop asking for the next
+one is attributed to that event's handler (``delta``, ``annotation``,
+``output_item.done``, ``completed`` or ``other``).
+
+Subcommands::
+
+    # Synthesize tool-heavy / citation-heavy traces from the fake server's scripts
+    python benchmarks/replay_streaming.py synth --out benchmarks/traces
+
+    # Capture a real stream (any Responses-compatible endpoint)
+    python benchmarks/replay_streaming.py record --base-url https://api.openai.com/v1 \\
+        --api-key sk-... --model gpt-4.1 --prompt "Search the web for ..." --out trace.jsonl.gz
+
+    # Save a baseline on this machine (timings are not portable, so none is committed)
+    python benchmarks/replay_streaming.py replay benchmarks/traces/*.jsonl.gz \\
+        --repeat 20 --save-baseline benchmarks/baselines/replay.json
+
+    # Replay + per-handler profile; exit 1 if a handler regressed past the threshold
+    python benchmarks/replay_streaming.py replay benchmarks/traces/*.jsonl.gz \\
+        --repeat 20 --baseline benchmarks/baselines/replay.json --threshold 1.3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncGenerator
+
+import _stubs
+from fake_responses_server import FakeServerConfig, ResponseScript
+
+from dartmouth_chat_tools.responses_api_manifold_pipe import (
+    Pipe,
+    ResponsesBody,
+    SessionLogger,
+)
+
+HANDLERS = {
+    "response.output_text.delta": "delta",
+    "response.output_text.annotation.added": "annotation",
+    "response.output_item.done": "output_item.done",
+    "response.completed": "completed",
+}
+
+
+# ─── Trace I/O ──────────────────────────────────────────────────────────────
+class Trace:
+    def __init__(self, header: dict[str, Any]):
+        self.header = header
+        self.loops: list[list[dict]] = []
+        self.tool_outputs: dict[str, dict] = {}  # call_id → {name, output}
+
+    def add_event(self, loop: int, event: dict) -> None:
+        while len(self.loops) <= loop:
+            self.loops.append([])
+        self.loops[loop].append(event)
+
+    def dump(self, path: Path) -> None:
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            fh.write(json.dumps(self.header, separators=(",", ":")) + "\n")
+            for loop, events in enumerate(self.loops):
+                for event in events:
+                    fh.write(json.dumps({"l": loop, "e": event}, separators=(",", ":")))
+                    fh.write("\n")
+            for call_id, out in self.tool_outputs.items():
+                line = {"t": {"call_id": call_id, **out}}
+                fh.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: Path) -> "Trace":
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            trace = cls(json.loads(fh.readline()))
+            for line in fh:
+                rec = json.loads(line)
+                if "e" in rec:
+                    trace.add_event(rec["l"], rec["e"])
+                else:
+                    t = rec["t"]
+                    trace.tool_outputs[t["call_id"]] = {
+                        "name": t["name"],
+                        "output": t["output"],
+                    }
+        return trace
+
+    def tool_names(self) -> set[str]:
+        names = {out["name"] for out in self.tool_outputs.values()}
+        for events in self.loops:
+            for event in events:
+                item = event.get("item") or {}
+                if item.get("type") == "function_call":
+                    names.add(item["name"])
+        return names
+
+
+# ─── synth ──────────────────────────────────────────────────────────────────
+def synth_trace(scenario: str, output_tokens: int, tool_rounds: int) -> Trace:
+    """Build a trace from ``ResponseScript``: ``tool_rounds`` tool-call loops, then an answer."""
+    config = FakeServerConfig(scenario=scenario, output_tokens=output_tokens)
+    trace = Trace(
+        {"version": 1, "source": "synth", "scenario": scenario, "model": "gpt-4.1"}
+    )
+    base: dict[str, Any] = {
+        "model": "gpt-4.1",
+        "tools": [{"type": "function", "name": "lookup"}],
+    }
+    for loop in range(tool_rounds + 1):
+        user = {
+            "role": "user",
+            "content": [{"type": "input_text", "text": f"round {loop}"}],
+        }
+        input_items: list[dict] = [user]
+        if loop == tool_rounds and tool_rounds:
+            input_items.append(
+                {"type": "function_call_output", "call_id": "x", "output": ""}
+            )
+        script = ResponseScript({**base, "input": input_items}, scenario, config)
+        for seq, (event, _) in enumerate(script.events()):
+            trace.add_event(loop, {**event, "sequence_number": seq})
+        for item in script.final_response()["output"]:
+            if item.get("type") == "function_call":
+                output = json.dumps({"results": ["alpha " * 40, "beta " * 40]})
+                trace.tool_outputs[item["call_id"]] = {
+                    "name": item["name"],
+                    "output": output,
+                }
+    return trace
+
+
+def cmd_synth(args: argparse.Namespace) -> None:
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    specs = {
+        "tool_heavy": ("tools", 200, 6),
+        "citation_heavy": ("citations", 2000, 0),
+        "reasoning": ("reasoning", 600, 0),
+        "plain_long": ("text", 4000, 0),
+    }
+    for name, (scenario, tokens, rounds) in specs.items():
+        path = out / f"{name}.jsonl.gz"
+        synth_trace(scenario, tokens, rounds).dump(path)
+        print(f"wrote {path} ({path.stat().st_size / 1024:.1f} KiB)")
+
+
+# ─── record ─────────────────────────────────────────────────────────────────
+def cmd_record(args: argparse.Namespace) -> None:
+    from load_test import TOOLS  # stub tools the model may call
+
+    trace = Trace({"version": 1, "source": "record", "model": args.model})
+    pipe = Pipe()
+    pipe.valves.BASE_URL = args.base_url
+    pipe.valves.API_KEY = args.api_key
+    pipe.valves.ENABLE_WEB_SEARCH_TOOL = args.web_search
+    original = pipe.send_openai_responses_streaming_request
+    loop_counter = {"n": 0}
+    call_outputs: dict[str, Any] = {}
+
+    async def recording(request_body, api_key, base_url):
+        loop = loop_counter["n"]
+        loop_counter["n"] += 1
+        for item in request_body.get("input") or []:
+            if isinstance(item, dict) and item.get("type") == "function_call_output":
+                call_outputs[item["call_id"]] = item.get("output", "")
+        async for event in original(request_body, api_key=api_key, base_url=base_url):
+            trace.add_event(loop, event)
+            yield event
+
+    pipe.send_openai_responses_streaming_request = recording
+
+    async def run() -> None:
+        await pipe.pipe(
+            body={
+                "model": f"openai_responses.{args.model}",
+                "stream": True,
+                "messages": [{"role": "user", "content": args.prompt}],
+            },
+            __user__={"id": "recorder", "email": "recorder@example.org", "valves": {}},
+            __request__=None,
+            __event_emitter__=null_emitter,
+            __metadata__={
+                "chat_id": "record",
+                "message_id": "record",
+                "model": {"id": f"openai_responses.{args.model}"},
+                "features": {},
+            },
+            __tools__=TOOLS,
+        )
+        if pipe.session is not None:
+            await pipe.session.close()
+
+    _stubs.Chats.store["record"] = {"history": {"messages": {}}}
+    asyncio.run(run())
+
+    # Recover tool results from the follow-up requests' function_call_output items
+    for events in trace.loops:
+        for event in events:
+            item = event.get("item") or {}
+            if (
+                event.get("type") == "response.output_item.done"
+                and item.get("type") == "function_call"
+            ):
+                trace.tool_outputs.setdefault(
+                    item["call_id"],
+                    {
+                        "name": item["name"],
+                        "output": call_outputs.get(item["call_id"], ""),
+                    },
+                )
+    trace.dump(Path(args.out))
+    print(
+        f"wrote {args.out}: {sum(len(e) for e in trace.loops)} events in {len(trace.loops)} loops"
+    )
+
+
+# ─── replay ─────────────────────────────────────────────────────────────────
+async def null_emitter(event: dict[str, Any]) -> None:
+    return None
+
+
+async def replay_once(trace: Trace, profile: dict[str, list[float]]) -> None:
+    pipe = Pipe()
+    pipe.valves.LOG_LEVEL = "WARNING"
+    pipe.valves.PERSIST_REASONING_TOKENS = "conversation"
+    loop_counter = {"n": 0}
+
+    async def replay(request_body, api_key, base_url) -> AsyncGenerator[dict, None]:
+        events = trace.loops[loop_counter["n"]]
+        loop_counter["n"] += 1
+        perf = time.perf_counter_ns
+        for event in events:
+            handler = HANDLERS.get(event.get("type"), "other")
+            started = perf()
+            try:
+                yield event
+            finally:  # ``response.completed`` ends the loop without another __anext__
+                profile[handler][0] += perf() - started
+                profile[handler][1] += 1
+
+    pipe.send_openai_responses_streaming_request = replay
+
+    def make_tool(name: str):
+        outputs = [
+            o["output"] for o in trace.tool_outputs.values() if o["name"] == name
+        ]
+
+        async def tool(**kwargs):
+            return outputs[0] if outputs else ""
+
+        return tool
+
+    tools = {name: {"callable": make_tool(name)} for name in trace.tool_names()}
+    chat_id = "replay"
+    _stubs.Chats.store[chat_id] = {"history": {"messages": {}}}
+    body = ResponsesBody(
+        model=trace.header.get("model", "gpt-4.1"),
+        input=[{"role": "user", "content": [{"type": "input_text", "text": "hi"}]}],
+        stream=True,
+    )
+    await pipe._run_streaming_loop(
+        body,
+        pipe.valves,
+        null_emitter,
+        {
+            "chat_id": chat_id,
+            "message_id": "m",
+            "model": {"id": "openai_responses.replay"},
+        },
+        tools,
+    )
+
+
+def run_replay(path: Path, repeat: int) -> dict[str, dict[str, float]]:
+    trace = Trace.load(path)
+    profile: dict[str, list[float]] = defaultdict(lambda: [0, 0])
+
+    async def go() -> None:
+        await replay_once(trace, defaultdict(lambda: [0, 0]))  # warm-up
+        for _ in range(repeat):
+            await replay_once(trace, profile)
+
+    asyncio.run(go())
+    return {
+        handler: {
+            "events": count,
+            "total_ms": total / 1e6,
+            "ns_per_event": total / count if count else 0.0,
+        }
+        for handler, (total, count) in sorted(profile.items())
+    }
+
+
+def cmd_replay(args: argparse.Namespace) -> int:
+    SessionLogger.log_level.set(logging.WARNING)
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for path in map(Path, args.traces):
+        results[path.name] = run_replay(path, args.repeat)
+
+    for name, profile in results.items():
+        grand = sum(p["total_ms"] for p in profile.values()) or 1.0
+        print(f"\n{name}")
+        print(
+            f"  {'handler':<18} {'events':>8} {'total ms':>10} {'ns/event':>10} {'share':>7}"
+        )
+        for handler, p in profile.items():
+            print(
+                f"  {handler:<18} {p['events']:>8} {p['total_ms']:>10.2f} "
+                f"{p['ns_per_event']:>10.0f} {p['total_ms'] / grand:>7.1%}"
+            )
+
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nsaved baseline to {args.save_baseline}")
+
+    if not args.baseline:
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    failures = []
+    for name, profile in results.items():
+        for handler, p in profile.items():
+            base = baseline.get(name, {}).get(handler)
+            if not base or not base.get("ns_per_event"):
+                continue
+            ratio = p["ns_per_event"] / base["ns_per_event"]
+            if ratio > args.threshold:
+                failures.append(f"{name}:{handler} {ratio:.2f}x baseline")
+    if failures:
+        print("\nREGRESSION (threshold {:.2f}x):".format(args.threshold))
+        for f in failures:
+            print(f"  {f}")
+        return 1
+    print(f"\nOK: no handler above {args.threshold:.2f}x baseline")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record/replay SSE traces.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("synth", help="Write synthetic traces from fake-server scripts.")
+    p.add_argument("--out", default=str(Path(__file__).parent / "traces"))
+
+    p = sub.add_parser("record", help="Capture a real stream through the pipe.")
+    p.add_argument("--base-url", required=True)
+    p.add_argument("--api-key", required=True)
+    p.add_argument("--model", default="gpt-4.1")
+    p.add_argument("--prompt", required=True)
+    p.add_argument("--web-search", action="store_true")
+    p.add_argument("--out", required=True)
+
+    p = sub.add_parser("replay", help="Replay traces and print a per-handler profile.")
+    p.add_argument("traces", nargs="+")
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--baseline", help="JSON baseline to compare against.")
+    p.add_argument("--threshold", type=float, default=1.3)
+    p.add_argument("--save-baseline", help="Write this run's profile as a baseline.")
+
+    args = parser.parse_args()
+    if args.cmd == "synth":
+        cmd_synth(args)
+    elif args.cmd == "record":
+        cmd_record(args)
+    else:
+        sys.exit(cmd_replay(args))
+
+
+if __name__ == "__main__":
+    main()
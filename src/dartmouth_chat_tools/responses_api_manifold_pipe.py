@@ -20,17 +20,26 @@ from __future__ import annotations
 # Standard library imports
 import textwrap
 from typing import Tuple
+import abc
 import asyncio
+import base64
+import bisect
+import contextlib
 import datetime
+import functools
+import hashlib
 import inspect
 import json
 import logging
+import logging.handlers
 import os
 import re
 import sys
-import secrets
+import queue
+import threading
 import time
-from collections import defaultdict, deque
+import zlib
+from collections import OrderedDict, defaultdict, deque
 from contextvars import ContextVar
 from typing import (
     Any,
@@ -38,6 +47,7 @@ from typing import (
     Awaitable,
     Callable,
     Dict,
+    Iterable,
     List,
     Literal,
     Optional,
@@ -48,7 +58,7 @@ from urllib.parse import urlparse
 # Third-party imports
 import aiohttp
 from fastapi import Request
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 # Open WebUI internals
 from open_webui.models.chats import Chats
@@ -135,11 +145,60 @@ FEATURE_SUPPORT = {
     },  # OpenAI's deep research models.
 }
 
+# Alias mapping: pseudo ID -> (real model, reasoning effort)
+MODEL_ALIASES: Dict[str, Tuple[str, Optional[str]]] = {
+    # GPT-5 Thinking family
+    "gpt-5-thinking": ("gpt-5", None),
+    "gpt-5-thinking-minimal": ("gpt-5", "minimal"),
+    "gpt-5-thinking-high": ("gpt-5", "high"),
+    "gpt-5-thinking-mini": ("gpt-5-mini", None),
+    "gpt-5-thinking-mini-minimal": ("gpt-5-mini", "minimal"),
+    "gpt-5-thinking-nano": ("gpt-5-nano", None),
+    "gpt-5-thinking-nano-minimal": ("gpt-5-nano", "minimal"),
+    # Placeholder router
+    "gpt-5-auto": ("gpt-5-chat-latest", None),
+    # Backwards compatibility
+    "o3-mini-high": ("o3-mini", "high"),
+    "o4-mini-high": ("o4-mini", "high"),
+}
+
+# Seconds a worker reuses an Open WebUI model record before reading it again
+MODEL_RECORD_TTL = 60
+
+# Reconnects allowed per streamed response with RESUMABLE_STREAMING
+MAX_STREAM_RESUMES = 5
+
+# Dated snapshot suffix, e.g. 'o3-2025-04-16' → family 'o3'
+SNAPSHOT_SUFFIX_RE = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+# Offloaded image references: hex SHA-256 and a short file extension
+IMAGE_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+IMAGE_EXT_RE = re.compile(r"[a-z0-9]{1,5}")
+
+# Characters searched before a citation's start_index for the model's '([domain](url))' link
+CITATION_WINDOW_SLACK = 16
+
+# Bold header in a reasoning summary part, e.g. '**Planning the search**'
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
 DETAILS_RE = re.compile(
     r"<details\b[^>]*>.*?</details>|!\[.*?]\(.*?\)",
     re.S | re.I,
 )
 
+HISTORY_SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Update the previous summary (if any) with the new turns. Keep facts, decisions, names, "
+    "numbers, open questions and the user's stated preferences; drop pleasantries. "
+    "Write terse bullet points in the conversation's language and return only the summary."
+)
+HISTORY_SUMMARY_MESSAGE_CHARS = (
+    4000  # per-message cap in the transcript sent for summarization
+)
+
+# Input item keys holding image/file data rather than text (skipped by token estimates)
+NON_TEXT_KEYS = frozenset({"image_url", "file_data", "result"})
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. Data Models
@@ -169,25 +228,8 @@ class CompletionsBody(BaseModel):
 
         key = m.lower()
 
-        # Alias mapping: pseudo ID -> (real model, reasoning effort)
-        aliases = {
-            # GPT-5 Thinking family
-            "gpt-5-thinking": ("gpt-5", None),
-            "gpt-5-thinking-minimal": ("gpt-5", "minimal"),
-            "gpt-5-thinking-high": ("gpt-5", "high"),
-            "gpt-5-thinking-mini": ("gpt-5-mini", None),
-            "gpt-5-thinking-mini-minimal": ("gpt-5-mini", "minimal"),
-            "gpt-5-thinking-nano": ("gpt-5-nano", None),
-            "gpt-5-thinking-nano-minimal": ("gpt-5-nano", "minimal"),
-            # Placeholder router
-            "gpt-5-auto": ("gpt-5-chat-latest", None),
-            # Backwards compatibility
-            "o3-mini-high": ("o3-mini", "high"),
-            "o4-mini-high": ("o4-mini", "high"),
-        }
-
-        if key in aliases:
-            real, effort = aliases[key]
+        if key in MODEL_ALIASES:
+            real, effort = MODEL_ALIASES[key]
             self.model = real
             if effort:
                 self.reasoning_effort = effort  # type: ignore[assignment]
@@ -197,6 +239,24 @@ class CompletionsBody(BaseModel):
         return self
 
 
+class ModelCapabilities(BaseModel):
+    """
+    Frozen record of the FEATURE_SUPPORT flags for one model ID (see ``ModelRegistry``).
+    """
+
+    model_id: str
+    family: str
+    web_search_tool: bool = False
+    image_gen_tool: bool = False
+    function_calling: bool = False
+    reasoning: bool = False
+    reasoning_summary: bool = False
+    verbosity: bool = False
+    deep_research: bool = False
+
+    model_config = ConfigDict(frozen=True)
+
+
 class ResponsesBody(BaseModel):
     """
     Represents the body of a responses request to OpenAI Responses API.
@@ -331,7 +391,7 @@ class ResponsesBody(BaseModel):
         try:
             data = json.loads(mcp_json)
         except Exception as exc:  # malformed JSON
-            logging.getLogger(__name__).warning(
+            SessionLogger.get_logger(__name__).warning(
                 "REMOTE_MCP_SERVERS_JSON could not be parsed (%s); ignoring.", exc
             )
             return []
@@ -342,7 +402,7 @@ class ResponsesBody(BaseModel):
         valid_tools: list[dict] = []
         for idx, obj in enumerate(items, start=1):
             if not isinstance(obj, dict):
-                logging.getLogger(__name__).warning(
+                SessionLogger.get_logger(__name__).warning(
                     "REMOTE_MCP_SERVERS_JSON item %d ignored: not an object.", idx
                 )
                 continue
@@ -351,7 +411,7 @@ class ResponsesBody(BaseModel):
             label = obj.get("server_label")
             url = obj.get("server_url")
             if not (label and url):
-                logging.getLogger(__name__).warning(
+                SessionLogger.get_logger(__name__).warning(
                     "REMOTE_MCP_SERVERS_JSON item %d ignored: "
                     "'server_label' and 'server_url' are required.",
                     idx,
@@ -378,6 +438,12 @@ class ResponsesBody(BaseModel):
         messages: List[Dict[str, Any]],
         chat_id: Optional[str] = None,
         openwebui_model_id: Optional[str] = None,
+        *,
+        rehydrate_images: bool = True,
+        image_dir: str = "",
+        reasoning_retention: str = "all",
+        reasoning_retention_limit: int = 0,
+        apply_history_summary: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Build an OpenAI Responses-API `input` array from Open WebUI-style messages.
@@ -388,36 +454,64 @@ class ResponsesBody(BaseModel):
         correct order. When either parameter is missing, the messages are simply
         converted without attempting to fetch persisted items.
 
+        Offloaded images are read back from ``image_dir`` (``IMAGE_OFFLOAD_DIR``)
+        only when ``rehydrate_images`` is true; otherwise they are sent without a result.
+        ``reasoning_retention``/``reasoning_retention_limit`` select which earlier
+        turns keep their persisted reasoning items (see ``REASONING_RETENTION``).
+        With ``apply_history_summary``, turns covered by the chat's stored rolling
+        summary are replaced by a single developer message holding that summary.
+
         Returns
         -------
         List[dict] : The fully-formed `input` list for the OpenAI Responses API.
         """
 
+        # Replace the turns already covered by the rolling summary (if still valid);
+        # the chat read here is reused for the persisted items below
+        chat: Optional[Dict[str, Any]] = None
+        if apply_history_summary and chat_id:
+            chat_model = Chats.get_chat_by_id(chat_id)
+            chat = chat_model.chat if chat_model else {}
+            summary = chat.get("openai_responses_pipe", {}).get("history_summary")
+            if summary:
+                messages = substitute_history_summary(messages, summary)
+
+        # Tokenize every assistant message once: <details>/image blocks are
+        # dropped and the rest split into text and marker segments.  Content
+        # given as a list of parts is flattened to its text first.
+        scanned: dict[int, list[dict]] = {}
         required_item_ids: set[str] = set()
-
-        # Gather all markers from assistant messages (if both IDs are provided)
-        if chat_id and openwebui_model_id:
-            for m in messages:
-                if (
-                    m.get("role") == "assistant"
-                    and m.get("content")
-                    and contains_marker(m["content"])
-                ):
-                    for mk in extract_markers(m["content"], parsed=True):
-                        required_item_ids.add(mk["ulid"])
+        for idx, m in enumerate(messages):
+            if m.get("role") not in ("system", "user", "developer"):
+                segments = scan_assistant_content(content_text(m.get("content")))
+                scanned[idx] = segments
+                if chat_id and openwebui_model_id:
+                    required_item_ids.update(
+                        seg["ulid"] for seg in segments if seg["type"] == "marker"
+                    )
 
         # Fetch persisted items if both IDs are provided and there are encoded item IDs
-        items_lookup: dict[str, dict] = {}
+        items_lookup: dict[str, Any] = {}
         if chat_id and openwebui_model_id and required_item_ids:
             items_lookup = fetch_openai_response_items(
                 chat_id,
                 list(required_item_ids),
                 openwebui_model_id=openwebui_model_id,
+                rehydrate_images=rehydrate_images,
+                image_dir=image_dir,
+                chat=chat,
+            )
+
+        drop_reasoning: set[int] = set()
+        if reasoning_retention != "all" and items_lookup:
+            drop_reasoning = reasoning_turns_to_drop(
+                scanned, items_lookup, reasoning_retention, reasoning_retention_limit
             )
+        dropped_items = dropped_tokens = 0
 
         # Build the OpenAI input array
         openai_input: list[dict] = []
-        for msg in messages:
+        for idx, msg in enumerate(messages):
             role = msg.get("role")
             raw_content = msg.get("content", "")
 
@@ -469,41 +563,50 @@ class ResponsesBody(BaseModel):
                 continue
 
             # -------- assistant message ----------------------------------- #
-            # Assistant messages might contain <details> or embedded images that need stripping
-            if "<details" in raw_content or "![" in raw_content:
-                content = DETAILS_RE.sub("", raw_content).strip()
-            else:
-                content = raw_content
-
-            if contains_marker(content):
-                for segment in split_text_by_markers(content):
-                    if segment["type"] == "marker":
-                        mk = parse_marker(segment["marker"])
-                        item = items_lookup.get(mk["ulid"])
-                        if item is not None:
-                            openai_input.append(item)
-                    elif segment["type"] == "text" and segment["text"].strip():
-                        openai_input.append(
-                            {
-                                "role": "assistant",
-                                "content": [
-                                    {
-                                        "type": "output_text",
-                                        "text": segment["text"].strip(),
-                                    }
-                                ],
-                            }
-                        )
-            else:
-                # Plain assistant text (no encoded IDs detected)
-                if content:
+            # <details> blocks and embedded images were stripped by the scan above
+            for segment in scanned[idx]:
+                if segment["type"] == "marker":
+                    item = items_lookup.get(segment["ulid"])
+                    # v3 batch markers resolve to a list of items
+                    for it in item if isinstance(item, list) else [item]:
+                        if it is None:
+                            continue
+                        if idx in drop_reasoning and it.get("type") == "reasoning":
+                            dropped_items += 1
+                            dropped_tokens += estimate_item_tokens(it)
+                            continue
+                        openai_input.append(it)
+                    continue
+                text = segment["text"].strip()
+                if text:
                     openai_input.append(
                         {
                             "role": "assistant",
-                            "content": [{"type": "output_text", "text": content}],
+                            "content": [{"type": "output_text", "text": text}],
                         }
                     )
 
+        if dropped_items:
+            model = metrics_model_label(openwebui_model_id or "")
+            SessionLogger.get_logger(__name__).info(
+                "Reasoning retention '%s' dropped %d reasoning items (~%d tokens)",
+                reasoning_retention,
+                dropped_items,
+                dropped_tokens,
+            )
+            pipe_metrics.inc(
+                "reasoning_items_dropped_total",
+                dropped_items,
+                model=model,
+                policy=reasoning_retention,
+            )
+            pipe_metrics.inc(
+                "reasoning_tokens_saved_total",
+                dropped_tokens,
+                model=model,
+                policy=reasoning_retention,
+            )
+
         return openai_input
 
     @classmethod
@@ -512,6 +615,12 @@ class ResponsesBody(BaseModel):
         completions_body: "CompletionsBody",
         chat_id: Optional[str] = None,
         openwebui_model_id: Optional[str] = None,
+        *,
+        rehydrate_images: bool = True,
+        image_dir: str = "",
+        reasoning_retention: str = "all",
+        reasoning_retention_limit: int = 0,
+        apply_history_summary: bool = False,
         **extra_params,
     ) -> "ResponsesBody":
         """
@@ -580,10 +689,21 @@ class ResponsesBody(BaseModel):
         # Transform input messages to OpenAI Responses API format
         if "messages" in completions_dict:
             sanitized_params.pop("messages", None)
+            conversion_started = time.perf_counter()
             sanitized_params["input"] = ResponsesBody.transform_messages_to_input(
                 completions_dict.get("messages", []),
                 chat_id=chat_id,
                 openwebui_model_id=openwebui_model_id,
+                rehydrate_images=rehydrate_images,
+                image_dir=image_dir,
+                reasoning_retention=reasoning_retention,
+                reasoning_retention_limit=reasoning_retention_limit,
+                apply_history_summary=apply_history_summary,
+            )
+            pipe_metrics.observe(
+                "history_conversion_seconds",
+                time.perf_counter() - conversion_started,
+                model=completions_body.model,
             )
 
         # Build the final ResponsesBody directly
@@ -642,6 +762,22 @@ class Pipe:
                 description="REQUIRES VERIFIED OPENAI ORG. If verified, highly recommend using 'response' or 'conversation' for best results. If `disabled` (default) = never request encrypted reasoning tokens; if `response` = request tokens so the model can carry reasoning across tool calls for the current response; If `conversation` = also persist tokens for future messages in this chat (higher token usage; quality may vary).",
             )
         )
+        REASONING_RETENTION: Literal[
+            "all", "last_turns", "tool_turns", "token_budget"
+        ] = Field(
+            default="all",
+            description=(
+                "Which persisted reasoning items (PERSIST_REASONING_TOKENS='conversation') are re-sent on later turns. "
+                "'all' (default) = every turn; 'last_turns' = only the last REASONING_RETENTION_LIMIT assistant turns; "
+                "'tool_turns' = only turns that made tool calls; 'token_budget' = newest turns first until "
+                "REASONING_RETENTION_LIMIT (estimated) tokens are used."
+            ),
+        )
+        REASONING_RETENTION_LIMIT: int = Field(
+            default=3,
+            ge=0,
+            description="Number of turns ('last_turns') or token budget ('token_budget') for REASONING_RETENTION.",
+        )
 
         # 4) Tool execution behavior
         PARALLEL_TOOL_CALLS: bool = Field(
@@ -686,6 +822,72 @@ class Pipe:
             default=True,
             description="Persist tool call results across conversation turns. When disabled, tool results are not stored in the chat history.",
         )
+        PAYLOAD_COMPRESSION: Literal["disabled", "zlib", "zstd"] = Field(
+            default="disabled",
+            description=(
+                "Compress persisted item payloads larger than PAYLOAD_COMPRESSION_MIN_KB (encrypted reasoning, "
+                "generated images, large tool outputs) and store identical payloads only once. 'zstd' needs the "
+                "'zstandard' package and falls back to zlib without it. Items stored this way can only be read "
+                "by pipe versions that support compression."
+            ),
+        )
+        PAYLOAD_COMPRESSION_MIN_KB: int = Field(
+            default=8,
+            ge=0,
+            description="Payloads smaller than this (serialized, in KB) are stored verbatim.",
+        )
+        IMAGE_OFFLOAD_DIR: str = Field(
+            default="",
+            description=(
+                "Directory for generated images (image_generation_call results). When set, the base64 result "
+                "is written once to a content-addressed file and the persisted item keeps only a reference, "
+                "e.g. 'data/openai_responses/images' inside Open WebUI's DATA_DIR. Earlier images are read back "
+                "from this directory, so moving it requires moving the files. Leave empty to store images inline."
+            ),
+        )
+        IMAGE_HISTORY_MODE: Literal["rehydrate", "reference"] = Field(
+            default="rehydrate",
+            description=(
+                "How offloaded images from earlier turns are sent back to the model: 'rehydrate' reads the file "
+                "and resends the image; 'reference' sends the image_generation_call item without its result "
+                "(smaller requests, but the model can no longer see or edit the earlier image)."
+            ),
+        )
+        ITEM_COMPACTION_INTERVAL: int = Field(
+            default=0,
+            ge=0,
+            description=(
+                "Minimum seconds between automatic compactions of a chat's persisted Responses items. "
+                "Compaction runs in the background when a turn starts and drops items of deleted/regenerated "
+                "messages (and old reasoning, see COMPACTION_KEEP_REASONING_TURNS). 0 (default) disables it."
+            ),
+        )
+        COMPACTION_KEEP_REASONING_TURNS: Optional[int] = Field(
+            default=None,
+            ge=0,
+            description=(
+                "During compaction, keep persisted reasoning items only for the most recent N assistant "
+                "turns. Leave empty to keep all reasoning items."
+            ),
+        )
+        HISTORY_SUMMARY_TRIGGER_TOKENS: int = Field(
+            default=0,
+            ge=0,
+            description=(
+                "Once a chat's request input is estimated above this many tokens, older turns are summarized "
+                "in the background by HISTORY_SUMMARY_MODEL and later requests send the summary in their place. "
+                "The summary is extended incrementally as the chat grows. 0 (default) disables it."
+            ),
+        )
+        HISTORY_SUMMARY_MODEL: str = Field(
+            default="gpt-4.1-nano",
+            description="Model used to write rolling history summaries (a cheap model is sufficient).",
+        )
+        HISTORY_SUMMARY_KEEP_MESSAGES: int = Field(
+            default=6,
+            ge=1,
+            description="Number of most recent user/assistant messages that are never summarized.",
+        )
 
         # 8) Integrations
         REMOTE_MCP_SERVERS_JSON: Optional[str] = Field(
@@ -694,12 +896,21 @@ class Pipe:
                 "[EXPERIMENTAL] A JSON-encoded list (or single JSON object) defining one or more "
                 "remote MCP servers to be automatically attached to each request. This can be useful "
                 "for globally enabling tools across all chats.\n\n"
-                "Note: The Responses API currently caches MCP server definitions at the start of each chat. "
-                "This means the first message in a new thread may be slower. A more efficient implementation is planned."
+                "Note: The Responses API lists each MCP server's tools at the start of each chat, so the first "
+                "message in a new thread may be slower (see MCP_TOOLS_CACHE_TTL). "
                 "Each item must follow the MCP tool schema supported by the OpenAI Responses API, for example:\n"
                 '[{"server_label":"deepwiki","server_url":"https://mcp.deepwiki.com/mcp","require_approval":"never","allowed_tools": ["ask_question"]}]'
             ),
         )
+        MCP_TOOLS_CACHE_TTL: int = Field(
+            default=0,
+            ge=0,
+            description=(
+                "Seconds to reuse the tool listing (mcp_list_tools item) of each REMOTE_MCP_SERVERS_JSON server. "
+                "Cached listings are added to the input of chats that have none, so the provider skips the "
+                "listing round trip. Keyed by server_label, server_url and allowed_tools. 0 (default) disables it."
+            ),
+        )
 
         TRUNCATION: Literal["auto", "disabled"] = Field(
             default="auto",
@@ -716,6 +927,44 @@ class Pipe:
                 "When not set, the default behavior is 'auto'."
             ),
         )
+        TASK_MODEL: str = Field(
+            default="",
+            description=(
+                "Model for Open WebUI task requests (titles, tags, follow-ups, etc.), e.g. 'gpt-4.1-nano'. "
+                "Leave empty to use the chat's model."
+            ),
+        )
+        TASK_SERVICE_TIER: Optional[Literal["auto", "default", "flex", "priority"]] = (
+            Field(
+                default=None,
+                description=(
+                    "service_tier for task requests and history summaries. 'flex' is cheaper but slower and "
+                    "may be unavailable; such requests are retried once with 'auto'. Leave empty to send none."
+                ),
+            )
+        )
+        BATCH_BACKEND: Literal["disabled", "openai", "local"] = Field(
+            default="disabled",
+            description=(
+                "Send deferrable requests (task types listed in BATCH_REQUEST_TOLERANCES, and tools that call "
+                "Pipe.submit_deferred_request) as batch jobs instead of individual calls. 'openai' uses the "
+                "Batch API (/files + /batches; lower cost, completes within 24h), 'local' runs each batch as "
+                "concurrent direct calls (for testing). 'disabled' (default) sends every request directly."
+            ),
+        )
+        BATCH_REQUEST_TOLERANCES: str = Field(
+            default="{}",
+            description=(
+                'JSON object mapping request types to the seconds they may wait, e.g. {"tags_generation": 3600, '
+                '"follow_up_generation": 3600}. Only listed types are batched; a request whose batch has not '
+                "finished within its tolerance is sent directly instead."
+            ),
+        )
+        BATCH_POLL_INTERVAL: float = Field(
+            default=30.0,
+            gt=0,
+            description="Seconds between status checks of submitted batch jobs.",
+        )
 
         # 9) Privacy & caching
         PROMPT_CACHE_KEY: Literal["id", "email"] = Field(
@@ -726,13 +975,106 @@ class Pipe:
                 "Choose 'id' to use the OpenWebUI user ID (default; privacy-friendly), or 'email' to use the user's email address."
             ),
         )
+        TASK_CACHE_TTL: int = Field(
+            default=0,
+            ge=0,
+            description=(
+                "Seconds to reuse the result of a task request with the same model, instructions and input "
+                "(covers Open WebUI retries). Identical task requests in flight at the same time always share "
+                "one upstream call. 0 (default) disables the result cache."
+            ),
+        )
+
+        # 10) Streaming & UI delivery
+        EMITTER_QUEUE_SIZE: int = Field(
+            default=256,
+            ge=1,
+            description=(
+                "Maximum number of UI events buffered between the upstream stream reader and the "
+                "websocket emitter. Full-message frames are coalesced (latest wins) so they never "
+                "fill the queue; ordered events (sources, status, etc.) apply backpressure when full."
+            ),
+        )
+        BACKGROUND_MODE: Literal["disabled", "long_running", "always"] = Field(
+            default="disabled",
+            description=(
+                "Submit requests with background=true (and store=true) and poll for the result instead of "
+                "holding a streaming connection open. 'long_running' = only deep research models and "
+                "reasoning effort 'high'; 'always' = every request. Output arrives in one piece when the "
+                "response completes. 'disabled' (default) streams as usual."
+            ),
+        )
+        BACKGROUND_POLL_INTERVAL: float = Field(
+            default=2.0,
+            ge=0.1,
+            description="Seconds between status polls of a background response.",
+        )
+        BACKGROUND_MAX_CONCURRENT_POLLS: int = Field(
+            default=8,
+            ge=1,
+            description="Maximum number of background-response polls in flight at once (per worker).",
+        )
+        REASONING_SUMMARY_RENDER_INTERVAL: float = Field(
+            default=0.0,
+            ge=0,
+            description=(
+                "Stream reasoning summaries into the status block as they are generated, re-rendering at "
+                "most once per this many seconds (e.g. 0.5). 0 (default) shows each summary part only "
+                "once it is complete."
+            ),
+        )
+        RESUMABLE_STREAMING: bool = Field(
+            default=False,
+            description=(
+                "Stream requests as stored background responses (background=true, store=true) so that a "
+                "dropped connection resumes from the last received sequence_number instead of failing the "
+                "turn. Note that every streamed response is then stored by OpenAI (retained for 30 days by "
+                "default); do not enable where responses must not be stored (e.g. Zero Data Retention). "
+                "Stopping a turn cancels its background response. Ignored for requests that BACKGROUND_MODE "
+                "already polls."
+            ),
+        )
+
+        # 11) Metrics
+        METRICS_EXPORTER: str = Field(
+            default="disabled",
+            description=(
+                "Latency/throughput metrics exporter: 'disabled' (default; nothing is recorded), "
+                "'prometheus' (Prometheus text format file, e.g. for node_exporter's textfile collector) "
+                "or 'jsonl' (appends one JSON snapshot per export). Custom exporters can be registered in METRICS_EXPORTERS."
+            ),
+        )
+        METRICS_EXPORT_PATH: str = Field(
+            default="data/openai_responses_metrics.prom",
+            description="File the metrics exporter writes to.",
+        )
+        METRICS_EXPORT_INTERVAL: int = Field(
+            default=60,
+            ge=1,
+            description="Minimum seconds between metrics exports. Exports happen after a request completes.",
+        )
+
+        # 12) Diagnostics
+        SHOW_TIMING_BREAKDOWN: bool = Field(
+            default=False,
+            description=(
+                "Append a compact per-message timing breakdown (setup, queue wait, TTFT, model time per loop, "
+                "tool latencies, persistence time, token usage and cached-token ratio) to the status block. "
+                "Useful for support and power users; negligible overhead when disabled."
+            ),
+        )
 
-        # 10) Logging
+        # 13) Logging
         LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = Field(
             default=os.getenv("GLOBAL_LOG_LEVEL", "INFO").upper(),
             description="Select logging level.  Recommend INFO or WARNING for production use. DEBUG is useful for development and debugging.",
         )
 
+    class FrozenValves(Valves):
+        """Read-only ``Valves`` handed out (and shared) by ``_merge_valves``."""
+
+        model_config = ConfigDict(frozen=True)
+
     class UserValves(BaseModel):
         """Per-user valve overrides."""
 
@@ -742,6 +1084,10 @@ class Pipe:
             default="INHERIT",
             description="Select logging level. 'INHERIT' uses the pipe default.",
         )
+        SHOW_TIMING_BREAKDOWN: Optional[bool] = Field(
+            default=None,
+            description="Show a per-message timing breakdown in the status block. Leave empty to use the pipe default.",
+        )
 
     # 4.2 Constructor and Entry Points
     def __init__(self):
@@ -752,6 +1098,26 @@ class Pipe:
         )  # Note: valve values are not accessible in __init__. Access from pipes() or pipe() methods.
         self.session: aiohttp.ClientSession | None = None
         self.logger = SessionLogger.get_logger(__name__)
+        self._metrics_exporter: MetricsExporter | None = None
+        self._metrics_exporter_key: tuple[str, str] | None = None
+        self._metrics_last_export = 0.0
+        self._background_tasks: set[asyncio.Task] = set()
+        self._items_compacted_at: OrderedDict[str, float] = OrderedDict()
+        self._summaries_in_flight: set[str] = set()
+        self._mcp_servers_json: str | None = None
+        self._mcp_servers: list[dict] = []
+        self._mcp_listings: dict[tuple[str, str, str], tuple[float, dict]] = {}
+        self._model_registry: ModelRegistry | None = None
+        self._model_registry_key: str | None = None
+        self._merged_valves: OrderedDict[tuple, Pipe.Valves] = OrderedDict()
+        self._model_records: dict[str, tuple[float, Any]] = {}
+        self._poll_slots: asyncio.Semaphore | None = None
+        self._poll_slots_limit = 0
+        self._task_calls: dict[str, asyncio.Task] = {}
+        self._task_results: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._batcher: RequestBatcher | None = None
+        self._batcher_key: tuple | None = None
+        self._batch_tolerances: dict[str, float] = {}
 
     async def pipes(self):
         model_ids = [
@@ -781,8 +1147,11 @@ class Pipe:
         ``_run_streaming_loop``.  Otherwise it falls back to
         ``_run_nonstreaming_loop`` and returns the aggregated response.
         """
-        valves = self._merge_valves(
-            self.valves, self.UserValves.model_validate(__user__.get("valves", {}))
+        request_started = time.perf_counter()
+        valves = self._merge_valves(self.valves, __user__.get("valves", {}))
+        self._configure_metrics(valves)
+        TurnTimings.current.set(
+            TurnTimings(request_started) if valves.SHOW_TIMING_BREAKDOWN else None
         )
         openwebui_model_id = __metadata__.get("model", {}).get(
             "id", ""
@@ -802,7 +1171,8 @@ class Pipe:
 
         # Transform request body (Completions API -> Responses API).
         completions_body = CompletionsBody.model_validate(body)
-        responses_body = ResponsesBody.from_completions(
+        convert = functools.partial(
+            ResponsesBody.from_completions,
             completions_body=completions_body,
             # If chat_id and openwebui_model_id are provided, from_completions() uses them to fetch previously persisted items (function_calls, reasoning, etc.) from DB and reconstruct the input array in the correct order.
             **(
@@ -813,6 +1183,11 @@ class Pipe:
             **(
                 {"openwebui_model_id": openwebui_model_id} if openwebui_model_id else {}
             ),
+            rehydrate_images=valves.IMAGE_HISTORY_MODE == "rehydrate",
+            image_dir=valves.IMAGE_OFFLOAD_DIR,
+            reasoning_retention=valves.REASONING_RETENTION,
+            reasoning_retention_limit=valves.REASONING_RETENTION_LIMIT,
+            apply_history_summary=bool(valves.HISTORY_SUMMARY_TRIGGER_TOKENS),
             # Additional optional parameters passed directly to ResponsesBody without validation. Overrides any parameters in the original body with the same name.
             truncation=valves.TRUNCATION,
             user=user_identifier,
@@ -824,12 +1199,47 @@ class Pipe:
             ),
         )
 
+        # Histories that reference persisted items (or a rolling summary) read the
+        # chat from the DB, so they are converted in a worker thread; the rest is
+        # cheaper to convert inline than to hand off.
+        reads_db = bool(__metadata__.get("chat_id") and openwebui_model_id) and (
+            bool(valves.HISTORY_SUMMARY_TRIGGER_TOKENS)
+            or any(
+                m.get("role") == "assistant"
+                and isinstance(m.get("content"), str)
+                and contains_marker(m["content"])
+                for m in completions_body.messages
+            )
+        )
+
+        convert_task = (
+            asyncio.create_task(asyncio.to_thread(convert)) if reads_db else None
+        )
+
         # Detect if task model (generate title, generate tags, etc.), handle it separately
         if __task__:
             self.logger.info("Detected task model: %s", __task__)
+            responses_body = await convert_task if convert_task else convert()
+            task_body = responses_body.model_dump()
+            if valves.TASK_MODEL:
+                task_body["model"] = valves.TASK_MODEL
             return await self._run_task_model_request(
-                responses_body.model_dump(), valves
-            )  # Placeholder for task handling logic
+                task_body,
+                valves,
+                request_type=str(getattr(__task__, "value", __task__)),
+            )
+
+        # Look up the model record and resolve __tools__ (a coroutine in newer Open
+        # WebUI versions) while the history is being converted.
+        model_task = (
+            asyncio.create_task(self._get_model_record(openwebui_model_id))
+            if __tools__
+            else None
+        )
+        if inspect.isawaitable(__tools__):
+            __tools__ = await __tools__
+        responses_body = await convert_task if convert_task else convert()
+        model_record = await model_task if model_task else None
 
         # If GPT-5-Auto, run through model router and update model.
         if openwebui_model_id.endswith(".gpt-5-auto"):
@@ -848,16 +1258,12 @@ class Pipe:
                 valves,
             )
 
-        # Normalize to family-level model name (e.g., 'o3' from 'o3-2025-04-16') to be used for feature detection.
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", responses_body.model)
-
-        # Resolve __tools__ coroutine returned by newer Open WebUI versions.
-        if inspect.isawaitable(__tools__):
-            __tools__ = await __tools__
+        # Capabilities of the model family (e.g., 'o3' for 'o3-2025-04-16').
+        capabilities = self._model_capabilities(valves, responses_body.model)
 
         # Add Open WebUI Tools (if any) to the ResponsesBody.
         # TODO: Also detect body['tools'] and merge them with __tools__.  This would allow users to pass tools in the request body from filters, etc.
-        if __tools__ and model_family in FEATURE_SUPPORT["function_calling"]:
+        if __tools__ and capabilities.function_calling:
             responses_body.tools = ResponsesBody.transform_tools(
                 tools=__tools__,
                 strict=True,
@@ -866,7 +1272,7 @@ class Pipe:
         # Add web_search tool only if supported, enabled, and effort != minimal
         # Noted that web search doesn't seem to work when effort = minimal.
         if (
-            model_family in FEATURE_SUPPORT["web_search_tool"]
+            capabilities.web_search_tool
             and (valves.ENABLE_WEB_SEARCH_TOOL or features.get("web_search", False))
             and (
                 (responses_body.reasoning or {}).get("effort", "").lower() != "minimal"
@@ -887,22 +1293,26 @@ class Pipe:
 
         # Append remote MCP servers (experimental)
         if valves.REMOTE_MCP_SERVERS_JSON:
-            mcp_tools = ResponsesBody._build_mcp_tools(valves.REMOTE_MCP_SERVERS_JSON)
+            mcp_tools = self._remote_mcp_tools(valves.REMOTE_MCP_SERVERS_JSON)
             if mcp_tools:
                 responses_body.tools = (responses_body.tools or []) + mcp_tools
+                if valves.MCP_TOOLS_CACHE_TTL and isinstance(
+                    responses_body.input, list
+                ):
+                    self._inject_mcp_listings(
+                        responses_body.input,
+                        mcp_tools,
+                        metrics_model_label(responses_body.model),
+                    )
 
         # Check if tools are enabled but native function calling is disabled
         # If so, update the OpenWebUI model parameter to enable native function calling for future requests.
         if __tools__:
-            model = Models.get_model_by_id(openwebui_model_id)
+            model = model_record
             if model:
                 params = dict(model.params or {})
                 if params.get("function_calling") != "native":
-                    supports_function_calling = (
-                        model_family in FEATURE_SUPPORT["function_calling"]
-                    )
-
-                    if supports_function_calling:
+                    if capabilities.function_calling:
                         await self._emit_notification(
                             __event_emitter__,
                             content=f"Enabling native function calling for model: {openwebui_model_id}. Please re-run your query.",
@@ -913,13 +1323,13 @@ class Pipe:
                         form_data["params"] = params
                         form_data["params"]["function_calling"] = "native"
                         form = ModelForm(**form_data)
-                        Models.update_model_by_id(openwebui_model_id, form)
+                        await asyncio.to_thread(
+                            Models.update_model_by_id, openwebui_model_id, form
+                        )
+                        self._model_records.pop(openwebui_model_id, None)
 
         # Enable reasoning summary if enabled and supported
-        if (
-            model_family in FEATURE_SUPPORT["reasoning_summary"]
-            and valves.REASONING_SUMMARY != "disabled"
-        ):
+        if capabilities.reasoning_summary and valves.REASONING_SUMMARY != "disabled":
             # Ensure reasoning param is a mutable dict so we can safely assign to it
             reasoning_params = dict(responses_body.reasoning or {})
             reasoning_params["summary"] = valves.REASONING_SUMMARY
@@ -927,7 +1337,7 @@ class Pipe:
 
         # Always request encrypted reasoning for in-turn carry (multi-tool) unless disabled
         if (
-            model_family in FEATURE_SUPPORT["reasoning"]
+            capabilities.reasoning
             and valves.PERSIST_REASONING_TOKENS != "disabled"
             and responses_body.store is False
         ):
@@ -935,6 +1345,23 @@ class Pipe:
             if "reasoning.encrypted_content" not in responses_body.include:
                 responses_body.include.append("reasoning.encrypted_content")
 
+        # Long-running requests run as background responses: submitted once, then
+        # polled, so no connection is held open while the model works.
+        if valves.BACKGROUND_MODE == "always" or (
+            valves.BACKGROUND_MODE == "long_running"
+            and (
+                capabilities.deep_research
+                or (responses_body.reasoning or {}).get("effort") == "high"
+            )
+        ):
+            responses_body.background = True  # type: ignore[attr-defined]
+            responses_body.store = True  # background responses must be stored
+            responses_body.stream = False
+        elif valves.RESUMABLE_STREAMING and responses_body.stream:
+            # Only stored background responses can be re-attached to after a drop
+            responses_body.background = True  # type: ignore[attr-defined]
+            responses_body.store = True
+
         # Map WebUI "Add Details" / "More Concise" → text.verbosity (if supported by model), then strip the stub
         input_items = (
             responses_body.input if isinstance(responses_body.input, list) else None
@@ -956,8 +1383,7 @@ class Pipe:
 
             if verbosity_value:
                 # Check model support
-                model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", responses_body.model)
-                if model_family in FEATURE_SUPPORT["verbosity"]:
+                if capabilities.verbosity:
                     # Set/overwrite verbosity (do NOT remove the stub message)
                     current_text_params = dict(
                         getattr(responses_body, "text", {}) or {}
@@ -981,26 +1407,47 @@ class Pipe:
                         last_user_text,
                     )
 
-        # Log the transformed request body
-        self.logger.debug(
-            "Transformed ResponsesBody: %s",
-            json.dumps(
-                responses_body.model_dump(exclude_none=True),
-                indent=2,
-                ensure_ascii=False,
-            ),
+        # Log the transformed request body (serializing the whole body is costly, so only at DEBUG)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Transformed ResponsesBody: %s",
+                json.dumps(
+                    responses_body.model_dump(exclude_none=True),
+                    indent=2,
+                    ensure_ascii=False,
+                ),
+            )
+
+        # Drop items of deleted/regenerated messages before this turn adds its own
+        self._maybe_compact_items(
+            valves, __metadata__.get("chat_id"), __metadata__.get("message_id")
+        )
+
+        # Summarize older turns in the background once the history grows too large
+        self._maybe_summarize_history(
+            valves, __metadata__.get("chat_id"), body.get("messages", []), input_items
         )
 
         # Send to OpenAI Responses API
         if responses_body.stream:
             # Return async generator for partial text
             return await self._run_streaming_loop(
-                responses_body, valves, __event_emitter__, __metadata__, __tools__
+                responses_body,
+                valves,
+                __event_emitter__,
+                __metadata__,
+                __tools__,
+                started_at=request_started,
             )
         else:
             # Return final text (non-streaming)
             return await self._run_nonstreaming_loop(
-                responses_body, valves, __event_emitter__, __metadata__, __tools__
+                responses_body,
+                valves,
+                __event_emitter__,
+                __metadata__,
+                __tools__,
+                started_at=request_started,
             )
 
     # 4.3 Core Multi-Turn Handlers
@@ -1011,42 +1458,87 @@ class Pipe:
         event_emitter: Callable[[Dict[str, Any]], Awaitable[None]],
         metadata: dict[str, Any] = {},
         tools: Optional[Dict[str, Dict[str, Any]]] = None,
+        *,
+        started_at: float | None = None,  # perf_counter() at request start (for TTFT)
     ):
         """
         Stream assistant responses incrementally, handling function calls, status updates, and tool usage.
         """
         tools = tools or {}
         openwebui_model = metadata.get("model", {}).get("id", "")
+        record_metrics = pipe_metrics.enabled
+        started_at = started_at or time.perf_counter()
+        ttft_recorded = False
+        last_delta_at: float | None = None  # reset per loop: tool rounds are not gaps
         assistant_message = ""
         total_usage: dict[str, Any] = {}
         ordinal_by_url: dict[str, int] = {}
         emitted_citations: list[dict] = []
+        part_chars = (
+            0  # Characters of the current output_text part (annotation offsets)
+        )
+        chars_since_citation = 0
+        summary_interval = valves.REASONING_SUMMARY_RENDER_INTERVAL
+        summary_text = ""  # Reasoning summary part being streamed
+        summary_title: str | None = None
+        summary_body_at = 0  # Offset of the text after the part's bold title
+        summary_live = False  # The part already has a status bullet
+        summary_rendered_at = 0.0
+
+        # Wrap the emitter so a failed delivery (client gone) aborts the loop instead of
+        # reading the upstream stream to completion, and decouple UI delivery from the
+        # SSE reader so a slow websocket consumer doesn't stall the upstream socket.
+        event_emitter = QueuedEventEmitter(
+            DisconnectAwareEmitter(event_emitter),
+            maxsize=valves.EMITTER_QUEUE_SIZE,
+        )
+        upstream_events: AsyncGenerator[dict[str, Any], None] | None = None
+        streamed_chars = 0  # Visible output received in the in-flight loop (for wasted-token estimates)
+        abort_reason: str | None = None  # "task_cancelled" | "client_disconnected"
+        pending_items: list[dict] = []  # Persisted together as one batch marker
+        stream_state: dict[str, Any] = {}  # response_id of a background stream
+
+        timings = TurnTimings.current.get()  # None unless SHOW_TIMING_BREAKDOWN
+        if timings is not None:
+            timings.usage = total_usage
 
         status_indicator = ExpandableStatusIndicator(
-            event_emitter
+            event_emitter, timings=timings
         )  # Custom class for simplifying the <details> expandable status updates
         status_indicator._done = False
 
         # Emit initial "thinking" block:
         # If reasoning model, write "Thinking…" to the expandable status emitter.
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", body.model)
-        if model_family in FEATURE_SUPPORT["reasoning"]:
-            assistant_message = await status_indicator.add(
-                assistant_message,
-                status_title="Thinking…",
-                status_content="Reading the question and building a plan to answer it. This may take a moment.",
-            )
+        capabilities = self._model_capabilities(valves, body.model)
 
         # Send OpenAI Responses API request, parse and emit response
         try:
+            if capabilities.reasoning:
+                assistant_message = await status_indicator.add(
+                    assistant_message,
+                    status_title="Thinking…",
+                    status_content="Reading the question and building a plan to answer it. This may take a moment.",
+                )
+
             for loop_idx in range(valves.MAX_FUNCTION_CALL_LOOPS):
+                loop_started = time.perf_counter()
+                last_delta_at = None
                 final_response: dict[str, Any] | None = None
-                async for event in self.send_openai_responses_streaming_request(
-                    body.model_dump(exclude_none=True),
-                    api_key=valves.API_KEY,
-                    base_url=valves.BASE_URL,
-                ):
+                streamed_chars = 0
+                request_params = body.model_dump(exclude_none=True)
+                upstream_events = (
+                    self._stream_with_resume(request_params, valves, stream_state)
+                    if request_params.get("background")
+                    else self.send_openai_responses_streaming_request(
+                        request_params,
+                        api_key=valves.API_KEY,
+                        base_url=valves.BASE_URL,
+                    )
+                )
+                async for event in upstream_events:
                     etype = event.get("type")
+                    if timings is not None and timings.queue_wait is None:
+                        timings.mark_first_event(loop_started)
 
                     # Efficient check if debug logging is enabled. If so, log the event name
                     if self.logger.isEnabledFor(logging.DEBUG):
@@ -1063,6 +1555,27 @@ class Pipe:
                         delta = event.get("delta", "")
                         if delta:
                             assistant_message += delta
+                            streamed_chars += len(delta)
+                            part_chars += len(delta)
+                            chars_since_citation += len(delta)
+                            if record_metrics or timings is not None:
+                                now = time.perf_counter()
+                                if last_delta_at is not None:
+                                    pipe_metrics.observe(
+                                        "inter_delta_seconds",
+                                        now - last_delta_at,
+                                        model=body.model,
+                                    )
+                                elif not ttft_recorded:
+                                    ttft_recorded = True
+                                    if timings is not None:
+                                        timings.ttft = now - started_at
+                                    pipe_metrics.observe(
+                                        "ttft_seconds",
+                                        now - started_at,
+                                        model=body.model,
+                                    )
+                                last_delta_at = now
                             await event_emitter(
                                 {
                                     "type": "chat:message",
@@ -1071,24 +1584,67 @@ class Pipe:
                             )
                         continue
 
-                    # ─── Reasoning summary -> status indicator (done only) ───────────────────────
-                    if etype == "response.reasoning_summary_text.done":
-                        text = (event.get("text") or "").strip()
-                        if text:
-                            # Use last bolded header as the title, else fallback
-                            title_match = re.findall(r"\*\*(.+?)\*\*", text)
-                            title = (
-                                title_match[-1].strip() if title_match else "Thinking…"
+                    # ─── Reasoning summary deltas -> live status bullet (throttled) ─────────────
+                    if etype == "response.reasoning_summary_text.delta":
+                        delta = event.get("delta", "")
+                        if not summary_interval or not delta:
+                            continue
+                        summary_text += delta
+                        # The title is the part's leading bold header; look for it
+                        # only until found, and only when a delta can close it (a
+                        # ``**`` may be split across two deltas)
+                        if (
+                            summary_title is None
+                            and "**" in summary_text[-(len(delta) + 1) :]
+                        ):
+                            match = BOLD_RE.search(summary_text)
+                            if match:
+                                summary_title = match.group(1).strip()
+                                summary_body_at = match.end()
+                        now = time.perf_counter()
+                        if now - summary_rendered_at < summary_interval:
+                            continue
+                        summary_rendered_at = now
+                        title = f"🧠 {summary_title or 'Thinking…'}"
+                        content = summary_text[summary_body_at:].strip()
+                        if summary_live:
+                            assistant_message = (
+                                await status_indicator.update_last_status(
+                                    assistant_message,
+                                    new_title=title,
+                                    new_content=content,
+                                )
                             )
-
-                            # Remove bold markers from body
-                            content = re.sub(r"\*\*(.+?)\*\*", "", text).strip()
-
+                        else:
                             assistant_message = await status_indicator.add(
                                 assistant_message,
-                                status_title=f"🧠 {title}",
+                                status_title=title,
                                 status_content=content,
                             )
+                            summary_live = True
+                        continue
+
+                    # ─── Reasoning summary -> status indicator (final text) ───────────────────────
+                    if etype == "response.reasoning_summary_text.done":
+                        text = (event.get("text") or "").strip()
+                        if text:
+                            title, content = split_reasoning_summary(text)
+                            if summary_live:
+                                assistant_message = (
+                                    await status_indicator.update_last_status(
+                                        assistant_message,
+                                        new_title=f"🧠 {title}",
+                                        new_content=content,
+                                    )
+                                )
+                            else:
+                                assistant_message = await status_indicator.add(
+                                    assistant_message,
+                                    status_title=f"🧠 {title}",
+                                    status_content=content,
+                                )
+                        summary_text, summary_title, summary_body_at = "", None, 0
+                        summary_live, summary_rendered_at = False, 0.0
                         continue
 
                     # ─── Emit annotation
@@ -1096,7 +1652,7 @@ class Pipe:
                         ann = event["annotation"]
                         url = ann.get("url", "").removesuffix("?utm_source=openai")
                         title = ann.get("title", "").strip()
-                        domain = urlparse(url).netloc.lower().lstrip("www.")
+                        domain = urlparse(url).netloc.lower().removeprefix("www.")
 
                         # Have we already cited this URL?
                         already_cited = url in ordinal_by_url
@@ -1125,16 +1681,35 @@ class Pipe:
                             )
                             emitted_citations.append(citation_payload)
 
-                        # Insert the citation marker into the message text
-                        assistant_message += f" [{citation_number}]"
-
-                        # Remove the markdown link originally printed by the model
-                        assistant_message = re.sub(
-                            rf"\(\s*\[\s*{re.escape(domain)}\s*\]\([^)]+\)\s*\)",
-                            " ",
-                            assistant_message,
-                            count=1,
-                        ).strip()
+                        # Insert the citation marker and remove the markdown link the
+                        # model printed.  Only the tail from the annotation's start_index
+                        # is searched (counted back from the end, so status-block
+                        # re-renders above it don't matter); without offsets, the text
+                        # since the previous annotation.
+                        start_index = ann.get("start_index")
+                        window = (
+                            part_chars - start_index
+                            if isinstance(start_index, int)
+                            and 0 <= start_index <= part_chars
+                            else chars_since_citation
+                        )
+                        tail_at = max(
+                            0, len(assistant_message) - window - CITATION_WINDOW_SLACK
+                        )
+                        pattern = citation_link_pattern(domain)
+                        marker = f" [{citation_number}]"
+                        tail, found = pattern.subn(
+                            " ", assistant_message[tail_at:] + marker, count=1
+                        )
+                        if found or not tail_at:
+                            assistant_message = assistant_message[:tail_at] + tail
+                        else:
+                            # Offsets didn't match the streamed text; search it all
+                            assistant_message = pattern.sub(
+                                " ", assistant_message + marker, count=1
+                            )
+                        assistant_message = assistant_message.strip()
+                        chars_since_citation = 0
 
                         # Send updated assistant message chunk to UI
                         await event_emitter(
@@ -1145,12 +1720,24 @@ class Pipe:
                         )
                         continue
 
+                    if etype == "response.content_part.added":
+                        part_chars = 0
+                        continue
+
                     # ─── Emit status updates for in-progress items ──────────────────────
                     if etype == "response.output_item.added":
                         item = event.get("item", {})
                         item_type = item.get("type", "")
                         item_status = item.get("status", "")
 
+                        # Text follows: persist the items that precede it so the
+                        # marker lands before the text and history keeps their order.
+                        if item_type == "message" and pending_items:
+                            assistant_message += await self._persist_items(
+                                valves, metadata, pending_items, openwebui_model
+                            )
+                            pending_items = []
+
                         # If type is message and status is in_progress, emit a status update
                         if (
                             item_type == "message"
@@ -1188,23 +1775,7 @@ class Pipe:
                             )  # Persist all other non-message items (tool calls, web_search_call, etc.)
 
                         if should_persist:
-                            hidden_uid_marker = persist_openai_response_items(
-                                metadata.get("chat_id"),
-                                metadata.get("message_id"),
-                                [item],
-                                openwebui_model,
-                            )
-                            if hidden_uid_marker:
-                                self.logger.debug(
-                                    "Persisted item: %s", hidden_uid_marker
-                                )
-                                assistant_message += hidden_uid_marker
-                                await event_emitter(
-                                    {
-                                        "type": "chat:message",
-                                        "data": {"content": assistant_message},
-                                    }
-                                )
+                            pending_items.append(item)
 
                         # Default empty content
                         title = f"Running `{item_name}`"
@@ -1262,13 +1833,26 @@ class Pipe:
                         continue
 
                     # ─── Capture final response (incl. all non-visible items like reasoning tokens for future turns)
-                    if etype == "response.completed":
+                    if etype in ("response.completed", "response.incomplete"):
                         final_response = event.get("response", {})
+                        if etype == "response.incomplete":
+                            await self._notify_incomplete(event_emitter, final_response)
+                        self._remember_mcp_listings(
+                            valves, final_response.get("output", [])
+                        )
+                        if timings is not None:
+                            timings.model_loops.append(
+                                time.perf_counter() - loop_started
+                            )
                         body.input.extend(
                             final_response.get("output", [])
                         )  # This includes all non-visible items (e.g. reasoning, web_search_call, tool calls, etc..) and appends to body.input so they are included in future turns (if any)
                         break
 
+                # Release the upstream connection as soon as the response is complete
+                await upstream_events.aclose()
+                upstream_events = None
+
                 if final_response is None:
                     raise ValueError(
                         "No final response received from OpenAI Responses API."
@@ -1284,6 +1868,8 @@ class Pipe:
                         if i["type"] == "function_call"
                     )
                     total_usage = merge_usage_stats(total_usage, usage)
+                    if timings is not None:
+                        timings.usage = total_usage
                     await self._emit_completion(
                         event_emitter, content="", usage=total_usage, done=False
                     )
@@ -1293,24 +1879,32 @@ class Pipe:
                     i for i in final_response["output"] if i["type"] == "function_call"
                 ]
                 if calls:
-                    function_outputs = await self._execute_function_calls(calls, tools)
+                    function_outputs = await self._execute_function_calls(
+                        calls,
+                        tools,
+                        cancel_event=event_emitter.disconnected,
+                        model=body.model,
+                    )
                     if valves.PERSIST_TOOL_RESULTS:
-                        hidden_uid_marker = persist_openai_response_items(
-                            metadata.get("chat_id"),
-                            metadata.get("message_id"),
-                            function_outputs,
-                            openwebui_model,
+                        pending_items.extend(function_outputs)
+
+                # One persistence flush (and one batch marker) for the rest of the loop
+                if pending_items:
+                    hidden_uid_marker = await self._persist_items(
+                        valves, metadata, pending_items, openwebui_model
+                    )
+                    pending_items = []
+                    self.logger.debug("Persisted items: %s", hidden_uid_marker)
+                    if hidden_uid_marker:
+                        assistant_message += hidden_uid_marker
+                        await event_emitter(
+                            {
+                                "type": "chat:message",
+                                "data": {"content": assistant_message},
+                            }
                         )
-                        self.logger.debug("Persisted item: %s", hidden_uid_marker)
-                        if hidden_uid_marker:
-                            assistant_message += hidden_uid_marker
-                            await event_emitter(
-                                {
-                                    "type": "chat:message",
-                                    "data": {"content": assistant_message},
-                                }
-                            )
 
+                if calls:
                     # Add status indicator with sanitized result
                     for output in function_outputs:
                         result_text = wrap_code_block(output.get("output", ""))
@@ -1320,9 +1914,40 @@ class Pipe:
                             status_content=result_text,
                         )
                     body.input.extend(function_outputs)
-                else:
+
+                if record_metrics:
+                    pipe_metrics.observe(
+                        "function_call_loop_seconds",
+                        time.perf_counter() - loop_started,
+                        model=body.model,
+                    )
+                if not calls:
                     break
 
+        # User pressed stop (task cancelled) or the client went away (emitter failed):
+        # abort the upstream stream and in-flight tools, and record what was wasted.
+        except (asyncio.CancelledError, ClientDisconnectedError) as e:
+            abort_reason = (
+                "client_disconnected"
+                if isinstance(e, ClientDisconnectedError)
+                else "task_cancelled"
+            )
+            if upstream_events is not None:
+                await upstream_events.aclose()
+                upstream_events = None
+            # Closing the stream does not stop a background response
+            if stream_state.get("response_id"):
+                self._cancel_response_soon(stream_state["response_id"], valves)
+            record_cancelled_turn(
+                body.model,
+                total_usage,
+                streamed_chars,
+                reason=abort_reason,
+            )
+            self.logger.info("Streaming turn aborted (%s)", abort_reason)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
         # Catch any exceptions during the streaming loop and emit an error
         except Exception as e:  # pragma: no cover - network errors
             await self._emit_error(
@@ -1334,26 +1959,49 @@ class Pipe:
             )
 
         finally:
-            if not status_indicator._done and status_indicator._items:
-                assistant_message = await status_indicator.finish(assistant_message)
+            if upstream_events is not None:
+                await upstream_events.aclose()
+
+            # A failure mid-loop leaves finished items buffered: persist them so the
+            # returned message keeps their marker (a cancelled turn returns nothing)
+            if pending_items and abort_reason != "task_cancelled":
+                try:
+                    assistant_message += await self._persist_items(
+                        valves, metadata, pending_items, openwebui_model
+                    )
+                except Exception as exc:
+                    self.logger.warning("Could not persist buffered items: %s", exc)
+                pending_items = []
+
+            # Nobody is listening anymore, so skip all UI updates after an abort
+            if abort_reason is None and not event_emitter.disconnected.is_set():
+                if not status_indicator._done and (
+                    status_indicator._items or timings is not None
+                ):
+                    assistant_message = await status_indicator.finish(assistant_message)
+
+                if valves.LOG_LEVEL != "INHERIT":
+                    if event_emitter:
+                        session_id = SessionLogger.session_id.get()
+                        logs = SessionLogger.get_logs(session_id)
+                        if logs:
+                            await self._emit_citation(
+                                event_emitter, "\n".join(logs), "Logs"
+                            )
 
-            if valves.LOG_LEVEL != "INHERIT":
-                if event_emitter:
-                    session_id = SessionLogger.session_id.get()
-                    logs = SessionLogger.logs.get(session_id, [])
-                    if logs:
-                        await self._emit_citation(
-                            event_emitter, "\n".join(logs), "Logs"
-                        )
+                # Emit completion (middleware.py also does this so this just covers if there is a downstream error)
+                await self._emit_completion(
+                    event_emitter, content="", usage=total_usage, done=True
+                )  # There must be an empty content to avoid breaking the UI
 
-            # Emit completion (middleware.py also does this so this just covers if there is a downstream error)
-            await self._emit_completion(
-                event_emitter, content="", usage=total_usage, done=True
-            )  # There must be an empty content to avoid breaking the UI
+            # Deliver everything still queued (or discard it after an abort)
+            await event_emitter.aclose(flush=abort_reason is None)
+            self.logger.debug("Emitter queue stats: %s", event_emitter.stats)
+            self._maybe_export_metrics(valves)
 
             # Clear logs
             logs_by_msg_id.clear()
-            SessionLogger.logs.pop(SessionLogger.session_id.get(), None)
+            SessionLogger.clear(SessionLogger.session_id.get())
 
             chat_id = metadata.get("chat_id")
             message_id = metadata.get("message_id")
@@ -1363,7 +2011,9 @@ class Pipe:
                 )
 
             # Return the final output to ensure persistence.
-            return assistant_message
+            # A ``return`` here would swallow CancelledError, so let it propagate instead.
+            if abort_reason != "task_cancelled":
+                return assistant_message
 
     async def _run_nonstreaming_loop(
         self,
@@ -1378,6 +2028,8 @@ class Pipe:
         tools: Optional[
             Dict[str, Dict[str, Any]]
         ] = None,  # Optional tools dictionary for function calls
+        *,
+        started_at: float | None = None,  # perf_counter() at request start (for TTFT)
     ) -> str:
         """Multi-turn conversation loop using blocking requests.
 
@@ -1394,12 +2046,15 @@ class Pipe:
         assistant_message = ""
         total_usage: Dict[str, Any] = {}
         reasoning_map: dict[int, str] = {}
+        pending_items: list[dict] = []  # Persisted together as one batch marker
+        record_metrics = pipe_metrics.enabled
+        started_at = started_at or time.perf_counter()
+        timings = TurnTimings.current.get()  # None unless SHOW_TIMING_BREAKDOWN
 
-        status_indicator = ExpandableStatusIndicator(event_emitter)
+        status_indicator = ExpandableStatusIndicator(event_emitter, timings=timings)
         status_indicator._done = False
 
-        model_family = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", body.model)
-        if model_family in FEATURE_SUPPORT["reasoning"]:
+        if self._model_capabilities(valves, body.model).reasoning:
             assistant_message = await status_indicator.add(
                 assistant_message,
                 status_title="Thinking…",
@@ -1410,19 +2065,44 @@ class Pipe:
 
         try:
             for loop_idx in range(valves.MAX_FUNCTION_CALL_LOOPS):
-                response = await self.send_openai_responses_nonstreaming_request(
-                    body.model_dump(exclude_none=True),
-                    api_key=valves.API_KEY,
-                    base_url=valves.BASE_URL,
-                )
+                loop_started = time.perf_counter()
+                request_params = body.model_dump(exclude_none=True)
+                if request_params.get("background"):
+                    response = await self._run_background_response(
+                        request_params, valves, event_emitter, metadata
+                    )
+                else:
+                    response = await self.send_openai_responses_nonstreaming_request(
+                        request_params,
+                        api_key=valves.API_KEY,
+                        base_url=valves.BASE_URL,
+                    )
+                if timings is not None:
+                    timings.model_loops.append(time.perf_counter() - loop_started)
+                    if loop_idx == 0:
+                        timings.ttft = time.perf_counter() - started_at
+                if record_metrics and loop_idx == 0:
+                    # No deltas without streaming: the first token arrives with the whole response
+                    pipe_metrics.observe(
+                        "ttft_seconds",
+                        time.perf_counter() - started_at,
+                        model=body.model,
+                    )
 
                 items = response.get("output", [])
+                self._remember_mcp_listings(valves, items)
 
-                # Persist non-message items immediately and insert invisible markers
+                # Collect non-message items and insert one invisible batch marker before
+                # each run of text (and at the end of the loop)
                 for item in items:
                     item_type = item.get("type")
 
                     if item_type == "message":
+                        if pending_items:
+                            assistant_message += await self._persist_items(
+                                valves, metadata, pending_items, openwebui_model_id
+                            )
+                            pending_items = []
                         for content in item.get("content", []):
                             if content.get("type") == "output_text":
                                 assistant_message += content.get("text", "")
@@ -1432,11 +2112,7 @@ class Pipe:
                         text = item.get("text", "")
                         if text:
                             reasoning_map[idx] = reasoning_map.get(idx, "") + text
-                            title_match = re.findall(r"\*\*(.+?)\*\*", text)
-                            title = (
-                                title_match[-1].strip() if title_match else "Thinking…"
-                            )
-                            content = re.sub(r"\*\*(.+?)\*\*", "", text).strip()
+                            title, content = split_reasoning_summary(text)
                             assistant_message = await status_indicator.add(
                                 assistant_message,
                                 status_title="🧠 " + title,
@@ -1456,14 +2132,7 @@ class Pipe:
 
                     else:
                         if valves.PERSIST_TOOL_RESULTS:
-                            hidden_uid_marker = persist_openai_response_items(
-                                metadata.get("chat_id"),
-                                metadata.get("message_id"),
-                                [item],
-                                metadata.get("model", {}).get("id"),
-                            )
-                            self.logger.debug("Persisted item: %s", hidden_uid_marker)
-                            assistant_message += hidden_uid_marker
+                            pending_items.append(item)
 
                         title = f"Running `{item.get('name', 'unnamed_tool')}`"
                         content = ""
@@ -1517,6 +2186,8 @@ class Pipe:
                         1 for i in items if i.get("type") == "function_call"
                     )
                     total_usage = merge_usage_stats(total_usage, usage)
+                    if timings is not None:
+                        timings.usage = total_usage
                     await self._emit_completion(
                         event_emitter, content="", usage=total_usage, done=False
                     )
@@ -1526,17 +2197,21 @@ class Pipe:
                 # Run tools if requested
                 calls = [i for i in items if i.get("type") == "function_call"]
                 if calls:
-                    function_outputs = await self._execute_function_calls(calls, tools)
+                    function_outputs = await self._execute_function_calls(
+                        calls, tools, model=body.model
+                    )
                     if valves.PERSIST_TOOL_RESULTS:
-                        hidden_uid_marker = persist_openai_response_items(
-                            metadata.get("chat_id"),
-                            metadata.get("message_id"),
-                            function_outputs,
-                            openwebui_model_id,
-                        )
-                        self.logger.debug("Persisted item: %s", hidden_uid_marker)
-                        assistant_message += hidden_uid_marker
+                        pending_items.extend(function_outputs)
 
+                if pending_items:
+                    hidden_uid_marker = await self._persist_items(
+                        valves, metadata, pending_items, openwebui_model_id
+                    )
+                    pending_items = []
+                    self.logger.debug("Persisted items: %s", hidden_uid_marker)
+                    assistant_message += hidden_uid_marker
+
+                if calls:
                     # Add status indicator with sanitized result
                     for output in function_outputs:
                         result_text = wrap_code_block(output.get("output", ""))
@@ -1546,13 +2221,28 @@ class Pipe:
                             status_content=result_text,
                         )
                     body.input.extend(function_outputs)
-                else:
+
+                if record_metrics:
+                    pipe_metrics.observe(
+                        "function_call_loop_seconds",
+                        time.perf_counter() - loop_started,
+                        model=body.model,
+                    )
+                if not calls:
                     break
 
             # Finalize output
             final_text = assistant_message.strip()
-            if not status_indicator._done and status_indicator._items:
+            if not status_indicator._done and (
+                status_indicator._items or timings is not None
+            ):
                 final_text = await status_indicator.finish(final_text)
+            if getattr(body, "background", False) and event_emitter:
+                # Deliver through the emitter too: after a long background wait the
+                # HTTP request that started the turn may be gone.
+                await event_emitter(
+                    {"type": "chat:message", "data": {"content": final_text}}
+                )
             return final_text
 
         except Exception as e:  # pragma: no cover - network errors
@@ -1566,19 +2256,29 @@ class Pipe:
         finally:
             if not status_indicator._done and status_indicator._items:
                 assistant_message = await status_indicator.finish(assistant_message)
+            self._maybe_export_metrics(valves)
             # Clear logs
             logs_by_msg_id.clear()
-            SessionLogger.logs.pop(SessionLogger.session_id.get(), None)
+            SessionLogger.clear(SessionLogger.session_id.get())
 
     # 4.4 Task Model Handling
     async def _run_task_model_request(
-        self, body: Dict[str, Any], valves: Pipe.Valves
+        self,
+        body: Dict[str, Any],
+        valves: Pipe.Valves,
+        *,
+        request_type: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Process a task model request via the Responses API.
 
         Task models (e.g. generating a chat title or tags) return their
         information as standard Responses output.  This helper performs a single
         non-streaming call and extracts the plain text from the response items.
+
+        Identical requests (same model, instructions and input) that are in
+        flight together share one upstream call, and finished results are reused
+        for ``TASK_CACHE_TTL`` seconds.  Request types listed in
+        ``BATCH_REQUEST_TOLERANCES`` go through the batch path.
         """
 
         task_body = {
@@ -1588,12 +2288,76 @@ class Pipe:
             "user": body.get("user", ""),
             "stream": False,
         }
+        if valves.TASK_SERVICE_TIER:
+            task_body["service_tier"] = valves.TASK_SERVICE_TIER
 
-        response = await self.send_openai_responses_nonstreaming_request(
-            task_body,
-            api_key=valves.API_KEY,
-            base_url=valves.BASE_URL,
-        )
+        key = hashlib.sha256(
+            json.dumps(
+                [task_body["model"], task_body["instructions"], task_body["input"]],
+                sort_keys=True,
+                ensure_ascii=False,
+            ).encode()
+        ).hexdigest()
+        model = metrics_model_label(str(task_body["model"]))
+
+        cached = self._task_results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                pipe_metrics.inc("task_requests_total", model=model, result="cached")
+                return cached[1]
+            del self._task_results[key]
+
+        call = self._task_calls.get(key)
+        if call is not None:
+            pipe_metrics.inc("task_requests_total", model=model, result="shared")
+        else:
+            pipe_metrics.inc("task_requests_total", model=model, result="upstream")
+            call = asyncio.create_task(
+                self._call_task_model(task_body, valves, request_type)
+            )
+            self._task_calls[key] = call
+
+            def _done(task: asyncio.Task, ttl: int = valves.TASK_CACHE_TTL) -> None:
+                self._task_calls.pop(key, None)
+                if ttl and not task.cancelled() and task.exception() is None:
+                    self._task_results[key] = (time.monotonic() + ttl, task.result())
+                    while len(self._task_results) > 256:
+                        self._task_results.popitem(last=False)
+
+            call.add_done_callback(_done)
+
+        # Shielded so one cancelled caller does not cancel the call others wait on
+        return await asyncio.shield(call)
+
+    async def _call_task_model(
+        self,
+        task_body: Dict[str, Any],
+        valves: Pipe.Valves,
+        request_type: Optional[str] = None,
+    ) -> str:
+        """Send one task request and join its output text (flex falls back to 'auto')."""
+        try:
+            if request_type:
+                response = await self.submit_deferred_request(
+                    task_body, request_type=request_type, valves=valves
+                )
+            else:
+                response = await self.send_openai_responses_nonstreaming_request(
+                    task_body,
+                    api_key=valves.API_KEY,
+                    base_url=valves.BASE_URL,
+                )
+        except aiohttp.ClientResponseError as exc:
+            if task_body.get("service_tier") != "flex" or exc.status not in (429, 503):
+                raise
+            self.logger.info(
+                "Flex capacity unavailable (%s); retrying task", exc.status
+            )
+            response = await self.send_openai_responses_nonstreaming_request(
+                {**task_body, "service_tier": "auto"},
+                api_key=valves.API_KEY,
+                base_url=valves.BASE_URL,
+            )
 
         text_parts: list[str] = []
         for item in response.get("output", []):
@@ -1607,15 +2371,104 @@ class Pipe:
 
         return message
 
+    async def submit_deferred_request(
+        self,
+        body: Dict[str, Any],
+        *,
+        request_type: str,
+        valves: Optional[Pipe.Valves] = None,
+    ) -> Dict[str, Any]:
+        """Run a non-streaming Responses request that may be deferred, and return the response.
+
+        If ``BATCH_BACKEND`` is enabled and ``request_type`` has a tolerance in
+        ``BATCH_REQUEST_TOLERANCES``, the request joins a batch job; when the job
+        has not finished within the tolerance it is sent directly.  Otherwise it
+        is sent directly right away.  Tools can opt in through the pipe instance
+        (``request.app.state.FUNCTIONS``).
+        """
+        valves = valves or self.valves
+        batcher = self._request_batcher(valves)
+        tolerance = self._batch_tolerances.get(request_type) if batcher else None
+        if tolerance:
+            model = metrics_model_label(str(body.get("model")))
+            try:
+                response = await batcher.submit(
+                    {**body, "stream": False}, tolerance=tolerance
+                )
+            except asyncio.TimeoutError:
+                pipe_metrics.inc(
+                    "batched_requests_total", model=model, result="expired"
+                )
+                self.logger.info(
+                    "Batched %s request not done within %ss; sending directly",
+                    request_type,
+                    tolerance,
+                )
+            except Exception as exc:
+                pipe_metrics.inc("batched_requests_total", model=model, result="failed")
+                self.logger.warning(
+                    "Batched %s request failed (%s); sending directly",
+                    request_type,
+                    exc,
+                )
+            else:
+                pipe_metrics.inc(
+                    "batched_requests_total", model=model, result="batched"
+                )
+                return response
+        return await self.send_openai_responses_nonstreaming_request(
+            body, api_key=valves.API_KEY, base_url=valves.BASE_URL
+        )
+
+    def _request_batcher(self, valves: Pipe.Valves) -> RequestBatcher | None:
+        """Return the shared ``RequestBatcher``; rebuilt when the batch valves change."""
+        key = (
+            valves.BATCH_BACKEND,
+            valves.BATCH_REQUEST_TOLERANCES,
+            valves.BATCH_POLL_INTERVAL,
+            valves.BASE_URL,
+            valves.API_KEY,
+        )
+        if key == self._batcher_key:
+            return self._batcher
+        self._batcher_key = key
+        self._batcher = None
+        self._batch_tolerances = {}
+
+        factory = BATCH_BACKENDS.get(valves.BATCH_BACKEND)
+        if factory is None:
+            return None
+        try:
+            tolerances = json.loads(valves.BATCH_REQUEST_TOLERANCES or "{}")
+            self._batch_tolerances = {
+                str(name): float(seconds)
+                for name, seconds in tolerances.items()
+                if float(seconds) > 0
+            }
+        except (ValueError, TypeError, AttributeError) as exc:
+            self.logger.warning("Invalid BATCH_REQUEST_TOLERANCES: %s", exc)
+            return None
+        self._batcher = RequestBatcher(
+            factory(self, valves), poll_interval=valves.BATCH_POLL_INTERVAL
+        )
+        return self._batcher
+
     # 4.5 LLM HTTP Request Helpers
     async def send_openai_responses_streaming_request(
-        self, request_body: dict[str, Any], api_key: str, base_url: str
+        self,
+        request_body: dict[str, Any],
+        api_key: str,
+        base_url: str,
+        *,
+        resume_from: tuple[str, int | None] | None = None,
     ) -> AsyncGenerator[dict[str, Any], None]:
         """Yield SSE events from the Responses endpoint as soon as they arrive.
 
         This low-level helper is tuned for minimal latency when streaming large
         responses.  It decodes each ``data:`` line and yields the parsed JSON
-        payload immediately.
+        payload immediately.  With ``resume_from=(response_id, sequence_number)``
+        it re-attaches to a stored response instead (``GET /responses/{id}``) and
+        yields only the events after that sequence number.
         """
         # Get or create aiohttp session (aiohttp is used for performance).
         self.session = await self._get_or_init_http_session()
@@ -1627,40 +2480,66 @@ class Pipe:
         }
         url = base_url.rstrip("/") + "/responses"
 
+        model = request_body.get("model", "")
+        if resume_from is None:
+            # Serialize once ourselves so the request size is known without a second dumps()
+            payload = json.dumps(request_body).encode("utf-8")
+            pipe_metrics.observe("request_bytes", len(payload), model=model)
+            request = self.session.post(url, data=payload, headers=headers)
+        else:
+            response_id, starting_after = resume_from
+            params = {"stream": "true"}
+            if starting_after is not None:
+                params["starting_after"] = str(starting_after)
+            request = self.session.get(
+                f"{url}/{response_id}", params=params, headers=headers
+            )
+        received = 0
+
         buf = bytearray()
-        async with self.session.post(url, json=request_body, headers=headers) as resp:
+        async with request as resp:
             resp.raise_for_status()
 
-            async for chunk in resp.content.iter_chunked(4096):
-                buf.extend(chunk)
-                start_idx = 0
-                # Process all complete lines in the buffer
-                while True:
-                    newline_idx = buf.find(b"\n", start_idx)
-                    if newline_idx == -1:
-                        break
-
-                    line = buf[start_idx:newline_idx].strip()
-                    start_idx = newline_idx + 1
-
-                    # Skip empty lines, comment lines, or anything not starting with "data:"
-                    if (
-                        not line
-                        or line.startswith(b":")
-                        or not line.startswith(b"data:")
-                    ):
-                        continue
-
-                    data_part = line[5:].strip()
-                    if data_part == b"[DONE]":
-                        return  # End of SSE stream
-
-                    # Yield JSON-decoded data
-                    yield json.loads(data_part.decode("utf-8"))
+            try:
+                async for chunk in resp.content.iter_chunked(4096):
+                    received += len(chunk)
+                    buf.extend(chunk)
+                    start_idx = 0
+                    # Process all complete lines in the buffer
+                    while True:
+                        newline_idx = buf.find(b"\n", start_idx)
+                        if newline_idx == -1:
+                            break
+
+                        line = buf[start_idx:newline_idx].strip()
+                        start_idx = newline_idx + 1
+
+                        # Skip empty lines, comment lines, or anything not starting with "data:"
+                        if (
+                            not line
+                            or line.startswith(b":")
+                            or not line.startswith(b"data:")
+                        ):
+                            continue
 
-                # Remove processed data from the buffer
-                if start_idx > 0:
-                    del buf[:start_idx]
+                        data_part = line[5:].strip()
+                        if data_part == b"[DONE]":
+                            return  # End of SSE stream
+
+                        # Yield JSON-decoded data
+                        yield json.loads(data_part.decode("utf-8"))
+
+                    # Remove processed data from the buffer
+                    if start_idx > 0:
+                        del buf[:start_idx]
+            except (asyncio.CancelledError, GeneratorExit):
+                # Consumer stopped early (user pressed stop, client disconnected, …).
+                # Drop the socket instead of draining a stream that may run for minutes.
+                if not resp.content.at_eof():
+                    resp.close()
+                raise
+            finally:
+                pipe_metrics.observe("response_bytes", received, model=model)
 
     async def send_openai_responses_nonstreaming_request(
         self,
@@ -1678,9 +2557,233 @@ class Pipe:
         }
         url = base_url.rstrip("/") + "/responses"
 
-        async with self.session.post(url, json=request_params, headers=headers) as resp:
+        payload = json.dumps(request_params).encode("utf-8")
+        model = request_params.get("model", "")
+        pipe_metrics.observe("request_bytes", len(payload), model=model)
+
+        async with self.session.post(url, data=payload, headers=headers) as resp:
+            resp.raise_for_status()
+            raw = await resp.read()
+            pipe_metrics.observe("response_bytes", len(raw), model=model)
+            return json.loads(raw)
+
+    async def _stream_with_resume(
+        self,
+        request_params: dict[str, Any],
+        valves: "Pipe.Valves",
+        state: Optional[dict[str, Any]] = None,
+    ) -> AsyncGenerator[dict[str, Any], None]:
+        """Stream a background response, resuming after dropped connections.
+
+        Tracks the response ID and the last ``sequence_number`` seen.  If the
+        connection fails (or closes before a terminal event), the stream is
+        re-opened from that point up to ``MAX_STREAM_RESUMES`` times; events
+        already yielded are never repeated.  The response ID is published as
+        ``state["response_id"]`` so the caller can cancel the response.
+        """
+        model = request_params.get("model", "")
+        response_id: str | None = None
+        last_seq: int | None = None
+        resumes = 0
+        events = self.send_openai_responses_streaming_request(
+            request_params, api_key=valves.API_KEY, base_url=valves.BASE_URL
+        )
+        try:
+            while True:
+                try:
+                    async for event in events:
+                        if response_id is None and event.get("response"):
+                            response_id = event["response"].get("id")
+                            if state is not None:
+                                state["response_id"] = response_id
+                        seq = event.get("sequence_number")
+                        if seq is not None:
+                            if last_seq is not None and seq <= last_seq:
+                                continue  # replayed by the server after a resume
+                            last_seq = seq
+                        yield event
+                        if event.get("type") in (
+                            "response.completed",
+                            "response.failed",
+                            "response.incomplete",
+                        ):
+                            return
+                    raise aiohttp.ClientPayloadError(
+                        "Stream ended before the response finished"
+                    )
+                except (
+                    aiohttp.ClientPayloadError,
+                    aiohttp.ClientConnectionError,
+                ) as exc:
+                    if response_id is None or resumes >= MAX_STREAM_RESUMES:
+                        raise
+                    resumes += 1
+                    pipe_metrics.inc("stream_resumes_total", model=model)
+                    self.logger.warning(
+                        "Stream of %s dropped after sequence %s (%s); resuming (%d/%d)",
+                        response_id,
+                        last_seq,
+                        exc,
+                        resumes,
+                        MAX_STREAM_RESUMES,
+                    )
+                    await events.aclose()
+                    await asyncio.sleep(0.5 * 2 ** (resumes - 1))
+                    events = self.send_openai_responses_streaming_request(
+                        request_params,
+                        api_key=valves.API_KEY,
+                        base_url=valves.BASE_URL,
+                        resume_from=(response_id, last_seq),
+                    )
+        finally:
+            await events.aclose()
+
+    async def retrieve_openai_response(
+        self, response_id: str, api_key: str, base_url: str
+    ) -> Dict[str, Any]:
+        """Fetch a stored response (``GET /responses/{id}``), e.g. to poll a background job."""
+        self.session = await self._get_or_init_http_session()
+        url = f"{base_url.rstrip('/')}/responses/{response_id}"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        async with self.session.get(url, headers=headers) as resp:
+            resp.raise_for_status()
+            return json.loads(await resp.read())
+
+    async def cancel_openai_response(
+        self, response_id: str, api_key: str, base_url: str
+    ) -> Dict[str, Any]:
+        """Cancel a background response (``POST /responses/{id}/cancel``)."""
+        self.session = await self._get_or_init_http_session()
+        url = f"{base_url.rstrip('/')}/responses/{response_id}/cancel"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        async with self.session.post(url, headers=headers) as resp:
             resp.raise_for_status()
-            return await resp.json()
+            return json.loads(await resp.read())
+
+    async def _run_background_response(
+        self,
+        request_params: dict[str, Any],
+        valves: "Pipe.Valves",
+        event_emitter: Callable[[dict[str, Any]], Awaitable[None]] | None,
+        metadata: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Submit ``request_params`` as a background response and poll until it finishes.
+
+        The response ID is recorded on the chat as soon as it is known.  Each
+        poll is a short request made under a per-worker semaphore
+        (``BACKGROUND_MAX_CONCURRENT_POLLS``), so no connection is held between
+        polls.  Cancelling the turn cancels the upstream response too.  An
+        ``incomplete`` response (e.g. ``max_output_tokens`` reached) is returned
+        with its partial output, like ``response.incomplete`` when streaming.
+        """
+        chat_id, message_id = metadata.get("chat_id"), metadata.get("message_id")
+        model = request_params.get("model", "")
+        response = await self.send_openai_responses_nonstreaming_request(
+            request_params, api_key=valves.API_KEY, base_url=valves.BASE_URL
+        )
+        response_id = response["id"]
+        await asyncio.to_thread(
+            record_background_response,
+            chat_id,
+            message_id,
+            response_id,
+            response.get("status"),
+        )
+        self.logger.info("Submitted background response %s", response_id)
+
+        started = time.monotonic()
+        polls = 0
+        try:
+            while response.get("status") in ("queued", "in_progress"):
+                elapsed = int(time.monotonic() - started)
+                await self._emit_status(
+                    event_emitter,
+                    f"Working in the background… ({elapsed // 60}m {elapsed % 60:02d}s)",
+                )
+                await asyncio.sleep(valves.BACKGROUND_POLL_INTERVAL)
+                async with self._background_poll_slots(valves):
+                    response = await self.retrieve_openai_response(
+                        response_id, api_key=valves.API_KEY, base_url=valves.BASE_URL
+                    )
+                polls += 1
+        except asyncio.CancelledError:
+            self._cancel_response_soon(response_id, valves, metadata)
+            raise
+        finally:
+            pipe_metrics.inc("background_polls_total", polls, model=model)
+
+        status = response.get("status")
+        await asyncio.to_thread(
+            record_background_response, chat_id, message_id, response_id, status
+        )
+        pipe_metrics.observe(
+            "background_wait_seconds",
+            time.monotonic() - started,
+            model=model,
+            status=str(status),
+        )
+        await self._emit_status(event_emitter, "", done=True, hidden=True)
+        if status == "incomplete":
+            await self._notify_incomplete(event_emitter, response)
+        elif status != "completed":
+            error = (response.get("error") or {}).get("message") or status
+            raise RuntimeError(f"Background response {response_id} failed: {error}")
+        return response
+
+    async def _notify_incomplete(
+        self,
+        event_emitter: Callable[[dict[str, Any]], Awaitable[None]] | None,
+        response: Dict[str, Any],
+    ) -> None:
+        """Log and surface why a response stopped early; its partial output is kept."""
+        reason = (response.get("incomplete_details") or {}).get("reason") or "unknown"
+        self.logger.warning("Response %s incomplete: %s", response.get("id"), reason)
+        await self._emit_notification(
+            event_emitter,
+            f"The response was cut short ({reason.replace('_', ' ')}).",
+            level="warning",
+        )
+
+    def _cancel_response_soon(
+        self,
+        response_id: str,
+        valves: "Pipe.Valves",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Cancel a background response without waiting; the turn is being torn down.
+
+        With ``metadata``, the cancellation is also recorded on the chat.
+        """
+
+        async def _cancel() -> None:
+            try:
+                await self.cancel_openai_response(
+                    response_id, api_key=valves.API_KEY, base_url=valves.BASE_URL
+                )
+                if metadata:
+                    await asyncio.to_thread(
+                        record_background_response,
+                        metadata.get("chat_id"),
+                        metadata.get("message_id"),
+                        response_id,
+                        "cancelled",
+                    )
+            except Exception as exc:
+                self.logger.warning(
+                    "Could not cancel response %s: %s", response_id, exc
+                )
+
+        task = asyncio.create_task(_cancel())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _background_poll_slots(self, valves: "Pipe.Valves") -> asyncio.Semaphore:
+        """Semaphore bounding concurrent background polls; rebuilt when the limit changes."""
+        limit = valves.BACKGROUND_MAX_CONCURRENT_POLLS
+        if self._poll_slots is None or self._poll_slots_limit != limit:
+            self._poll_slots = asyncio.Semaphore(limit)
+            self._poll_slots_limit = limit
+        return self._poll_slots
 
     async def _get_or_init_http_session(self) -> aiohttp.ClientSession:
         """Return a cached ``aiohttp.ClientSession`` instance.
@@ -1719,16 +2822,85 @@ class Pipe:
         return session
 
     # 4.6 Tool Execution Logic
+    def _remote_mcp_tools(self, mcp_json: str) -> list[dict]:
+        """Return the MCP tools for ``REMOTE_MCP_SERVERS_JSON``, parsing it only when it changes."""
+        if mcp_json != self._mcp_servers_json:
+            self._mcp_servers = ResponsesBody._build_mcp_tools(mcp_json)
+            self._mcp_servers_json = mcp_json
+        return [dict(tool) for tool in self._mcp_servers]
+
+    @staticmethod
+    def _mcp_listing_key(tool: dict) -> tuple[str, str, str]:
+        """Cache key of an MCP server's tool listing: label, URL and allowed tools."""
+        return (
+            tool.get("server_label", ""),
+            tool.get("server_url", ""),
+            json.dumps(tool.get("allowed_tools"), sort_keys=True),
+        )
+
+    def _remember_mcp_listings(self, valves: "Pipe.Valves", output: list[dict]) -> None:
+        """Cache the ``mcp_list_tools`` items in ``output`` for the configured MCP servers."""
+        if not valves.MCP_TOOLS_CACHE_TTL:
+            return
+        listings = {
+            item.get("server_label"): item
+            for item in output
+            if item.get("type") == "mcp_list_tools" and not item.get("error")
+        }
+        if not listings:
+            return
+        expires = time.monotonic() + valves.MCP_TOOLS_CACHE_TTL
+        for tool in self._mcp_servers:
+            item = listings.get(tool.get("server_label"))
+            if item is not None:
+                self._mcp_listings[self._mcp_listing_key(tool)] = (expires, item)
+
+    def _inject_mcp_listings(
+        self, input_items: list[dict], mcp_tools: list[dict], model: str
+    ) -> None:
+        """Prepend cached tool listings for MCP servers the input has no listing for."""
+        listed = {
+            item.get("server_label")
+            for item in input_items
+            if item.get("type") == "mcp_list_tools"
+        }
+        now = time.monotonic()
+        reused = []
+        for tool in mcp_tools:
+            if tool.get("server_label") in listed:
+                continue
+            key = self._mcp_listing_key(tool)
+            cached = self._mcp_listings.get(key)
+            if cached is None or cached[0] <= now:
+                self._mcp_listings.pop(key, None)
+                pipe_metrics.inc("mcp_listing_cache_total", model=model, result="miss")
+                continue
+            reused.append(cached[1])
+            pipe_metrics.inc("mcp_listing_cache_total", model=model, result="hit")
+        if reused:
+            input_items[:0] = reused
+            self.logger.debug(
+                "Reusing cached MCP tool listings: %s",
+                [item.get("server_label") for item in reused],
+            )
+
     @staticmethod
     async def _execute_function_calls(
         calls: list[dict],  # raw call-items from the LLM
         tools: dict[str, dict[str, Any]],  # name → {callable, …}
+        *,
+        cancel_event: asyncio.Event | None = None,  # set → abort in-flight tools
+        model: str = "",  # metrics label
     ) -> list[dict]:
         """Execute one or more tool calls and return their outputs.
 
         Each call specification is looked up in the ``tools`` mapping by name
         and executed concurrently.  The returned list contains synthetic
         ``function_call_output`` items suitable for feeding back into the LLM.
+
+        In-flight tool tasks are cancelled when the caller is cancelled or when
+        ``cancel_event`` is set (raising ``ClientDisconnectedError``).  Sync tools
+        running in a worker thread cannot be interrupted; their result is discarded.
         """
 
         def _make_task(call):
@@ -1740,15 +2912,57 @@ class Pipe:
             args = json.loads(call["arguments"])
 
             if inspect.iscoroutinefunction(fn):  # async tool
-                return fn(**args)
+                coro = fn(**args)
             else:  # sync tool
-                return asyncio.to_thread(fn, **args)
+                coro = asyncio.to_thread(fn, **args)
+            if pipe_metrics.enabled or timings is not None:
+                return _timed(call["name"], coro)
+            return coro
+
+        async def _timed(name, coro):
+            started = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                elapsed = time.perf_counter() - started
+                if timings is not None:
+                    timings.tools.append((name, elapsed))
+                pipe_metrics.observe(
+                    "tool_execution_seconds", elapsed, model=model, tool=name
+                )
 
-        tasks = [_make_task(call) for call in calls]  # ← fire & forget
-        results = await asyncio.gather(
+        timings = TurnTimings.current.get()
+
+        tasks = [
+            asyncio.ensure_future(_make_task(call)) for call in calls
+        ]  # ← fire & forget
+        gathered = asyncio.gather(
             *tasks
         )  # ← runs in parallel. TODO: asyncio.gather(*tasks) cancels all tasks if one tool raises.
 
+        try:
+            if cancel_event is None:
+                results = await gathered
+            else:
+                cancel_waiter = asyncio.ensure_future(cancel_event.wait())
+                try:
+                    await asyncio.wait(
+                        {gathered, cancel_waiter}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    cancel_waiter.cancel()
+                if not gathered.done():
+                    raise ClientDisconnectedError(
+                        "Client disconnected while tools were running."
+                    )
+                results = gathered.result()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Consume the aggregated outcome so asyncio doesn't log it as unretrieved
+            gathered.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+
         return [
             {
                 "type": "function_call_output",
@@ -1791,7 +3005,7 @@ class Pipe:
             # 2) Optionally emit the citation with logs
             if show_error_log_citation:
                 session_id = SessionLogger.session_id.get()
-                logs = SessionLogger.logs.get(session_id, [])
+                logs = SessionLogger.get_logs(session_id)
                 if logs:
                     await self._emit_citation(
                         event_emitter,
@@ -1931,23 +3145,262 @@ class Pipe:
         """
         return "gpt-5-chat-latest"
 
-    # 4.8 Internal Static Helpers
+    # 4.8 Metrics export
+    def _configure_metrics(self, valves: "Pipe.Valves") -> None:
+        """Enable/disable metric recording and (re)build the exporter on valve changes."""
+        key = (valves.METRICS_EXPORTER, valves.METRICS_EXPORT_PATH)
+        if key == self._metrics_exporter_key:
+            return
+        self._metrics_exporter_key = key
+        self._metrics_exporter = None
+
+        name = valves.METRICS_EXPORTER.strip().lower()
+        if name and name != "disabled":
+            factory = METRICS_EXPORTERS.get(name)
+            if factory is None:
+                self.logger.warning(
+                    "Unknown METRICS_EXPORTER %r; available: %s",
+                    name,
+                    ", ".join(sorted(METRICS_EXPORTERS)),
+                )
+            else:
+                self._metrics_exporter = factory(valves.METRICS_EXPORT_PATH)
+        pipe_metrics.enabled = self._metrics_exporter is not None
+
+    def _maybe_export_metrics(self, valves: "Pipe.Valves") -> None:
+        """Export a metrics snapshot in a worker thread if the interval has elapsed."""
+        exporter = self._metrics_exporter
+        if exporter is None:
+            return
+        now = time.monotonic()
+        if now - self._metrics_last_export < valves.METRICS_EXPORT_INTERVAL:
+            return
+        self._metrics_last_export = now
+
+        async def _export() -> None:
+            try:
+                await asyncio.to_thread(exporter.export, pipe_metrics.snapshot())
+            except Exception as exc:
+                self.logger.warning("Metrics export failed: %s", exc)
+
+        task = asyncio.create_task(_export())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    # 4.9 Background maintenance
+    async def _persist_items(
+        self,
+        valves: "Pipe.Valves",
+        metadata: Dict[str, Any],
+        items: List[Dict[str, Any]],
+        openwebui_model_id: str,
+    ) -> str:
+        """Run ``persist_openai_response_items`` in a worker thread and return its marker."""
+        if not items:
+            return ""
+        return await asyncio.to_thread(
+            persist_openai_response_items,
+            metadata.get("chat_id"),
+            metadata.get("message_id"),
+            items,
+            openwebui_model_id,
+            compression=valves.PAYLOAD_COMPRESSION,
+            image_dir=valves.IMAGE_OFFLOAD_DIR,
+            compression_min_bytes=valves.PAYLOAD_COMPRESSION_MIN_KB * 1024,
+        )
+
+    def _maybe_compact_items(
+        self, valves: "Pipe.Valves", chat_id: str | None, message_id: str | None
+    ) -> None:
+        """Compact ``chat_id``'s persisted items in a worker thread if the interval has elapsed.
+
+        Called when a turn starts, so it never races with the end-of-turn saves
+        of the final message and its sources; ``message_id`` (the turn being
+        generated) is excluded.
+        """
+        interval = valves.ITEM_COMPACTION_INTERVAL
+        if not interval or not chat_id:
+            return
+        now = time.monotonic()
+        last = self._items_compacted_at.get(chat_id)
+        if last is not None and now - last < interval:
+            return
+        self._items_compacted_at[chat_id] = now
+        self._items_compacted_at.move_to_end(chat_id)
+        while len(self._items_compacted_at) > 1024:
+            self._items_compacted_at.popitem(last=False)
+
+        async def _compact() -> None:
+            try:
+                report = await asyncio.to_thread(
+                    compact_openai_response_items,
+                    chat_id,
+                    keep_reasoning_turns=valves.COMPACTION_KEEP_REASONING_TURNS,
+                    exclude_message_ids=[message_id] if message_id else [],
+                )
+                if report["items_removed"]:
+                    self.logger.info("Compacted items for chat %s: %s", chat_id, report)
+            except Exception as exc:
+                self.logger.warning("Item compaction failed for %s: %s", chat_id, exc)
+
+        task = asyncio.create_task(_compact())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def _maybe_summarize_history(
+        self,
+        valves: "Pipe.Valves",
+        chat_id: str | None,
+        messages: List[Dict[str, Any]],
+        input_items: Optional[List[Dict[str, Any]]],
+    ) -> None:
+        """Extend ``chat_id``'s rolling summary in the background if the input is over the threshold."""
+        threshold = valves.HISTORY_SUMMARY_TRIGGER_TOKENS
+        if not threshold or not chat_id or chat_id in self._summaries_in_flight:
+            return
+        if estimate_text_tokens(input_items or []) < threshold:
+            return
+        self._summaries_in_flight.add(chat_id)
+
+        async def _summarize() -> None:
+            try:
+                await self._summarize_history(valves, chat_id, messages)
+            except Exception as exc:
+                self.logger.warning("History summary failed for %s: %s", chat_id, exc)
+            finally:
+                self._summaries_in_flight.discard(chat_id)
+
+        task = asyncio.create_task(_summarize())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _summarize_history(
+        self, valves: "Pipe.Valves", chat_id: str, messages: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Fold the turns not yet covered by the stored summary into it and save the result.
+
+        Everything but the last ``HISTORY_SUMMARY_KEEP_MESSAGES`` messages is
+        covered, ending on an assistant message.  When the stored summary still
+        matches the start of the history, only the newer turns are sent along
+        with it; otherwise the summary is rebuilt from the first turn.
+        """
+        turns = [m for m in messages if m.get("role") != "system"]
+        end = len(turns) - valves.HISTORY_SUMMARY_KEEP_MESSAGES
+        while end > 0 and turns[end - 1].get("role") != "assistant":
+            end -= 1
+        if end <= 0:
+            return None
+
+        start, previous_text = 0, ""
+        previous = await asyncio.to_thread(load_history_summary, chat_id)
+        if (
+            previous
+            and previous["covered"] <= end
+            and previous["fingerprint"]
+            == history_fingerprint(turns[: previous["covered"]])
+        ):
+            start, previous_text = previous["covered"], previous["text"]
+        if start >= end:
+            return None
+
+        started = time.perf_counter()
+        text = await self._run_task_model_request(
+            {
+                "model": valves.HISTORY_SUMMARY_MODEL,
+                "instructions": HISTORY_SUMMARY_INSTRUCTIONS,
+                "input": (
+                    f"Previous summary:\n{previous_text or '(none)'}\n\n"
+                    f"New turns:\n{history_summary_transcript(turns[start:end])}"
+                ),
+            },
+            valves,
+        )
+        if not text.strip():
+            return None
+        summary = {
+            "text": text.strip(),
+            "covered": end,
+            "fingerprint": history_fingerprint(turns[:end]),
+            "model": valves.HISTORY_SUMMARY_MODEL,
+            "created_at": int(time.time()),
+        }
+        await asyncio.to_thread(save_history_summary, chat_id, summary)
+        pipe_metrics.inc(
+            "history_summaries_total",
+            model=valves.HISTORY_SUMMARY_MODEL,
+            mode="incremental" if start else "full",
+        )
+        self.logger.info(
+            "Summarized messages %d-%d of chat %s in %.1f s",
+            start,
+            end,
+            chat_id,
+            time.perf_counter() - started,
+        )
+        return summary
+
+    # 4.10 Internal Static Helpers
     def _merge_valves(self, global_valves, user_valves) -> "Pipe.Valves":
         """Merge user-level valves into the global defaults.
 
         Any field set to ``"INHERIT"`` (case-insensitive) is ignored so the
-        corresponding global value is preserved.
+        corresponding global value is preserved.  ``user_valves`` may be a
+        ``UserValves`` instance or its raw dict.  Results, including the global
+        valves alone when there are no overrides, are cached per (global values,
+        user valves) fingerprint and shared as read-only ``FrozenValves``.
         """
         if not user_valves:
-            return global_valves
+            user_fields: tuple = ()
+        elif isinstance(user_valves, BaseModel):
+            user_fields = tuple(user_valves.__dict__.items())
+        else:
+            user_fields = tuple(sorted(user_valves.items()))
+        key = (tuple(global_valves.__dict__.values()), user_fields)
+        merged = self._merged_valves.get(key)
+        if merged is not None:
+            self._merged_valves.move_to_end(key)
+            return merged
 
         # Merge: update only fields not set to "INHERIT"
         update = {
             k: v
-            for k, v in user_valves.model_dump().items()
+            for k, v in self.UserValves.model_validate(user_valves or {})
+            .model_dump()
+            .items()
             if v is not None and str(v).lower() != "inherit"
         }
-        return global_valves.model_copy(update=update)
+        merged = self.FrozenValves.model_construct(
+            **{**global_valves.__dict__, **update}
+        )
+        self._merged_valves[key] = merged
+        while len(self._merged_valves) > 256:
+            self._merged_valves.popitem(last=False)
+        return merged
+
+    async def _get_model_record(self, model_id: str) -> Any:
+        """Return Open WebUI's model record, cached for ``MODEL_RECORD_TTL`` seconds per worker.
+
+        Entries are dropped when this pipe updates the model; edits made in the
+        admin UI show up once the entry expires.
+        """
+        now = time.monotonic()
+        cached = self._model_records.get(model_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        model = await asyncio.to_thread(Models.get_model_by_id, model_id)
+        self._model_records[model_id] = (now + MODEL_RECORD_TTL, model)
+        return model
+
+    def _model_capabilities(
+        self, valves: "Pipe.Valves", model: str
+    ) -> ModelCapabilities:
+        """Look up ``model`` in the registry, recompiling it when ``MODEL_ID`` changes."""
+        if self._model_registry is None or valves.MODEL_ID != self._model_registry_key:
+            self._model_registry = ModelRegistry(
+                m.strip() for m in valves.MODEL_ID.split(",") if m.strip()
+            )
+            self._model_registry_key = valves.MODEL_ID
+        return self._model_registry.lookup(model)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1956,49 +3409,974 @@ class Pipe:
 # Support classes used across the pipe implementation
 # In-memory store for debug logs keyed by message ID
 logs_by_msg_id: dict[str, list[str]] = defaultdict(list)
+# Process-wide counters for turns aborted by the user (stop button / closed tab), keyed by
+# model.  Always recorded, unlike ``pipe_metrics`` (which is off while no exporter is set).
+cancelled_turn_stats: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
 # Context variable tracking the current message being processed
 current_session_id: ContextVar[str | None] = ContextVar(
     "current_session_id", default=None
 )
 
 
+_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+_INTER_DELTA_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+_BYTES_BUCKETS = tuple(1024 * 4**i for i in range(8))  # 1 KiB … 16 MiB
+_JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# name → (type, help, histogram buckets).  Exported with an ``openai_responses_`` prefix.
+METRIC_DEFINITIONS: dict[str, tuple[str, str, tuple[float, ...]]] = {
+    "ttft_seconds": (
+        "histogram",
+        "Time from request start to the first output text delta.",
+        _LATENCY_BUCKETS,
+    ),
+    "inter_delta_seconds": (
+        "histogram",
+        "Gap between consecutive output text deltas.",
+        _INTER_DELTA_BUCKETS,
+    ),
+    "function_call_loop_seconds": (
+        "histogram",
+        "Wall time of one model call + tool execution loop.",
+        _LATENCY_BUCKETS,
+    ),
+    "tool_execution_seconds": (
+        "histogram",
+        "Execution time of a single tool call.",
+        _LATENCY_BUCKETS,
+    ),
+    "persistence_seconds": (
+        "histogram",
+        "Time spent persisting or fetching Responses items in the chat DB.",
+        _LATENCY_BUCKETS,
+    ),
+    "history_conversion_seconds": (
+        "histogram",
+        "Time spent converting chat history to Responses API input.",
+        _LATENCY_BUCKETS,
+    ),
+    "request_bytes": (
+        "histogram",
+        "Serialized size of requests sent to the Responses API.",
+        _BYTES_BUCKETS,
+    ),
+    "response_bytes": (
+        "histogram",
+        "Size of responses (or SSE streams) received from the Responses API.",
+        _BYTES_BUCKETS,
+    ),
+    "cancelled_turns_total": (
+        "counter",
+        "Turns aborted by task cancellation or client disconnect.",
+        (),
+    ),
+    "wasted_tokens_total": (
+        "counter",
+        "Tokens spent on aborted turns (in-flight output is estimated).",
+        (),
+    ),
+    "reasoning_items_dropped_total": (
+        "counter",
+        "Persisted reasoning items left out of the input by REASONING_RETENTION.",
+        (),
+    ),
+    "reasoning_tokens_saved_total": (
+        "counter",
+        "Estimated input tokens saved by REASONING_RETENTION.",
+        (),
+    ),
+    "mcp_listing_cache_total": (
+        "counter",
+        "MCP tool listings reused from (hit) or missing in (miss) the MCP_TOOLS_CACHE_TTL cache.",
+        (),
+    ),
+    "background_wait_seconds": (
+        "histogram",
+        "Time from submitting a background response until it finished (by final status).",
+        _JOB_BUCKETS,
+    ),
+    "background_polls_total": (
+        "counter",
+        "Status polls made for background responses.",
+        (),
+    ),
+    "stream_resumes_total": (
+        "counter",
+        "Dropped background streams re-opened from the last sequence_number (RESUMABLE_STREAMING).",
+        (),
+    ),
+    "task_requests_total": (
+        "counter",
+        "Task-model requests by outcome: upstream call, shared in-flight call, or cached result.",
+        (),
+    ),
+    "batched_requests_total": (
+        "counter",
+        "Deferrable requests sent through a batch job, by outcome: batched, expired (sent directly after its tolerance) or failed.",
+        (),
+    ),
+    "batch_jobs_total": (
+        "counter",
+        "Batch jobs submitted to the batch backend.",
+        (),
+    ),
+    "history_summaries_total": (
+        "counter",
+        "Rolling history summaries written (full rebuilds and incremental updates).",
+        (),
+    ),
+}
+
+
+class PipeMetrics:
+    """In-process registry for the pipe's latency/throughput series.
+
+    Histograms use fixed buckets and are keyed by metric name plus a sorted
+    label tuple (every series carries at least a ``model`` label).  Recording is
+    a no-op while ``enabled`` is false, so disabled metrics cost one attribute
+    check.  ``snapshot()`` returns a plain-dict view consumed by exporters.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._series: dict[str, dict[tuple, list]] = defaultdict(dict)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record ``value`` in histogram ``name``."""
+        if not self.enabled:
+            return
+        buckets = METRIC_DEFINITIONS[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name].get(key)
+            if series is None:
+                # [bucket counts…, sum, count]
+                series = self._series[name][key] = [0] * (len(buckets) + 2)
+            idx = bisect.bisect_left(buckets, value)
+            if idx < len(buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increment counter ``name`` by ``value``."""
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0) + value
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Return ``{name: {"type", "help", "series": [...]}}`` with cumulative buckets."""
+        out: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for name, by_labels in self._series.items():
+                mtype, help_text, buckets = METRIC_DEFINITIONS[name]
+                series = []
+                for key, value in by_labels.items():
+                    entry: dict[str, Any] = {"labels": dict(key)}
+                    if mtype == "histogram":
+                        cumulative, running = [], 0
+                        for bound, count in zip(buckets, value):
+                            running += count
+                            cumulative.append([bound, running])
+                        entry.update(buckets=cumulative, sum=value[-2], count=value[-1])
+                    else:
+                        entry["value"] = value
+                    series.append(entry)
+                out[name] = {"type": mtype, "help": help_text, "series": series}
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsExporter(abc.ABC):
+    """Base class for metrics exporters.
+
+    Subclasses implement ``export(snapshot)``; it runs in a worker thread.  Register
+    new exporters in ``METRICS_EXPORTERS`` to make them selectable via the
+    ``METRICS_EXPORTER`` valve.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    @abc.abstractmethod
+    def export(self, snapshot: dict[str, dict[str, Any]]) -> None:
+        """Write ``snapshot`` (``PipeMetrics.snapshot()``) to ``self.path``."""
+
+
+class PrometheusTextExporter(MetricsExporter):
+    """Write the Prometheus text exposition format (node_exporter textfile style)."""
+
+    PREFIX = "openai_responses_"
+
+    @staticmethod
+    def _labels(labels: dict[str, str], **extra: str) -> str:
+        merged = {**labels, **extra}
+        if not merged:
+            return ""
+        inner = ",".join(
+            '{}="{}"'.format(
+                k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            )
+            for k, v in merged.items()
+        )
+        return "{" + inner + "}"
+
+    def render(self, snapshot: dict[str, dict[str, Any]]) -> str:
+        lines: list[str] = []
+        for name, metric in sorted(snapshot.items()):
+            full = self.PREFIX + name
+            lines.append(f"# HELP {full} {metric['help']}")
+            lines.append(f"# TYPE {full} {metric['type']}")
+            for series in metric["series"]:
+                labels = series["labels"]
+                if metric["type"] == "histogram":
+                    for bound, count in series["buckets"]:
+                        lines.append(
+                            f"{full}_bucket{self._labels(labels, le=repr(float(bound)))} {count}"
+                        )
+                    lines.append(
+                        f"{full}_bucket{self._labels(labels, le='+Inf')} {series['count']}"
+                    )
+                    lines.append(f"{full}_sum{self._labels(labels)} {series['sum']}")
+                    lines.append(
+                        f"{full}_count{self._labels(labels)} {series['count']}"
+                    )
+                else:
+                    lines.append(f"{full}{self._labels(labels)} {series['value']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, snapshot: dict[str, dict[str, Any]]) -> None:
+        # Write-then-rename so scrapers never read a partial file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write(self.render(snapshot))
+        os.replace(tmp_path, self.path)
+
+
+class JsonLinesExporter(MetricsExporter):
+    """Append one ``{"ts": …, "metrics": snapshot}`` JSON object per export."""
+
+    def export(self, snapshot: dict[str, dict[str, Any]]) -> None:
+        line = json.dumps({"ts": time.time(), "metrics": snapshot}, ensure_ascii=False)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+# Exporter name (``METRICS_EXPORTER`` valve) → factory taking the export path
+METRICS_EXPORTERS: dict[str, Callable[[str], MetricsExporter]] = {
+    "prometheus": PrometheusTextExporter,
+    "jsonl": JsonLinesExporter,
+}
+
+# Process-wide metrics registry shared by all pipe instances
+pipe_metrics = PipeMetrics()
+
+
+class BatchBackend(abc.ABC):
+    """Base class for batch backends used by ``RequestBatcher``.
+
+    Requests are lines in the OpenAI batch input format
+    (``{"custom_id", "method", "url", "body"}``); results are lines in its output
+    format (``{"custom_id", "response": {"status_code", "body"}, "error"}``).
+    Register new backends in ``BATCH_BACKENDS`` to make them selectable via the
+    ``BATCH_BACKEND`` valve.
+    """
+
+    @abc.abstractmethod
+    async def submit(self, requests: list[dict[str, Any]]) -> str:
+        """Submit one batch and return its ID."""
+
+    @abc.abstractmethod
+    async def poll(self, batch_id: str) -> Optional[list[dict[str, Any]]]:
+        """Return the result lines of a finished batch, or ``None`` while it is still running."""
+
+    @abc.abstractmethod
+    async def cancel(self, batch_id: str) -> None:
+        """Stop a batch nobody is waiting for any more."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API: upload a JSONL file, create a ``/v1/responses`` batch, read its output files."""
+
+    PENDING = frozenset({"validating", "in_progress", "finalizing", "cancelling"})
+
+    def __init__(self, pipe: Pipe, api_key: str, base_url: str) -> None:
+        self.pipe = pipe
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    async def _session(self) -> aiohttp.ClientSession:
+        self.pipe.session = await self.pipe._get_or_init_http_session()
+        return self.pipe.session
+
+    async def submit(self, requests: list[dict[str, Any]]) -> str:
+        session = await self._session()
+        form = aiohttp.FormData()
+        form.add_field("purpose", "batch")
+        form.add_field(
+            "file",
+            "\n".join(json.dumps(r, ensure_ascii=False) for r in requests).encode(),
+            filename="batch.jsonl",
+            content_type="application/jsonl",
+        )
+        async with session.post(
+            f"{self.base_url}/files", data=form, headers=self.headers
+        ) as resp:
+            resp.raise_for_status()
+            file_id = json.loads(await resp.read())["id"]
+        async with session.post(
+            f"{self.base_url}/batches",
+            json={
+                "input_file_id": file_id,
+                "endpoint": "/v1/responses",
+                "completion_window": "24h",
+            },
+            headers=self.headers,
+        ) as resp:
+            resp.raise_for_status()
+            return json.loads(await resp.read())["id"]
+
+    async def poll(self, batch_id: str) -> Optional[list[dict[str, Any]]]:
+        session = await self._session()
+        async with session.get(
+            f"{self.base_url}/batches/{batch_id}", headers=self.headers
+        ) as resp:
+            resp.raise_for_status()
+            batch = json.loads(await resp.read())
+        if batch.get("status") in self.PENDING:
+            return None
+
+        # Completed, failed, expired or cancelled: whatever output exists is final
+        lines: list[dict[str, Any]] = []
+        for key in ("output_file_id", "error_file_id"):
+            if not batch.get(key):
+                continue
+            async with session.get(
+                f"{self.base_url}/files/{batch[key]}/content", headers=self.headers
+            ) as resp:
+                resp.raise_for_status()
+                text = (await resp.read()).decode()
+            lines.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        return lines
+
+    async def cancel(self, batch_id: str) -> None:
+        session = await self._session()
+        async with session.post(
+            f"{self.base_url}/batches/{batch_id}/cancel", headers=self.headers
+        ) as resp:
+            resp.raise_for_status()
+
+
+class LocalBatchBackend(BatchBackend):
+    """Stand-in backend that runs each batch as concurrent direct calls via ``send(body)``."""
+
+    def __init__(self, send: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]):
+        self.send = send
+        self._jobs: dict[str, asyncio.Future] = {}
+
+    async def submit(self, requests: list[dict[str, Any]]) -> str:
+        batch_id = f"batch_{generate_item_id()}"
+        self._jobs[batch_id] = asyncio.gather(*(self._run(r) for r in requests))
+        return batch_id
+
+    async def _run(self, request: dict[str, Any]) -> dict[str, Any]:
+        try:
+            body = await self.send(request["body"])
+        except Exception as exc:
+            return {"custom_id": request["custom_id"], "error": {"message": str(exc)}}
+        return {
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "body": body},
+            "error": None,
+        }
+
+    async def poll(self, batch_id: str) -> Optional[list[dict[str, Any]]]:
+        job = self._jobs[batch_id]
+        if not job.done():
+            return None
+        del self._jobs[batch_id]
+        return job.result()
+
+    async def cancel(self, batch_id: str) -> None:
+        job = self._jobs.pop(batch_id, None)
+        if job is not None:
+            job.cancel()
+            try:
+                await job
+            except asyncio.CancelledError:
+                pass
+
+
+# Backend name (``BATCH_BACKEND`` valve) → factory taking the pipe and its valves
+BATCH_BACKENDS: dict[str, Callable[[Pipe, Pipe.Valves], BatchBackend]] = {
+    "openai": lambda pipe, valves: OpenAIBatchBackend(
+        pipe, valves.API_KEY, valves.BASE_URL
+    ),
+    "local": lambda pipe, valves: LocalBatchBackend(
+        lambda body: pipe.send_openai_responses_nonstreaming_request(
+            body, api_key=valves.API_KEY, base_url=valves.BASE_URL
+        )
+    ),
+}
+
+
+class RequestBatcher:
+    """Collect deferrable Responses requests into batch jobs and resolve them as futures.
+
+    ``submit(body, tolerance)`` queues a request that may wait up to
+    ``tolerance`` seconds.  The queue is flushed as one batch when it reaches
+    ``MAX_BATCH_SIZE`` or when the oldest request has used ``FLUSH_FRACTION`` of
+    its tolerance, leaving the rest for the batch to run.  A single worker task
+    (started on demand, exiting when idle) flushes the queue and polls submitted
+    batches every ``poll_interval`` seconds.  ``submit`` raises
+    ``asyncio.TimeoutError`` once the tolerance has passed without a result.
+    A batch is cancelled upstream as soon as none of its callers is waiting
+    (they have timed out or been cancelled and sent their requests directly),
+    so its remaining requests are not billed twice.
+    """
+
+    MAX_BATCH_SIZE = 100
+    FLUSH_FRACTION = 0.25
+
+    def __init__(self, backend: BatchBackend, *, poll_interval: float = 30.0):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self._queue: list[tuple[float, dict[str, Any], asyncio.Future]] = []
+        self._batches: dict[str, dict[str, asyncio.Future]] = {}
+        self._worker: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._cancel_tasks: set[asyncio.Task] = set()
+
+    async def submit(self, body: dict[str, Any], *, tolerance: float) -> dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(
+            (time.monotonic() + tolerance * self.FLUSH_FRACTION, body, future)
+        )
+        if len(self._queue) >= self.MAX_BATCH_SIZE:
+            self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        # On timeout or cancellation the future is cancelled and its result dropped
+        try:
+            return await asyncio.wait_for(future, tolerance)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._abandon(future)
+            raise
+
+    def _abandon(self, future: asyncio.Future) -> None:
+        """Cancel the batch holding ``future`` if no other caller still waits on it."""
+        for batch_id, futures in self._batches.items():
+            if future in futures.values():
+                if all(f.done() for f in futures.values()):
+                    task = asyncio.create_task(self._cancel(batch_id))
+                    self._cancel_tasks.add(task)
+                    task.add_done_callback(self._cancel_tasks.discard)
+                return
+
+    async def _cancel(self, batch_id: str) -> None:
+        """Drop ``batch_id`` and cancel it upstream; failures are only logged."""
+        if self._batches.pop(batch_id, None) is None:
+            return
+        try:
+            await self.backend.cancel(batch_id)
+        except Exception as exc:
+            SessionLogger.get_logger(__name__).warning(
+                "Could not cancel batch %s: %s", batch_id, exc
+            )
+
+    async def _run(self) -> None:
+        while self._queue or self._batches:
+            now = time.monotonic()
+            if self._queue and (
+                len(self._queue) >= self.MAX_BATCH_SIZE
+                or min(deadline for deadline, _, _ in self._queue) <= now
+            ):
+                await self._flush()
+            if self._batches:
+                await self._poll()
+
+            timeout = self.poll_interval if self._batches else None
+            if self._queue:
+                wait = min(deadline for deadline, _, _ in self._queue) - now
+                timeout = wait if timeout is None else min(timeout, wait)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout or 0, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush(self) -> None:
+        pending = self._queue[: self.MAX_BATCH_SIZE]
+        del self._queue[: self.MAX_BATCH_SIZE]
+        futures: dict[str, asyncio.Future] = {}
+        requests = []
+        for _, body, future in pending:
+            if future.done():
+                continue
+            custom_id = f"req_{generate_item_id()}"
+            futures[custom_id] = future
+            requests.append(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/responses",
+                    "body": body,
+                }
+            )
+        if not requests:
+            return
+        try:
+            batch_id = await self.backend.submit(requests)
+        except Exception as exc:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        pipe_metrics.inc(
+            "batch_jobs_total",
+            model=metrics_model_label(str(requests[0]["body"].get("model"))),
+        )
+        self._batches[batch_id] = futures
+
+    async def _poll(self) -> None:
+        for batch_id, futures in list(self._batches.items()):
+            if all(future.done() for future in futures.values()):
+                await self._cancel(batch_id)  # every caller expired or was cancelled
+                continue
+            try:
+                lines = await self.backend.poll(batch_id)
+            except Exception as exc:
+                lines, error = [], exc  # fail the batch; callers send directly
+            else:
+                if lines is None:
+                    continue
+                error = RuntimeError(f"Batch {batch_id} returned no result")
+            del self._batches[batch_id]
+
+            for line in lines:
+                future = futures.pop(line.get("custom_id"), None)
+                if future is None or future.done():
+                    continue
+                response = line.get("response") or {}
+                if line.get("error") or response.get("status_code", 500) >= 400:
+                    message = (line.get("error") or {}).get("message") or (
+                        (response.get("body") or {}).get("error") or {}
+                    ).get("message")
+                    future.set_exception(
+                        RuntimeError(f"Batched request failed: {message}")
+                    )
+                else:
+                    future.set_result(response["body"])
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(error)
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the front-end can no longer receive events for this request."""
+
+
+class DisconnectAwareEmitter:
+    """Wrap an Open WebUI event emitter and latch the first delivery failure.
+
+    A failing emitter means the websocket (and therefore the user) is gone.  The
+    failure is re-raised as ``ClientDisconnectedError`` so the streaming loop stops
+    reading upstream, and ``disconnected`` is set so concurrent waiters (e.g. tool
+    execution) can bail out too.
+    """
+
+    def __init__(
+        self, event_emitter: Optional[Callable[[dict[str, Any]], Awaitable[None]]]
+    ) -> None:
+        self._event_emitter = event_emitter
+        self.disconnected = asyncio.Event()
+
+    def __bool__(self) -> bool:
+        return self._event_emitter is not None
+
+    async def __call__(self, event: dict[str, Any]) -> None:
+        if self._event_emitter is None:
+            return
+        if self.disconnected.is_set():
+            raise ClientDisconnectedError("Event emitter already failed.")
+        try:
+            await self._event_emitter(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.disconnected.set()
+            raise ClientDisconnectedError(f"Event emitter failed: {exc}") from exc
+
+
+class QueuedEventEmitter:
+    """Bounded, single-consumer queue in front of an event emitter.
+
+    Calls return as soon as the event is queued; a dedicated task delivers the
+    events in order.  ``chat:message`` frames carry the *full* message, so only
+    the newest one matters: a frame that is still waiting in the queue is
+    replaced (``merged``) or discarded (``dropped``) when a newer one arrives.
+    All other events (``source``, ``status``, ``chat:completion``, …) are
+    delivered in order and block the producer when the queue is full.
+
+    ``stats`` exposes ``enqueued``, ``delivered``, ``merged``, ``dropped`` and
+    ``max_depth`` counters.  Call ``aclose()`` to flush (or discard) the queue.
+    """
+
+    def __init__(self, event_emitter: DisconnectAwareEmitter, maxsize: int = 256):
+        self._event_emitter = event_emitter
+        self._maxsize = max(1, maxsize)
+        self._pending: deque[dict[str, Any] | None] = deque()  # None = close sentinel
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._task: asyncio.Task | None = None
+        self.stats = {
+            "enqueued": 0,
+            "delivered": 0,
+            "merged": 0,
+            "dropped": 0,
+            "max_depth": 0,
+        }
+
+    @property
+    def disconnected(self) -> asyncio.Event:
+        return self._event_emitter.disconnected
+
+    def __bool__(self) -> bool:
+        return bool(self._event_emitter)
+
+    async def __call__(self, event: dict[str, Any]) -> None:
+        if not self._event_emitter:
+            return
+        if self.disconnected.is_set():
+            raise ClientDisconnectedError("Event emitter already failed.")
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+
+        self.stats["enqueued"] += 1
+        pending = self._pending
+
+        if event.get("type") == "chat:message":
+            # Latest state wins: overwrite a full-message frame still waiting at the tail
+            if pending and (pending[-1] or {}).get("type") == "chat:message":
+                pending[-1] = event
+                self.stats["merged"] += 1
+                return
+            if len(pending) >= self._maxsize:
+                self._drop_stale_messages()
+
+        while len(pending) >= self._maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+            if self.disconnected.is_set():
+                raise ClientDisconnectedError("Event emitter already failed.")
+
+        pending.append(event)
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(pending))
+        self._not_empty.set()
+
+    async def aclose(self, *, flush: bool = True) -> None:
+        """Stop the delivery task, first draining queued events when ``flush``."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        if flush and not task.done():
+            self._pending.append(None)
+            self._not_empty.set()
+            await task
+        else:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._pending.clear()
+
+    def _drop_stale_messages(self) -> None:
+        kept = [e for e in self._pending if (e or {}).get("type") != "chat:message"]
+        self.stats["dropped"] += len(self._pending) - len(kept)
+        self._pending.clear()
+        self._pending.extend(kept)
+
+    async def _drain(self) -> None:
+        try:
+            while True:
+                while not self._pending:
+                    self._not_empty.clear()
+                    await self._not_empty.wait()
+                event = self._pending.popleft()
+                self._not_full.set()
+                if event is None:
+                    return
+                await self._event_emitter(event)
+                self.stats["delivered"] += 1
+        except ClientDisconnectedError:
+            # ``disconnected`` is now set; the producer raises on its next call.
+            self._pending.clear()
+        finally:
+            self._not_full.set()
+
+
+class _SessionLevelLogger(logging.Logger):
+    """Logger whose effective level is the per-request ``SessionLogger.log_level``.
+
+    Overriding ``isEnabledFor`` makes disabled calls (e.g. ``debug`` at INFO) return
+    before a ``LogRecord`` is even created, and lets callers guard expensive
+    argument construction with ``logger.isEnabledFor(logging.DEBUG)``.
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= SessionLogger.log_level.get()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread *unformatted*.
+
+    The stock ``QueueHandler.prepare`` merges ``msg % args`` on the calling thread;
+    here formatting is left to the listener so the event loop only pays for the
+    enqueue.  Log arguments must therefore not be mutated after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 class SessionLogger:
     session_id = ContextVar("session_id", default=None)
     log_level = ContextVar("log_level", default=logging.INFO)
-    logs = defaultdict(lambda: deque(maxlen=2000))
+
+    MAX_SESSIONS = 256  # Sessions with retained logs; least recently used are evicted
+    MAX_RECORDS_PER_SESSION = 2000
+
+    # session_id → raw LogRecords (formatted only when read via ``get_logs``)
+    logs: OrderedDict[str, deque[logging.LogRecord]] = OrderedDict()
+
+    _lock = threading.Lock()
+    _queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener: logging.handlers.QueueListener | None = None
+    _loggers: dict[str, logging.Logger] = {}
+    _memory_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
 
     @classmethod
     def get_logger(cls, name=__name__):
-        """Return a logger wired to the current ``SessionLogger`` context."""
-        logger = logging.getLogger(name)
-        logger.handlers.clear()
-        logger.filters.clear()
-        logger.setLevel(logging.DEBUG)
-        logger.propagate = False
+        """Return a logger wired to the current ``SessionLogger`` context.
+
+        Records are tagged with the session ID, kept (unformatted) in a bounded
+        per-session buffer, and written to stdout by a background
+        ``QueueListener`` thread so the event loop never blocks on I/O.
+        """
+        logger = cls._loggers.get(name)
+        if logger is not None:
+            return logger
 
-        # Single combined filter
-        def filter(record):
-            record.session_id = cls.session_id.get()
-            return record.levelno >= cls.log_level.get()
+        with cls._lock:
+            if name in cls._loggers:
+                return cls._loggers[name]
 
-        logger.addFilter(filter)
+            logger = _SessionLevelLogger(name, logging.DEBUG)
+            logger.propagate = False
 
-        # Console handler
-        console = logging.StreamHandler(sys.stdout)
-        console.setFormatter(
-            logging.Formatter("[%(levelname)s] [%(session_id)s] %(message)s")
-        )
-        logger.addHandler(console)
+            def tag_session(record):
+                record.session_id = cls.session_id.get()
+                return True
+
+            logger.addFilter(tag_session)
+
+            # Console output is formatted and written on the listener thread
+            logger.addHandler(_DeferredQueueHandler(cls._queue))
+
+            # Memory handler
+            mem = logging.Handler()
+            mem.emit = cls._remember
+            logger.addHandler(mem)
+
+            if cls._listener is None:
+                console = logging.StreamHandler(sys.stdout)
+                console.setFormatter(
+                    logging.Formatter("[%(levelname)s] [%(session_id)s] %(message)s")
+                )
+                cls._listener = logging.handlers.QueueListener(cls._queue, console)
+                cls._listener.start()
+
+            cls._loggers[name] = logger
+            return logger
+
+    @classmethod
+    def get_logs(cls, session_id: str | None) -> list[str]:
+        """Format and return the retained log lines for ``session_id``."""
+        with cls._lock:
+            records = list(cls.logs.get(session_id, ()))
+        return [cls._memory_formatter.format(r) for r in records]
+
+    @classmethod
+    def clear(cls, session_id: str | None) -> None:
+        """Forget the retained logs for ``session_id``."""
+        with cls._lock:
+            cls.logs.pop(session_id, None)
+
+    @classmethod
+    def _remember(cls, record: logging.LogRecord) -> None:
+        session_id = getattr(record, "session_id", None)
+        if not session_id:
+            return
+        with cls._lock:
+            records = cls.logs.get(session_id)
+            if records is None:
+                records = cls.logs[session_id] = deque(
+                    maxlen=cls.MAX_RECORDS_PER_SESSION
+                )
+                while len(cls.logs) > cls.MAX_SESSIONS:
+                    cls.logs.popitem(last=False)
+            else:
+                cls.logs.move_to_end(session_id)
+            records.append(record)
+
+
+class ModelRegistry:
+    """Resolve model IDs to frozen ``ModelCapabilities`` records.
+
+    Records for the configured model IDs, every ``FEATURE_SUPPORT`` family and
+    every ``MODEL_ALIASES`` pseudo-model are compiled up front.  Other IDs (dated
+    snapshots such as ``o3-2025-04-16``, prefixed Open WebUI IDs) are resolved
+    to their family on first lookup and memoized.
+    """
 
-        # Memory handler
-        mem = logging.Handler()
-        mem.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        mem.emit = lambda r: (
-            cls.logs[r.session_id].append(mem.format(r)) if r.session_id else None
+    MAX_RECORDS = 1024
+
+    def __init__(self, model_ids: Iterable[str] = ()):
+        self._records: dict[str, ModelCapabilities] = {}
+        families = {m for models in FEATURE_SUPPORT.values() for m in models}
+        for model_id in (*model_ids, *sorted(families), *MODEL_ALIASES):
+            self.lookup(model_id)
+
+    def lookup(self, model_id: str) -> ModelCapabilities:
+        record = self._records.get(model_id)
+        if record is None:
+            record = self._compile(model_id)
+            if len(self._records) < self.MAX_RECORDS:
+                self._records[model_id] = record
+        return record
+
+    @staticmethod
+    def _compile(model_id: str) -> ModelCapabilities:
+        key = model_id.strip().lower().removeprefix("openai_responses.")
+        key = MODEL_ALIASES.get(key, (key, None))[0]
+        family = SNAPSHOT_SUFFIX_RE.sub("", key)
+        return ModelCapabilities(
+            model_id=model_id,
+            family=family,
+            **{
+                feature: family in models for feature, models in FEATURE_SUPPORT.items()
+            },
         )
-        logger.addHandler(mem)
 
-        return logger
+
+class TurnTimings:
+    """Per-turn timing collector for the optional status-block breakdown.
+
+    Only instantiated when ``SHOW_TIMING_BREAKDOWN`` is on; the active instance is
+    published through the ``current`` context variable so helpers deep in the call
+    stack (tool execution, DB persistence) can record into it.  When disabled every
+    hook reduces to a ``None`` check.
+    """
+
+    current: ContextVar[Optional["TurnTimings"]] = ContextVar(
+        "turn_timings", default=None
+    )
+
+    def __init__(self, started_at: float) -> None:
+        self.started_at = started_at  # perf_counter() at pipe() entry
+        self.setup: float | None = None  # pipe() entry → first request sent
+        self.queue_wait: float | None = None  # request sent → first upstream event
+        self.ttft: float | None = None  # pipe() entry → first output token
+        self.model_loops: list[float] = (
+            []
+        )  # request sent → response completed, per loop
+        self.tools: list[tuple[str, float]] = []
+        self.persistence = 0.0
+        self.usage: dict[str, Any] = {}
+
+    @classmethod
+    def add_persistence(cls, seconds: float) -> None:
+        timings = cls.current.get()
+        if timings is not None:
+            timings.persistence += seconds
+
+    def mark_first_event(self, request_sent_at: float) -> None:
+        self.setup = request_sent_at - self.started_at
+        self.queue_wait = time.perf_counter() - request_sent_at
+
+    def render(self) -> list[str]:
+        """Return compact one-line summaries suitable for status sub-bullets."""
+        lines: list[str] = []
+
+        head = [
+            f"{label} {value:.2f} s"
+            for label, value in (
+                ("setup", self.setup),
+                ("queue", self.queue_wait),
+                ("TTFT", self.ttft),
+            )
+            if value is not None
+        ]
+        if head:
+            lines.append("⏱️ " + " · ".join(head))
+
+        if self.model_loops:
+            lines.append(
+                "model: "
+                + " · ".join(
+                    f"loop {i} {t:.2f} s" for i, t in enumerate(self.model_loops, 1)
+                )
+            )
+
+        if self.tools:
+            lines.append(
+                "tools: " + " · ".join(f"`{name}` {t:.2f} s" for name, t in self.tools)
+            )
+
+        if self.persistence:
+            lines.append(f"persistence: {self.persistence:.3f} s")
+
+        input_tokens = self.usage.get("input_tokens") or 0
+        if input_tokens or self.usage.get("output_tokens"):
+            cached = (self.usage.get("input_tokens_details") or {}).get(
+                "cached_tokens"
+            ) or 0
+            reasoning = (self.usage.get("output_tokens_details") or {}).get(
+                "reasoning_tokens"
+            ) or 0
+            tokens = f"tokens: {input_tokens:,} in"
+            if input_tokens:
+                tokens += f" ({cached / input_tokens:.0%} cached)"
+            tokens += f" · {self.usage.get('output_tokens') or 0:,} out"
+            if reasoning:
+                tokens += f" ({reasoning:,} reasoning)"
+            lines.append(tokens)
+
+        return lines
 
 
 class ExpandableStatusIndicator:
@@ -2047,18 +4425,20 @@ class ExpandableStatusIndicator:
     ▸ `finish(assistant_message, *, emit=True) -> str`
         Append “Finished in X s”, set `done="true"` and freeze the instance.
         Subsequent `add`/`update_last_status` calls raise `RuntimeError`.
+        When constructed with `timings`, the per-turn breakdown is appended as
+        sub-bullets of that final line.
 
     ▸ `reset()`
         Clear bullets and restart the internal timer.
 
     Constructor
     ───────────
-    `ExpandableStatusIndicator(event_emitter=None, *, expanded=False)`
+    `ExpandableStatusIndicator(event_emitter=None, *, timings=None)`
 
     * `event_emitter` must be an **async** callable accepting
       `{"type": "chat:message", "data": {"content": <str>}}`.
       When supplied (and `emit=True`), every status change is pushed to the UI.
-    * `expanded` (default **False**) starts the details block open when true.
+    * `timings` (optional `TurnTimings`) adds a timing breakdown on `finish`.
 
     Design guarantees
     ─────────────────
@@ -2077,8 +4457,11 @@ class ExpandableStatusIndicator:
     def __init__(
         self,
         event_emitter: Optional[Callable[[dict[str, Any]], Awaitable[None]]] = None,
+        *,
+        timings: Optional[TurnTimings] = None,
     ) -> None:
         self._event_emitter = event_emitter
+        self._timings = timings
         self._items: List[Tuple[str, List[str]]] = []
         self._started = time.perf_counter()
         self._done: bool = False
@@ -2139,7 +4522,8 @@ class ExpandableStatusIndicator:
         if self._done:
             return assistant_message
         elapsed = time.perf_counter() - self._started
-        self._items.append((f"Finished in {elapsed:.1f} s", []))
+        breakdown = self._timings.render() if self._timings is not None else []
+        self._items.append((f"Finished in {elapsed:.1f} s", breakdown))
         self._done = True
         return await self._render(assistant_message, emit)
 
@@ -2197,11 +4581,179 @@ class ExpandableStatusIndicator:
 # 6. Framework Integration Helpers (Open WebUI DB operations)
 # ─────────────────────────────────────────────────────────────────────────────
 # Utility functions that interface with Open WebUI's data models
+
+# Per-chat locks serializing the pipe's own read-modify-writes of
+# ``openai_responses_pipe``: chat_id -> [lock, number of holders and waiters]
+_chat_locks: dict[str, list[Any]] = {}
+_chat_locks_guard = threading.Lock()
+
+
+@contextlib.contextmanager
+def _chat_lock(chat_id: str):
+    """Hold ``chat_id``'s lock; the entry is dropped once nobody holds or waits for it."""
+    with _chat_locks_guard:
+        entry = _chat_locks.setdefault(chat_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _chat_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _chat_locks[chat_id]
+
+
+def update_pipe_root(
+    chat_id: str, mutate: Callable[[Dict[str, Any], Dict[str, Any]], bool]
+) -> bool:
+    """Apply ``mutate(pipe_root, chat)`` to a freshly read chat; save it if it returns true.
+
+    ``mutate`` may only change the ``openai_responses_pipe`` subtree.  The chat
+    is read right before the change and written right after it, under a
+    per-chat lock: the pipe's writers (persistence, compaction, summaries,
+    background records) never interleave on one chat, and a concurrent Open
+    WebUI save of the message or its sources can only race with this short
+    window instead of being overwritten by a stale copy.  Blocking; call it
+    from a worker thread.
+
+    :return: ``False`` if the chat does not exist.
+    """
+    with _chat_lock(chat_id):
+        chat_model = Chats.get_chat_by_id(chat_id)
+        if not chat_model:
+            return False
+        chat = chat_model.chat
+        pipe_root = chat.setdefault("openai_responses_pipe", {"__v": 3})
+        if mutate(pipe_root, chat):
+            Chats.update_chat_by_id(chat_id, chat)
+    return True
+
+
+def _store_blob(
+    blobs: Dict[str, Dict[str, Any]], payload: Dict[str, Any], raw: bytes, codec: str
+) -> str:
+    """Store ``payload`` (serialized as ``raw``) in ``blobs`` once and return its digest.
+
+    Compressed bytes have to be base64 text inside the chat JSON, which costs a
+    third of the gain, so payloads that are already dense (encrypted reasoning,
+    PNG base64) are kept as plain JSON and only deduplicated.
+    """
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    if digest in blobs:  # identical payload already stored
+        return digest
+    if codec == "zstd":
+        try:
+            import zstandard
+
+            packed = zstandard.ZstdCompressor(level=3).compress(raw)
+        except ImportError:
+            codec, packed = "zlib", zlib.compress(raw, 6)
+    else:
+        codec, packed = "zlib", zlib.compress(raw, 6)
+    encoded = base64.b64encode(packed).decode("ascii")
+    if len(encoded) < 0.8 * len(raw):
+        blobs[digest] = {"codec": codec, "data": encoded}
+    else:
+        blobs[digest] = {"codec": "none", "data": payload}
+    return digest
+
+
+def _load_blob(blob: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a blob written by ``_store_blob`` back into its payload dict."""
+    codec, data = blob.get("codec"), blob.get("data", "")
+    if codec == "none":
+        return data
+    packed = base64.b64decode(data)
+    if codec == "zstd":
+        import zstandard
+
+        return json.loads(zstandard.ZstdDecompressor().decompress(packed))
+    return json.loads(zlib.decompress(packed))
+
+
+def _image_path(directory: str, digest: str, ext: str) -> Optional[str]:
+    """Return the file for an offloaded image, or ``None`` if the reference is malformed.
+
+    References come from chat JSON, which users can import or edit, so the path
+    is always rebuilt under ``directory`` from a validated digest and extension.
+    """
+    if not directory or not IMAGE_DIGEST_RE.fullmatch(digest or ""):
+        return None
+    if not IMAGE_EXT_RE.fullmatch(ext or ""):
+        return None
+    return os.path.join(os.path.abspath(directory), digest[:2], f"{digest}.{ext}")
+
+
+def _item_type(
+    entry: Dict[str, Any], blobs: Dict[str, Dict[str, Any]]
+) -> Optional[str]:
+    """Return the Responses item type of a stored entry (inline or blobbed payload).
+
+    Blobbed entries carry ``type`` next to ``payload_ref``; entries written
+    before that are decoded once to find it.
+    """
+    if "payload" in entry:
+        return entry["payload"].get("type")
+    if "type" in entry:
+        return entry["type"]
+    blob = blobs.get(entry.get("payload_ref"))
+    return _load_blob(blob).get("type") if blob else None
+
+
+def _offload_image_result(payload: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """Write an image result to ``directory`` (content-addressed) and return a copy
+    of ``payload`` that references the file instead of embedding the base64."""
+    result = payload.get("result")
+    if not isinstance(result, str) or not result:
+        return payload
+    data = base64.b64decode(result)
+    digest = hashlib.sha256(data).hexdigest()
+    ext = str(payload.get("output_format") or "png").lower()
+    path = _image_path(directory, digest, ext)
+    if path is None:
+        return payload
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    return {**payload, "result": None, "result_ref": {"sha256": digest, "ext": ext}}
+
+
+def _rehydrate_image_result(
+    payload: Dict[str, Any], rehydrate: bool, directory: str
+) -> Dict[str, Any]:
+    """Turn an offloaded image item back into a valid input item.
+
+    The ``result_ref`` key is not part of the API schema, so it is always
+    dropped; with ``rehydrate`` the file is read back into ``result`` from
+    ``directory``.  Any ``path`` stored in the reference is ignored.
+    """
+    ref = payload.get("result_ref")
+    item = {k: v for k, v in payload.items() if k != "result_ref"}
+    if rehydrate and isinstance(ref, dict):
+        ext = ref.get("ext") or str(payload.get("output_format") or "png").lower()
+        path = _image_path(directory, str(ref.get("sha256", "")), str(ext))
+        if path is not None:
+            try:
+                with open(path, "rb") as fh:
+                    item["result"] = base64.b64encode(fh.read()).decode("ascii")
+            except OSError:
+                pass  # File gone: send the call without its image
+    return item
+
+
 def persist_openai_response_items(
     chat_id: str,
     message_id: str,
     items: List[Dict[str, Any]],
     openwebui_model_id: str,
+    *,
+    compression: str = "disabled",
+    compression_min_bytes: int = 8192,
+    image_dir: str = "",
 ) -> str:
     """Persist items and return their wrapped marker string.
 
@@ -2209,44 +4761,240 @@ def persist_openai_response_items(
     :param message_id: Message ID the items belong to.
     :param items: Sequence of payloads to store.
     :param openwebui_model_id: Fully qualified model ID the items originate from.
-    :return: Concatenated empty-link encoded item IDs for later retrieval.
+    :param compression: ``"zlib"``/``"zstd"`` to store large payloads as
+        compressed, content-addressed blobs; ``"disabled"`` stores them verbatim.
+    :param compression_min_bytes: Only payloads at least this large are blobbed.
+    :param image_dir: Offload ``image_generation_call`` results to files here.
+    :return: One empty-link marker: v2 for a single item, v3 for a batch.
     """
 
     if not items:
         return ""
 
-    chat_model = Chats.get_chat_by_id(chat_id)
-    if not chat_model:
-        return ""
+    started = time.perf_counter()
+    markers: list[str] = []
+
+    def _persist(pipe_root: Dict[str, Any], chat: Dict[str, Any]) -> bool:
+        items_store = pipe_root.setdefault("items", {})
+        messages_index = pipe_root.setdefault("messages_index", {})
+
+        message_bucket = messages_index.setdefault(
+            message_id,
+            {"role": "assistant", "done": True, "item_ids": []},
+        )
 
-    pipe_root = chat_model.chat.setdefault("openai_responses_pipe", {"__v": 3})
-    items_store = pipe_root.setdefault("items", {})
-    messages_index = pipe_root.setdefault("messages_index", {})
+        now = int(datetime.datetime.utcnow().timestamp())
+        item_ids: List[str] = []
+
+        for payload in items:
+            item_id = generate_item_id()
+            if image_dir and payload.get("type") == "image_generation_call":
+                payload = _offload_image_result(payload, image_dir)
+            entry = {
+                "model": openwebui_model_id,
+                "created_at": now,
+                "payload": payload,
+                "message_id": message_id,
+            }
+            if compression != "disabled":
+                raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()
+                if len(raw) >= compression_min_bytes:
+                    # The type stays readable so compaction can filter without decoding
+                    del entry["payload"]
+                    entry["type"] = payload.get("type")
+                    entry["payload_ref"] = _store_blob(
+                        pipe_root.setdefault("blobs", {}), payload, raw, compression
+                    )
+            items_store[item_id] = entry
+            item_ids.append(item_id)
+        message_bucket["item_ids"].extend(item_ids)
+
+        # A single item keeps its own v2 marker; a flush of several items is stored
+        # as one ordered batch and referenced by a single v3 marker.
+        if len(item_ids) == 1:
+            marker = create_marker(items[0].get("type", "unknown"), ulid=item_ids[0])
+        else:
+            batch_id = generate_item_id()
+            pipe_root.setdefault("batches", {})[batch_id] = {
+                "message_id": message_id,
+                "item_ids": item_ids,
+            }
+            marker = create_batch_marker(batch_id)
+        markers.append(marker)
+        return True
 
-    message_bucket = messages_index.setdefault(
-        message_id,
-        {"role": "assistant", "done": True, "item_ids": []},
+    if not update_pipe_root(chat_id, _persist):
+        return ""
+    marker = markers[0]
+    elapsed = time.perf_counter() - started
+    TurnTimings.add_persistence(elapsed)
+    pipe_metrics.observe(
+        "persistence_seconds",
+        elapsed,
+        model=metrics_model_label(openwebui_model_id),
+        operation="persist",
     )
+    return wrap_marker(marker)
 
-    now = int(datetime.datetime.utcnow().timestamp())
-    hidden_uid_markers: List[str] = []
 
-    for payload in items:
-        item_id = generate_item_id()
-        items_store[item_id] = {
-            "model": openwebui_model_id,
-            "created_at": now,
-            "payload": payload,
-            "message_id": message_id,
-        }
-        message_bucket["item_ids"].append(item_id)
-        hidden_uid_marker = wrap_marker(
-            create_marker(payload.get("type", "unknown"), ulid=item_id)
+def compact_openai_response_items(
+    chat_id: str,
+    *,
+    keep_reasoning_turns: Optional[int] = None,
+    exclude_message_ids: Iterable[str] = (),
+) -> Dict[str, int]:
+    """Drop persisted items that can no longer be referenced and save the chat.
+
+    Walks ``messages_index`` and removes the items (and v3 batches) of messages
+    that no longer exist in ``history.messages`` (regenerated responses, deleted
+    branches), plus items not indexed under any message and payload blobs no
+    item refers to.  With
+    ``keep_reasoning_turns`` set, reasoning items are kept only for the newest N
+    assistant messages.  Markers left in old message text simply resolve to
+    nothing.  Messages in ``exclude_message_ids`` (the turn in progress, which
+    may not be in ``history.messages`` yet) are never touched.  The chat is
+    changed through ``update_pipe_root``; ``bytes_*`` measure the pipe's subtree.
+
+    :param chat_id: Chat to compact.
+    :param keep_reasoning_turns: Keep reasoning items for this many recent turns.
+    :param exclude_message_ids: Messages whose items are always kept.
+    :return: Counts of removed messages/items/batches/blobs and bytes before/after.
+    """
+    report = {
+        "messages_removed": 0,
+        "items_removed": 0,
+        "batches_removed": 0,
+        "blobs_removed": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+        "bytes_reclaimed": 0,
+    }
+    excluded = set(exclude_message_ids)
+
+    def _compact(pipe_root: Dict[str, Any], chat: Dict[str, Any]) -> bool:
+        report["bytes_before"] = len(json.dumps(pipe_root, ensure_ascii=False))
+        items_store = pipe_root.get("items", {})
+        messages_index = pipe_root.get("messages_index", {})
+        batches = pipe_root.get("batches", {})
+        blobs = pipe_root.get("blobs", {})
+        history = chat.get("history", {}).get("messages", {})
+
+        # 1. Messages that no longer exist in the chat history
+        for message_id in [
+            m for m in messages_index if m not in history and m not in excluded
+        ]:
+            del messages_index[message_id]
+            report["messages_removed"] += 1
+        background = pipe_root.get("background_responses", {})
+        for message_id in [
+            m for m in background if m not in history and m not in excluded
+        ]:
+            del background[message_id]
+
+        # 2. Reasoning from all but the newest N assistant turns
+        if keep_reasoning_turns is not None:
+
+            def turn_order(message_id: str) -> tuple:
+                ids = messages_index[message_id]["item_ids"]
+                timestamp = (history.get(message_id) or {}).get("timestamp")
+                return (timestamp or 0, min(ids, default=""))
+
+            turns = sorted(
+                (m for m in messages_index if m not in excluded),
+                key=turn_order,
+                reverse=True,
+            )
+            for message_id in turns[keep_reasoning_turns:]:
+                bucket = messages_index[message_id]
+                bucket["item_ids"] = [
+                    i
+                    for i in bucket["item_ids"]
+                    if _item_type(items_store.get(i) or {}, blobs) != "reasoning"
+                ]
+
+        # 3. Everything not referenced from the index goes
+        live = {i for bucket in messages_index.values() for i in bucket["item_ids"]}
+        for item_id in [i for i in items_store if i not in live]:
+            del items_store[item_id]
+            report["items_removed"] += 1
+        for batch_id, batch in list(batches.items()):
+            batch["item_ids"] = [i for i in batch["item_ids"] if i in live]
+            if not batch["item_ids"]:
+                del batches[batch_id]
+                report["batches_removed"] += 1
+        referenced = {item.get("payload_ref") for item in items_store.values()}
+        for digest in [d for d in blobs if d not in referenced]:
+            del blobs[digest]
+            report["blobs_removed"] += 1
+
+        report["bytes_after"] = len(json.dumps(pipe_root, ensure_ascii=False))
+        return bool(
+            report["items_removed"]
+            or report["messages_removed"]
+            or report["blobs_removed"]
         )
-        hidden_uid_markers.append(hidden_uid_marker)
 
-    Chats.update_chat_by_id(chat_id, chat_model.chat)
-    return "".join(hidden_uid_markers)
+    update_pipe_root(chat_id, _compact)
+    report["bytes_reclaimed"] = report["bytes_before"] - report["bytes_after"]
+    return report
+
+
+def record_background_response(
+    chat_id: Optional[str],
+    message_id: Optional[str],
+    response_id: str,
+    status: Optional[str],
+) -> None:
+    """Remember which background response produces ``message_id`` and its last status.
+
+    Stored under ``openai_responses_pipe.background_responses`` so a turn whose
+    worker went away can still be traced to (and fetched from) the provider.
+    Written through ``update_pipe_root``; blocking, so call it from a worker thread.
+    """
+    if not chat_id or not message_id:
+        return
+
+    def _record(pipe_root: Dict[str, Any], chat: Dict[str, Any]) -> bool:
+        pipe_root.setdefault("background_responses", {})[message_id] = {
+            "response_id": response_id,
+            "status": status,
+            "updated_at": int(time.time()),
+        }
+        return True
+
+    update_pipe_root(chat_id, _record)
+
+
+def load_history_summary(chat_id: str) -> Optional[Dict[str, Any]]:
+    """Return the rolling history summary stored for ``chat_id`` (or ``None``)."""
+    chat_model = Chats.get_chat_by_id(chat_id)
+    if not chat_model:
+        return None
+    return chat_model.chat.get("openai_responses_pipe", {}).get("history_summary")
+
+
+def save_history_summary(chat_id: str, summary: Dict[str, Any]) -> bool:
+    """Store ``summary`` as the chat's rolling history summary.
+
+    A stored summary that already covers more messages is kept, so a slow
+    summarization cannot replace a newer one.  Written through
+    ``update_pipe_root``; blocking, so call it from a worker thread.
+
+    :return: ``True`` if the summary was written.
+    """
+    written = False
+
+    def _save(pipe_root: Dict[str, Any], chat: Dict[str, Any]) -> bool:
+        nonlocal written
+        current = pipe_root.get("history_summary")
+        if current and current.get("covered", 0) > summary["covered"]:
+            return False
+        pipe_root["history_summary"] = summary
+        written = True
+        return True
+
+    update_pipe_root(chat_id, _save)
+    return written
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -2271,6 +5019,70 @@ def merge_usage_stats(total, new):
     return total
 
 
+@functools.lru_cache(maxsize=256)
+def citation_link_pattern(domain: str) -> re.Pattern[str]:
+    """Return the compiled pattern (cached per domain) for the ``([domain](url))`` link a model prints with a citation."""
+    return re.compile(rf"\(\s*\[\s*{re.escape(domain)}\s*\]\([^)]+\)\s*\)")
+
+
+def split_reasoning_summary(text: str) -> tuple[str, str]:
+    """Split a reasoning summary part into its title and body.
+
+    The title is the last bold header (``**…**``), or "Thinking…" when there is
+    none; the body is the text with all bold headers removed.
+    """
+    titles = BOLD_RE.findall(text)
+    title = titles[-1].strip() if titles else "Thinking…"
+    return title, BOLD_RE.sub("", text).strip()
+
+
+def metrics_model_label(model_id: str) -> str:
+    """Return the ``model`` metrics label for an Open WebUI or API model ID.
+
+    Matches ``CompletionsBody.model`` (prefix stripped, lowercased, aliases
+    resolved), so every series for a request carries the same label.
+    """
+    key = model_id.strip().removeprefix("openai_responses.").lower()
+    return MODEL_ALIASES.get(key, (key, None))[0]
+
+
+def record_cancelled_turn(
+    model: str,
+    usage: dict[str, Any],
+    streamed_chars: int,
+    *,
+    reason: str,
+) -> dict[str, int]:
+    """Accumulate wasted-token counters for a turn that was aborted mid-flight.
+
+    Usage from already completed loops is known exactly.  The output streamed by
+    the in-flight loop never received a usage block, so it is estimated at ~4
+    characters per token.
+
+    :param model: Model the turn was sent to (used as the stats key).
+    :param usage: Merged usage of the loops that completed before the abort.
+    :param streamed_chars: Visible characters received from the in-flight loop.
+    :param reason: ``"task_cancelled"`` or ``"client_disconnected"``.
+    :return: The wasted token counts recorded for this turn.
+    """
+    wasted = {
+        "input": int(usage.get("input_tokens", 0) or 0),
+        "output": int(usage.get("output_tokens", 0) or 0),
+        "inflight_output_estimate": streamed_chars // 4,
+    }
+    stats = cancelled_turn_stats[model]
+    stats["turns"] += 1
+    stats[f"turns_{reason}"] += 1
+    stats["input_tokens"] += wasted["input"]
+    stats["output_tokens"] += wasted["output"]
+    stats["estimated_inflight_output_tokens"] += wasted["inflight_output_estimate"]
+    pipe_metrics.inc("cancelled_turns_total", model=model, reason=reason)
+    for kind, tokens in wasted.items():
+        if tokens:
+            pipe_metrics.inc("wasted_tokens_total", tokens, model=model, kind=kind)
+    return wasted
+
+
 def wrap_code_block(text: str, language: str = "python") -> str:
     """Wrap ``text`` in a fenced Markdown code block.
 
@@ -2307,9 +5119,11 @@ def remove_details_tags_by_type(text: str, removal_types: list[str]) -> str:
 ULID_LENGTH = 16
 CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
 
-_SENTINEL = "[openai_responses:v2:"
+# v2 markers reference one item; v3 markers (kind "batch") reference an ordered
+# batch of items stored under ``openai_responses_pipe.batches``.
+_SENTINEL = "[openai_responses:v"
 _RE = re.compile(
-    rf"\[openai_responses:v2:(?P<kind>[a-z0-9_]{{2,30}}):"
+    rf"\[openai_responses:(?P<version>v[23]):(?P<kind>[a-z0-9_]{{2,30}}):"
     rf"(?P<ulid>[A-Z0-9]{{{ULID_LENGTH}}})(?:\?(?P<query>[^\]]+))?\]:\s*#",
     re.I,
 )
@@ -2323,8 +5137,32 @@ def _parse_qs(q: str) -> dict[str, str]:
     return dict(p.split("=", 1) for p in q.split("&")) if q else {}
 
 
+# 80-bit IDs: 48-bit millisecond timestamp + 32 random bits, 16 Crockford chars.
+# The alphabet is in ASCII order, so string order == creation order.
+_ULID_RANDOM_BITS = ULID_LENGTH * 5 - 48
+_CROCKFORD_PAIRS = [a + b for a in CROCKFORD_ALPHABET for b in CROCKFORD_ALPHABET]
+_ULID_PAIR_SHIFTS = range(ULID_LENGTH * 5 - 10, -1, -10)
+_ulid_lock = threading.Lock()
+_ulid_last = 0
+
+
 def generate_item_id() -> str:
-    return "".join(secrets.choice(CROCKFORD_ALPHABET) for _ in range(ULID_LENGTH))
+    """Return a sortable, ULID-style item ID (monotonic within a process).
+
+    IDs created in the same millisecond increment the previous value instead of
+    drawing new random bits, so ``sorted(ids)`` is creation order.
+    """
+    global _ulid_last
+    value = (time.time_ns() // 1_000_000) << _ULID_RANDOM_BITS | int.from_bytes(
+        os.urandom(_ULID_RANDOM_BITS // 8)
+    )
+    with _ulid_lock:
+        if value <= _ulid_last:
+            value = _ulid_last + 1
+        _ulid_last = value
+    return "".join(
+        _CROCKFORD_PAIRS[(value >> shift) & 0x3FF] for shift in _ULID_PAIR_SHIFTS
+    )
 
 
 def create_marker(
@@ -2343,6 +5181,10 @@ def create_marker(
     return f"{base}?{_qs(meta)}" if meta else base
 
 
+def create_batch_marker(batch_id: str) -> str:
+    return f"openai_responses:v3:batch:{batch_id}"
+
+
 def wrap_marker(marker: str) -> str:
     return f"\n[{marker}]: #\n"
 
@@ -2352,19 +5194,27 @@ def contains_marker(text: str) -> bool:
 
 
 def parse_marker(marker: str) -> dict:
-    if not marker.startswith("openai_responses:v2:"):
-        raise ValueError("not a v2 marker")
-    _, _, kind, rest = marker.split(":", 3)
+    if not marker.startswith(("openai_responses:v2:", "openai_responses:v3:")):
+        raise ValueError("not a v2/v3 marker")
+    _, version, kind, rest = marker.split(":", 3)
     uid, _, q = rest.partition("?")
-    return {"version": "v2", "item_type": kind, "ulid": uid, "metadata": _parse_qs(q)}
+    return {
+        "version": version,
+        "item_type": kind,
+        "ulid": uid,
+        "metadata": _parse_qs(q),
+    }
+
+
+def _raw_marker(m: re.Match) -> str:
+    raw = f"openai_responses:{m.group('version')}:{m.group('kind')}:{m.group('ulid')}"
+    return f"{raw}?{m.group('query')}" if m.group("query") else raw
 
 
 def extract_markers(text: str, *, parsed: bool = False) -> list:
     found = []
     for m in _RE.finditer(text):
-        raw = f"openai_responses:v2:{m.group('kind')}:{m.group('ulid')}"
-        if m.group("query"):
-            raw += f"?{m.group('query')}"
+        raw = _raw_marker(m)
         found.append(parse_marker(raw) if parsed else raw)
     return found
 
@@ -2375,46 +5225,286 @@ def split_text_by_markers(text: str) -> list[dict]:
     for m in _RE.finditer(text):
         if m.start() > last:
             segments.append({"type": "text", "text": text[last : m.start()]})
-        raw = f"openai_responses:v2:{m.group('kind')}:{m.group('ulid')}"
-        if m.group("query"):
-            raw += f"?{m.group('query')}"
-        segments.append({"type": "marker", "marker": raw})
+        segments.append({"type": "marker", "marker": _raw_marker(m)})
         last = m.end()
     if last < len(text):
         segments.append({"type": "text", "text": text[last:]})
     return segments
 
 
+_SCAN_RE = re.compile(rf"{DETAILS_RE.pattern}|{_RE.pattern}", re.S | re.I)
+
+
+def content_text(content: Any) -> str:
+    """Return message ``content`` as text; a list of parts yields its text parts, one per line.
+
+    Anything else (``None``, non-text parts such as images) contributes nothing.
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text") or ""
+            for part in content
+            if isinstance(part, dict)
+            and part.get("type") in ("text", "input_text", "output_text")
+        )
+    return ""
+
+
+def scan_assistant_content(text: str) -> list[dict]:
+    """Split assistant history text into text and marker segments in one pass.
+
+    ``<details>`` blocks and embedded images are dropped, equivalent to
+    ``DETAILS_RE.sub`` followed by ``split_text_by_markers`` on the result.
+    Text on either side of a dropped block is joined into one segment.
+
+    :param text: Raw assistant message content.
+    :return: ``{"type": "text", "text": ...}`` and
+        ``{"type": "marker", "marker": ..., "version": ..., "item_type": ..., "ulid": ...}``
+        dicts.
+    """
+    if "<details" not in text and "![" not in text and _SENTINEL not in text:
+        return [{"type": "text", "text": text}] if text else []
+
+    segments: list[dict] = []
+    pending: list[str] = []
+    last = 0
+    for m in _SCAN_RE.finditer(text):
+        if m.start() > last:
+            pending.append(text[last : m.start()])
+        last = m.end()
+        if m.group("ulid") is None:  # <details> block or image: drop it
+            continue
+        if pending:
+            segments.append({"type": "text", "text": "".join(pending)})
+            pending = []
+        segments.append(
+            {
+                "type": "marker",
+                "marker": _raw_marker(m),
+                "version": m.group("version"),
+                "item_type": m.group("kind"),
+                "ulid": m.group("ulid"),
+            }
+        )
+    if last < len(text):
+        pending.append(text[last:])
+    if pending:
+        segments.append({"type": "text", "text": "".join(pending)})
+    return segments
+
+
+def estimate_item_tokens(item: Dict[str, Any]) -> int:
+    """Rough input-token cost of a persisted item (~4 characters per token)."""
+    return len(json.dumps(item, ensure_ascii=False)) // 4
+
+
+def estimate_text_tokens(items: Iterable[Any]) -> int:
+    """Rough token count of the text in ``items`` (~4 characters per token).
+
+    Only string values are counted, without serializing anything; image and
+    file data (``NON_TEXT_KEYS``, e.g. rehydrated base64 images) is skipped.
+    """
+    chars = 0
+    stack = list(items)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            chars += len(value)
+        elif isinstance(value, dict):
+            stack.extend(v for k, v in value.items() if k not in NON_TEXT_KEYS)
+        elif isinstance(value, list):
+            stack.extend(value)
+    return chars // 4
+
+
+def history_fingerprint(messages: List[Dict[str, Any]]) -> str:
+    """Hash of the roles and contents of ``messages`` (Open WebUI sends no message IDs)."""
+    digest = hashlib.sha256()
+    for m in messages:
+        digest.update(
+            json.dumps(
+                [m.get("role"), m.get("content")], ensure_ascii=False, sort_keys=True
+            ).encode()
+        )
+    return digest.hexdigest()[:32]
+
+
+def history_summary_transcript(messages: List[Dict[str, Any]]) -> str:
+    """Plain-text transcript of ``messages`` for the summarization prompt.
+
+    Only visible text is kept: images, <details> blocks and persisted-item
+    markers are dropped, and each message is cut at
+    ``HISTORY_SUMMARY_MESSAGE_CHARS`` characters.
+    """
+    lines = []
+    for m in messages:
+        text = content_text(m.get("content"))
+        if m.get("role") == "assistant":
+            text = "".join(
+                seg["text"]
+                for seg in scan_assistant_content(text)
+                if seg["type"] == "text"
+            )
+        text = text.strip()
+        if len(text) > HISTORY_SUMMARY_MESSAGE_CHARS:
+            text = text[:HISTORY_SUMMARY_MESSAGE_CHARS] + " …"
+        lines.append(f"{str(m.get('role', '')).upper()}: {text}")
+    return "\n\n".join(lines)
+
+
+def substitute_history_summary(
+    messages: List[Dict[str, Any]], summary: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Replace the messages covered by ``summary`` with one developer message.
+
+    System messages are kept.  ``messages`` is returned unchanged when the
+    summary no longer matches the start of the history (edited or deleted
+    turns) or would leave nothing after it.
+    """
+    covered = summary.get("covered", 0)
+    turns = [m for m in messages if m.get("role") != "system"]
+    if not 0 < covered < len(turns):
+        return messages
+    if history_fingerprint(turns[:covered]) != summary.get("fingerprint"):
+        return messages
+    return [
+        *(m for m in messages if m.get("role") == "system"),
+        {
+            "role": "developer",
+            "content": f"Summary of the earlier conversation:\n{summary['text']}",
+        },
+        *turns[covered:],
+    ]
+
+
+def reasoning_turns_to_drop(
+    scanned: Dict[int, list[dict]],
+    items_lookup: Dict[str, Any],
+    policy: str,
+    limit: int,
+) -> set[int]:
+    """Return the message indexes whose reasoning items ``policy`` leaves out.
+
+    :param scanned: Assistant message index → segments from ``scan_assistant_content``.
+    :param items_lookup: Result of ``fetch_openai_response_items`` for those markers.
+    :param policy: ``"last_turns"``, ``"tool_turns"`` or ``"token_budget"``.
+    :param limit: Turn count (``last_turns``) or token budget (``token_budget``).
+    """
+    turns: list[tuple[int, list[dict]]] = []  # oldest first
+    for idx in sorted(scanned):
+        items: list[dict] = []
+        for seg in scanned[idx]:
+            if seg["type"] == "marker":
+                found = items_lookup.get(seg["ulid"])
+                if isinstance(found, list):
+                    items.extend(found)
+                elif found is not None:
+                    items.append(found)
+        if any(i.get("type") == "reasoning" for i in items):
+            turns.append((idx, items))
+
+    if policy == "last_turns":
+        keep = {idx for idx, _ in turns[-limit:]} if limit else set()
+    elif policy == "tool_turns":
+        keep = {
+            idx
+            for idx, items in turns
+            if any(i.get("type", "").endswith("_call") for i in items)
+        }
+    elif policy == "token_budget":
+        keep, used = set(), 0
+        for idx, items in reversed(turns):
+            cost = sum(
+                estimate_item_tokens(i) for i in items if i.get("type") == "reasoning"
+            )
+            if used + cost > limit:
+                break
+            keep.add(idx)
+            used += cost
+    else:
+        return set()
+    return {idx for idx, _ in turns} - keep
+
+
 def fetch_openai_response_items(
     chat_id: str,
     item_ids: List[str],
     *,
     openwebui_model_id: Optional[str] = None,
-) -> Dict[str, Dict[str, Any]]:
+    rehydrate_images: bool = True,
+    image_dir: str = "",
+    chat: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     """Return a mapping of ``item_id`` to its persisted payload.
 
     :param chat_id: Chat identifier used to look up stored items.
-    :param item_ids: ULIDs previously embedded in the message text.
+    :param item_ids: ULIDs previously embedded in the message text (v2 item IDs
+        or v3 batch IDs).
     :param openwebui_model_id: Only include items originating from this model.
-    :return: Mapping of ULID to the stored item payload.
+    :param rehydrate_images: Read offloaded image results back from disk; if
+        false, they are sent without ``result``.
+    :param image_dir: Directory offloaded images are read from (``IMAGE_OFFLOAD_DIR``).
+    :param chat: The chat's JSON if the caller already loaded it; read otherwise.
+    :return: Mapping of ULID to the stored item payload; batch IDs map to the
+        ordered list of their payloads.
     """
 
-    chat_model = Chats.get_chat_by_id(chat_id)
-    if not chat_model:
-        return {}
+    started = time.perf_counter()
+    if chat is None:
+        chat_model = Chats.get_chat_by_id(chat_id)
+        if not chat_model:
+            return {}
+        chat = chat_model.chat
 
-    items_store = chat_model.chat.get("openai_responses_pipe", {}).get("items", {})
-    lookup: Dict[str, Dict[str, Any]] = {}
-    for item_id in item_ids:
+    pipe_root = chat.get("openai_responses_pipe", {})
+    items_store = pipe_root.get("items", {})
+    batches = pipe_root.get("batches", {})
+    blobs = pipe_root.get("blobs", {})
+    decoded: Dict[str, Dict[str, Any]] = {}  # digest → payload, decoded once per call
+
+    def payload_for(item_id: str) -> Optional[Dict[str, Any]]:
         item = items_store.get(item_id)
         if not item:
-            continue
+            return None
         # Only include previously persisted items that match the current model ID.
         # OpenAI requires this to avoid items produced by one model leaking into subsequent requests for a different model.
         # e.g., Encrypted reasoning tokens from o4-mini are not compatible with gpt-4o.
         # TODO: Do some more sophisticated filtering here, e.g. check model features and allow items that are compatible with the current model.
         if openwebui_model_id:
             if item.get("model", "") != openwebui_model_id:
-                continue
-        lookup[item_id] = item.get("payload", {})
+                return None
+        ref = item.get("payload_ref")
+        if ref is None:
+            payload = item.get("payload", {})
+        else:
+            if ref not in decoded:
+                blob = blobs.get(ref)
+                if blob is None:
+                    return None
+                decoded[ref] = _load_blob(blob)
+            payload = decoded[ref]
+        if "result_ref" in payload:
+            payload = _rehydrate_image_result(payload, rehydrate_images, image_dir)
+        return payload
+
+    lookup: Dict[str, Any] = {}
+    for item_id in item_ids:
+        batch = batches.get(item_id)
+        if batch is not None:
+            payloads = [payload_for(i) for i in batch.get("item_ids", [])]
+            lookup[item_id] = [p for p in payloads if p is not None]
+            continue
+        payload = payload_for(item_id)
+        if payload is not None:
+            lookup[item_id] = payload
+    elapsed = time.perf_counter() - started
+    TurnTimings.add_persistence(elapsed)
+    pipe_metrics.observe(
+        "persistence_seconds",
+        elapsed,
+        model=metrics_model_label(openwebui_model_id or ""),
+        operation="fetch",
+    )
     return lookup